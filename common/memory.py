@@ -0,0 +1,177 @@
+"""Memory introspection for trained models.
+
+memory_report() breaks the size of a model down by component (one row per
+attribute, count tables split by order, fitted attributes of scikit-learn
+estimators split one by one). Objects shared by several components are
+counted only once, in the first component that reaches them.
+"""
+from collections import namedtuple
+from numbers import Number
+import sys
+import types
+
+import numpy as np
+
+
+MemoryItem = namedtuple('MemoryItem', 'component bytes entries')
+
+
+def deep_sizeof(obj, seen=None):
+    """Approximate size in bytes of an object and everything it references.
+
+    obj -- the object.
+    seen -- set of ids of objects already counted (updated in place).
+    """
+    if seen is None:
+        seen = set()
+    size = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, (type, types.ModuleType,
+                                           types.FunctionType,
+                                           types.BuiltinFunctionType)):
+            continue
+        seen.add(id(o))
+
+        if isinstance(o, np.ndarray):
+            size += sys.getsizeof(o)
+            if not o.flags.owndata:
+                # views and memory maps: the data is not in the header
+                size += o.nbytes
+            if o.dtype == object:
+                stack.extend(o.ravel())
+            continue
+
+        size += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        elif hasattr(o, '__dict__'):
+            stack.append(vars(o))
+    return size
+
+
+def entries(obj):
+    """Number of entries in a component (1 for scalars and plain objects)."""
+    if isinstance(obj, np.ndarray):
+        return obj.size
+    if hasattr(obj, 'nnz'):
+        # scipy sparse matrices
+        return obj.nnz
+    if isinstance(obj, dict) and obj and \
+            all(isinstance(v, dict) for v in obj.values()):
+        # nested tables, such as transitions or emissions
+        return sum(len(v) for v in obj.values())
+    try:
+        return len(obj)
+    except TypeError:
+        return 1
+
+
+def is_count_table(obj):
+    """Check if an object is a dict from n-gram tuples to numbers."""
+    return isinstance(obj, dict) and len(obj) > 0 and \
+        all(isinstance(k, tuple) for k in obj) and \
+        all(isinstance(v, Number) for v in obj.values())
+
+
+def count_table_report(name, count, seen):
+    """Report a count table, one row per n-gram order.
+
+    name -- component name.
+    count -- dict from n-gram tuples to counts.
+    seen -- set of ids of objects already counted.
+    """
+    seen.add(id(count))
+    # share of the hash table itself, proportional to the number of entries
+    table_size = sys.getsizeof(count) / len(count)
+    sizes, lengths = {}, {}
+    for gram, c in count.items():
+        k = len(gram)
+        size = table_size + deep_sizeof(gram, seen) + deep_sizeof(c, seen)
+        sizes[k] = sizes.get(k, 0) + size
+        lengths[k] = lengths.get(k, 0) + 1
+    return [MemoryItem('{}[{}]'.format(name, k), int(sizes[k]), lengths[k])
+            for k in sorted(sizes)]
+
+
+def estimator_report(name, est, seen):
+    """Report a scikit-learn estimator, one row per fitted attribute.
+
+    name -- component name.
+    est -- the estimator (pipelines are reported step by step).
+    seen -- set of ids of objects already counted.
+    """
+    if hasattr(est, 'steps'):
+        report = []
+        for step_name, step in est.steps:
+            step_name = '{}.{}'.format(name, step_name)
+            report.extend(estimator_report(step_name, step, seen))
+        return report
+
+    report = []
+    params = sys.getsizeof(est)
+    for attr, value in vars(est).items():
+        if attr.endswith('_') and not attr.startswith('_'):
+            report.append(MemoryItem('{}.{}'.format(name, attr),
+                                     deep_sizeof(value, seen),
+                                     entries(value)))
+        else:
+            params += deep_sizeof(value, seen)
+    report.append(MemoryItem('{}.(params)'.format(name), params, 1))
+    return report
+
+
+def memory_report(obj, seen=None):
+    """Memory usage of a model, broken down by component.
+
+    Returns a list of MemoryItem(component, bytes, entries).
+
+    obj -- the model.
+    seen -- set of ids of objects already counted (updated in place).
+    """
+    if seen is None:
+        seen = set()
+    seen.add(id(obj))
+    seen.add(id(vars(obj)))
+
+    report = [MemoryItem('(object)', sys.getsizeof(obj) +
+                         sys.getsizeof(vars(obj)), 1)]
+    for attr, value in vars(obj).items():
+        name = attr.lstrip('_')
+        if id(value) in seen:
+            # already counted in another component
+            report.append(MemoryItem(name, 0, entries(value)))
+        elif hasattr(value, 'memory_report'):
+            # nested model or compact table with a report of its own
+            for item in value.memory_report(seen):
+                sep = '' if item.component.startswith('[') else '.'
+                component = name + sep + item.component
+                report.append(item._replace(component=component))
+        elif is_count_table(value):
+            report.extend(count_table_report(name, value, seen))
+        elif hasattr(value, 'get_params'):
+            report.extend(estimator_report(name, value, seen))
+        else:
+            report.append(MemoryItem(name, deep_sizeof(value, seen),
+                                     entries(value)))
+    return report
+
+
+def print_memory_report(report):
+    """Print a memory report as a table.
+
+    report -- list of MemoryItem.
+    """
+    total = sum(item.bytes for item in report)
+    width = max([len('component')] + [len(item.component) for item in report])
+    print('{0:{1}}\t{2:>12}\t{3:>6}\t{4:>10}'.format(
+        'component', width, 'bytes', '%', 'entries'))
+    for item in report:
+        print('{0:{1}}\t{2:>12}\t{3:6.2f}\t{4:>10}'.format(
+            item.component, width, item.bytes,
+            item.bytes * 100 / total if total else 0.0, item.entries))
+    print('{0:{1}}\t{2:>12}'.format('total', width, total))
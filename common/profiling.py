@@ -0,0 +1,154 @@
+"""Per-stage timing and memory instrumentation for the scripts.
+
+Usage from a script:
+
+    profiler = Profiler(opts['--profile'], opts['--cprofile'])
+    with profiler.stage('load'):
+        ...
+    with profiler.stage('train'):
+        ...
+    profiler.close()
+
+Each stage records wall time, CPU time and the peak resident set size of the
+process during the stage (and of its finished children, such as pool
+workers, up to its end). On Linux the peak is reset at the start of each
+stage; elsewhere it is the peak of the process so far, and stages that did
+not reach it are marked. close() prints a table to stderr and saves a JSON
+summary. A disabled profiler (filename None) only yields, so the scripts pay
+nothing for it.
+"""
+from contextlib import contextmanager
+import cProfile
+import json
+import platform
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+
+def peak_rss(who='self'):
+    """Peak resident set size in bytes (None if unknown).
+
+    who -- 'self' or 'children' (finished child processes).
+    """
+    if resource is None:
+        return None
+    usage = resource.RUSAGE_SELF if who == 'self' else resource.RUSAGE_CHILDREN
+    maxrss = resource.getrusage(usage).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def reset_peak_rss():
+    """Reset the peak resident set size of the process, if the system allows
+    it (only Linux does). Returns whether it was reset.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        return False
+    return True
+
+
+class Profiler:
+    """Records wall time, CPU time and peak RSS of named stages.
+    """
+
+    def __init__(self, filename=None, cprofile=False):
+        """
+        filename -- JSON file for the summary (None disables profiling).
+        cprofile -- also dump cProfile stats of each stage to
+            '<filename>.<stage>.prof' (default: False).
+        """
+        self._filename = filename
+        self._cprofile = cprofile and filename is not None
+        self._stages = []
+
+    def enabled(self):
+        """Check if the profiler records anything."""
+        return self._filename is not None
+
+    @contextmanager
+    def stage(self, name):
+        """Context manager that records a stage.
+
+        name -- stage name (e.g. 'load', 'train', 'serialize', 'predict',
+            'evaluate').
+        """
+        if not self.enabled():
+            yield
+            return
+
+        prof = cProfile.Profile() if self._cprofile else None
+        reset = reset_peak_rss()
+        start_rss = peak_rss('self')
+        wall, cpu = time.perf_counter(), time.process_time()
+        if prof is not None:
+            prof.enable()
+        try:
+            yield
+        finally:
+            if prof is not None:
+                prof.disable()
+            rss = peak_rss('self')
+            stats = {
+                'stage': name,
+                'wall': time.perf_counter() - wall,
+                'cpu': time.process_time() - cpu,
+                'peak_rss': rss,
+                # False if the peak may have been reached before the stage
+                'peak_rss_in_stage': reset or (rss is not None and
+                                               rss > start_rss),
+                'peak_rss_children': peak_rss('children'),
+            }
+            if prof is not None:
+                stats['cprofile'] = '{}.{}.prof'.format(self._filename, name)
+                prof.dump_stats(stats['cprofile'])
+            self._stages.append(stats)
+
+    def summary(self):
+        """Machine-readable summary (a dict)."""
+        return {
+            'argv': sys.argv,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'stages': self._stages,
+        }
+
+    def print_summary(self, file=None):
+        """Print the recorded stages as a table.
+
+        file -- output stream (default: stderr).
+        """
+        if file is None:
+            file = sys.stderr
+        print('stage\twall (s)\tcpu (s)\tpeak RSS (MB)', file=file)
+        before = False
+        for s in self._stages:
+            rss = s['peak_rss']
+            if rss is None:
+                rss = '?'
+            elif s['peak_rss_in_stage']:
+                rss = '{:.1f}'.format(rss / 2**20)
+            else:
+                rss = '{:.1f}*'.format(rss / 2**20)
+                before = True
+            print('{}\t{:.3f}\t{:.3f}\t{}'.format(
+                s['stage'], s['wall'], s['cpu'], rss), file=file)
+        if before:
+            print('* peak reached before the stage', file=file)
+
+    def close(self):
+        """Print and save the summary (if enabled)."""
+        if not self.enabled():
+            return
+        self.print_summary()
+        with open(self._filename, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
@@ -0,0 +1,39 @@
+"""Print the memory usage of a saved model, broken down by component.
+
+Usage:
+  memory.py -i <file> [--profile <prof>] [--cprofile]
+  memory.py -h | --help
+
+Options:
+  -i <file>     Model file (any pickled model).
+  --profile <prof>  Record wall time, CPU time and peak RSS per stage and
+                save a JSON summary to <prof>.
+  --cprofile    With --profile, also dump cProfile stats per stage.
+  -h --help     Show this screen.
+"""
+from docopt import docopt
+import pickle
+
+from common.memory import memory_report, print_memory_report
+from common.profiling import Profiler
+
+
+if __name__ == '__main__':
+    opts = docopt(__doc__)
+    profiler = Profiler(opts['--profile'], opts['--cprofile'])
+
+    # load the model
+    with profiler.stage('deserialize'):
+        filename = opts['-i']
+        f = open(filename, 'rb')
+        model = pickle.load(f)
+        f.close()
+
+    with profiler.stage('evaluate'):
+        if hasattr(model, 'memory_report'):
+            report = model.memory_report()
+        else:
+            report = memory_report(model)
+    print_memory_report(report)
+
+    profiler.close()
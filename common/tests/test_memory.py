@@ -0,0 +1,44 @@
+# https://docs.python.org/3/library/unittest.html
+from unittest import TestCase
+
+from languagemodeling.ngram import NGram
+from languagemodeling.compact import compact
+from sentiment.classifier import SentimentClassifier
+
+
+class TestMemoryReport(TestCase):
+
+    def setUp(self):
+        self.sents = [
+            'el gato come pescado .'.split(),
+            'la gata come salmón .'.split(),
+        ]
+
+    def test_ngram(self):
+        model = NGram(2, self.sents)
+        report = {item.component: item for item in model.memory_report()}
+
+        self.assertEqual(report['count[1]'].entries, 9)
+        self.assertEqual(report['count[2]'].entries, 11)
+        self.assertEqual(report['n'].entries, 1)
+        for item in report.values():
+            self.assertGreaterEqual(item.bytes, 0)
+        self.assertGreater(report['count[2]'].bytes, 0)
+
+    def test_compact_ngram(self):
+        model = compact(NGram(2, self.sents))
+        report = {item.component: item for item in model.memory_report()}
+
+        self.assertEqual(report['count.vocab'].entries, 10)
+        self.assertEqual(report['count[1]'].entries, 9)
+        self.assertEqual(report['count[2]'].entries, 11)
+
+    def test_sentiment_classifier(self):
+        model = SentimentClassifier(clf='maxent')
+        model.fit(['muy bueno', 'muy malo', 'bueno bueno', 'malo'],
+                  ['P', 'N', 'P', 'N'])
+        report = {item.component: item for item in model.memory_report()}
+
+        self.assertEqual(report['pipeline.vect.vocabulary_'].entries, 3)
+        self.assertEqual(report['pipeline.clf.coef_'].entries, 3)
+        self.assertIn('pipeline.clf.(params)', report)
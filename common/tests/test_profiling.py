@@ -0,0 +1,59 @@
+# https://docs.python.org/3/library/unittest.html
+from unittest import TestCase
+from tempfile import TemporaryDirectory
+from contextlib import redirect_stderr
+from io import StringIO
+import json
+import os
+
+from common.profiling import Profiler, reset_peak_rss
+
+
+class TestProfiler(TestCase):
+
+    def test_stages(self):
+        with TemporaryDirectory() as dirname:
+            filename = os.path.join(dirname, 'prof.json')
+            profiler = Profiler(filename, cprofile=True)
+            with profiler.stage('load'):
+                sum(range(1000))
+            with profiler.stage('train'):
+                sorted(range(1000))
+            summary = profiler.summary()
+
+            stages = [s['stage'] for s in summary['stages']]
+            self.assertEqual(stages, ['load', 'train'])
+            for s in summary['stages']:
+                self.assertGreaterEqual(s['wall'], 0.0)
+                self.assertGreaterEqual(s['cpu'], 0.0)
+                self.assertTrue(os.path.exists(s['cprofile']))
+
+            output = StringIO()
+            with redirect_stderr(output):
+                profiler.close()
+            self.assertIn('train', output.getvalue())
+            with open(filename) as f:
+                self.assertEqual(json.load(f)['stages'], summary['stages'])
+
+    def test_peak_rss(self):
+        if not reset_peak_rss():
+            self.skipTest('the peak RSS cannot be reset here')
+        with TemporaryDirectory() as dirname:
+            profiler = Profiler(os.path.join(dirname, 'prof.json'))
+            with profiler.stage('heavy'):
+                data = bytearray(100 * 2**20)
+                del data
+            with profiler.stage('light'):
+                pass
+            heavy, light = profiler.summary()['stages']
+
+            # the peak of each stage, not of the process so far
+            self.assertTrue(light['peak_rss_in_stage'])
+            self.assertLess(light['peak_rss'], heavy['peak_rss'] - 50 * 2**20)
+
+    def test_disabled(self):
+        profiler = Profiler()
+        with profiler.stage('load'):
+            pass
+        self.assertFalse(profiler.enabled())
+        self.assertEqual(profiler.summary()['stages'], [])
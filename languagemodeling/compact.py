@@ -0,0 +1,192 @@
+"""Fork-friendly storage for n-gram counts.
+
+A count dict with millions of tuple keys is made of millions of small Python
+objects. After a fork, merely reading them updates their reference counts,
+which dirties the copy-on-write pages and ends up giving every worker a
+private copy of the model. CompactCounts keeps the same information in a few
+large NumPy buffers (sorted vocabulary, sorted n-gram keys and counts per
+order), that workers forked after loading the model really share. The
+buffers can also be saved to a directory and memory-mapped, so that
+independent processes share them through the page cache.
+"""
+from collections.abc import Mapping
+import os
+
+import numpy as np
+
+from common.memory import MemoryItem
+
+
+class CompactCounts(Mapping):
+    """Read-only mapping from n-gram tuples to counts, stored in NumPy arrays.
+    """
+
+    def __init__(self, count=None, vocab=None, keys=None, values=None):
+        """
+        count -- dict from n-gram tuples to counts.
+
+        (vocab, keys and values are the internal arrays, used by load().)
+        """
+        if count is not None:
+            vocab, keys, values = self._build(count)
+        self._vocab = vocab
+        self._keys = keys
+        self._values = values
+        self._void_keys = self._void_views(keys)
+
+    @classmethod
+    def _void_views(cls, keys):
+        # views of the key arrays, one item per n-gram (not copies)
+        return {k: cls._as_void(a) for k, a in keys.items()}
+
+    def __getstate__(self):
+        """Return internal state for pickling, without the views of the keys
+        (pickle would save them as separate arrays).
+        """
+        state = dict(self.__dict__)
+        del state['_void_keys']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # unpickled arrays may come back in native byte order, and the
+        # views compare bytes
+        self._keys = {k: np.ascontiguousarray(a, dtype='>i4')
+                      for k, a in self._keys.items()}
+        self._void_keys = self._void_views(self._keys)
+
+    @staticmethod
+    def _build(count):
+        tokens = sorted({t for gram in count for t in gram})
+        vocab = np.array([t.encode('utf-8') for t in tokens], dtype='S')
+        index = {t: i for i, t in enumerate(tokens)}
+
+        by_order = {}
+        for gram, c in count.items():
+            by_order.setdefault(len(gram), []).append((gram, c))
+
+        keys, values = {}, {}
+        for k, items in by_order.items():
+            a = np.array([[index[t] for t in gram] for gram, _ in items],
+                         dtype='>i4').reshape(len(items), k)
+            v = np.array([c for _, c in items], dtype=np.int64)
+            if k > 0:
+                # big-endian ids, so that byte order is numeric order
+                order = np.argsort(CompactCounts._as_void(a), kind='stable')
+            else:
+                order = np.arange(len(items))
+            keys[k] = np.ascontiguousarray(a[order])
+            values[k] = v[order]
+        return vocab, keys, values
+
+    @staticmethod
+    def _as_void(a):
+        k = a.shape[1]
+        return a.view(np.dtype((np.void, 4 * k))).reshape(-1) if k else a
+
+    def _position(self, tokens):
+        """Index of an n-gram in the arrays of its order, or None."""
+        k = len(tokens)
+        if k not in self._keys:
+            return None
+        if k == 0:
+            return 0
+
+        vocab = self._vocab
+        enc = np.array([t.encode('utf-8') for t in tokens], dtype='S')
+        ids = np.searchsorted(vocab, enc)
+        if (ids >= len(vocab)).any() or (vocab[ids] != enc).any():
+            return None
+
+        keys = self._void_keys[k]
+        key = self._as_void(ids.astype('>i4').reshape(1, k))
+        i = np.searchsorted(keys, key)[0]
+        if i < len(keys) and keys[i] == key[0]:
+            return i
+        return None
+
+    def __getitem__(self, tokens):
+        i = self._position(tuple(tokens))
+        if i is None:
+            raise KeyError(tokens)
+        return int(self._values[len(tokens)][i])
+
+    def get(self, tokens, default=None):
+        i = self._position(tuple(tokens))
+        if i is None:
+            return default
+        return int(self._values[len(tokens)][i])
+
+    def __contains__(self, tokens):
+        return self._position(tuple(tokens)) is not None
+
+    def __iter__(self):
+        words = [w.decode('utf-8') for w in self._vocab]
+        for k in sorted(self._keys):
+            for ids in self._keys[k]:
+                yield tuple(words[i] for i in ids)
+
+    def __len__(self):
+        return sum(len(v) for v in self._values.values())
+
+    def nbytes(self):
+        """Total size of the arrays in bytes."""
+        arrays = [self._vocab] + list(self._keys.values()) + \
+            list(self._values.values())
+        return sum(a.nbytes for a in arrays)
+
+    def memory_report(self, seen=None):
+        """Memory usage, broken down by vocabulary and n-gram order.
+
+        seen -- set of ids of objects already counted (updated in place).
+        """
+        if seen is not None:
+            seen.add(id(self))
+        report = [MemoryItem('vocab', self._vocab.nbytes, len(self._vocab))]
+        for k in sorted(self._keys):
+            size = self._keys[k].nbytes + self._values[k].nbytes
+            report.append(MemoryItem('[{}]'.format(k), size,
+                                     len(self._values[k])))
+        return report
+
+    def save(self, dirname):
+        """Save the arrays as .npy files in a directory.
+
+        dirname -- the directory (created if needed).
+        """
+        os.makedirs(dirname, exist_ok=True)
+        np.save(os.path.join(dirname, 'vocab.npy'), self._vocab)
+        for k in self._keys:
+            np.save(os.path.join(dirname, 'keys{}.npy'.format(k)),
+                    self._keys[k])
+            np.save(os.path.join(dirname, 'values{}.npy'.format(k)),
+                    self._values[k])
+
+    @classmethod
+    def load(cls, dirname, mmap_mode='r'):
+        """Load arrays saved with save(), memory-mapped by default.
+
+        dirname -- the directory.
+        mmap_mode -- passed to numpy.load ('r' to share pages between
+            processes, None to read into private memory).
+        """
+        def load(name):
+            return np.load(os.path.join(dirname, name), mmap_mode=mmap_mode)
+
+        vocab = load('vocab.npy')
+        keys, values = {}, {}
+        for name in os.listdir(dirname):
+            if name.startswith('keys'):
+                k = int(name[len('keys'):-len('.npy')])
+                keys[k] = load(name)
+                values[k] = load('values{}.npy'.format(k))
+        return cls(vocab=vocab, keys=keys, values=values)
+
+
+def compact(model):
+    """Replace the count dict of an n-gram model with CompactCounts, in place.
+
+    model -- n-gram model (with counts in a '_count' dict).
+    """
+    model._count = CompactCounts(model._count)
+    return model
@@ -1,7 +1,10 @@
 # https://docs.python.org/3/library/collections.html
 from collections import defaultdict
+from multiprocessing import Pool
 import math
 
+from common.memory import memory_report
+
 
 class LanguageModel(object):
 
@@ -24,21 +27,34 @@ class LanguageModel(object):
 
         sents -- the sentences.
         """
-        # WORK HERE!!
+        return sum(self.sent_log_prob(sent) for sent in sents)
 
     def cross_entropy(self, sents):
         """Cross-entropy of a list of sentences.
 
         sents -- the sentences.
         """
-        # WORK HERE!!
+        # the end marker '</s>' is also predicted, once per sentence
+        m = sum(len(sent) + 1 for sent in sents)
+        return -self.log_prob(sents) / m
 
     def perplexity(self, sents):
         """Perplexity of a list of sentences.
 
         sents -- the sentences.
         """
-        # WORK HERE!!
+        return math.pow(2.0, self.cross_entropy(sents))
+
+    def sent_ngrams(self, sent):
+        """Pairs (token, prev_tokens) whose conditional probabilities make up
+        the probability of a sentence, including the end marker.
+
+        sent -- the sentence as a list of tokens.
+        """
+        n = self._n
+        sent = ['<s>'] * (n - 1) + list(sent) + ['</s>']
+        return [(sent[i], tuple(sent[i - n + 1:i]))
+                for i in range(n - 1, len(sent))]
 
 
 class NGram(LanguageModel):
@@ -53,7 +69,12 @@ class NGram(LanguageModel):
 
         count = defaultdict(int)
 
-        # WORK HERE!!
+        for sent in sents:
+            sent = ['<s>'] * (n - 1) + sent + ['</s>']
+            for i in range(len(sent) - n + 1):
+                ngram = tuple(sent[i:i + n])
+                count[ngram] += 1
+                count[ngram[:-1]] += 1
 
         self._count = dict(count)
 
@@ -64,27 +85,54 @@ class NGram(LanguageModel):
         """
         return self._count.get(tokens, 0)
 
+    def memory_report(self, seen=None):
+        """Memory usage of the model, broken down by component.
+
+        seen -- set of ids of objects already counted (updated in place).
+        """
+        return memory_report(self, seen)
+
     def cond_prob(self, token, prev_tokens=None):
         """Conditional probability of a token.
 
         token -- the token.
         prev_tokens -- the previous n-1 tokens (optional only if n = 1).
         """
-        # WORK HERE!!
+        if not prev_tokens:
+            prev_tokens = ()
+        else:
+            prev_tokens = tuple(prev_tokens)
+        assert len(prev_tokens) == self._n - 1
+
+        prev_count = self.count(prev_tokens)
+        if prev_count == 0:
+            return 0.0
+        return self.count(prev_tokens + (token,)) / prev_count
 
     def sent_prob(self, sent):
         """Probability of a sentence. Warning: subject to underflow problems.
 
         sent -- the sentence as a list of tokens.
         """
-        # WORK HERE !!
+        prob = 1.0
+        for token, prev_tokens in self.sent_ngrams(sent):
+            prob *= self.cond_prob(token, prev_tokens)
+            if prob == 0.0:
+                break
+        return prob
 
     def sent_log_prob(self, sent):
         """Log-probability of a sentence.
 
         sent -- the sentence as a list of tokens.
         """
-        # WORK HERE!!
+        log_prob = 0.0
+        for token, prev_tokens in self.sent_ngrams(sent):
+            p = self.cond_prob(token, prev_tokens)
+            if p == 0.0:
+                return -math.inf
+            log_prob += math.log2(p)
+        return log_prob
 
 
 class AddOneNGram(NGram):
@@ -117,19 +165,119 @@ class AddOneNGram(NGram):
         # WORK HERE!!
 
 
+def kgram_counts(n, sents, count=None):
+    """Counts for all the k-grams with k <= n, including the empty k-gram
+    (number of tokens) and the contexts made of start markers.
+
+    n -- maximum order.
+    sents -- iterable of sentences, each one being a list of tokens.
+    count -- dict to add the counts to (default: a new one).
+    """
+    if count is None:
+        count = defaultdict(int)
+    for sent in sents:
+        sent = ['<s>'] * (n - 1) + sent + ['</s>']
+        for j in range(1, n):
+            count[('<s>',) * j] += 1
+        for i in range(n - 1, len(sent)):
+            count[()] += 1
+            for k in range(1, n + 1):
+                count[tuple(sent[i - k + 1:i + 1])] += 1
+    return count
+
+
+def subtract_counts(count, other):
+    """Subtract the counts in other from count, in place, removing the zero
+    entries (add_counts() restores them).
+
+    count -- dict of counts.
+    other -- dict of counts, all of them also in count.
+    """
+    for gram, c in other.items():
+        c = count[gram] - c
+        if c > 0:
+            count[gram] = c
+        else:
+            del count[gram]
+    return count
+
+
+def add_counts(count, other):
+    """Add the counts in other to count, in place.
+
+    count -- dict of counts.
+    other -- dict of counts.
+    """
+    for gram, c in other.items():
+        count[gram] = count.get(gram, 0) + c
+    return count
+
+
+def held_out_log_probs(n, count, addone, held_out_sents, gammas):
+    """Log-probability of held-out data for each gamma, for an interpolated
+    model with the given counts.
+
+    n -- order of the model.
+    count -- counts for all the k-grams with k <= n.
+    addone -- whether to use addone smoothing.
+    held_out_sents -- held-out sentences.
+    gammas -- gammas to try.
+    """
+    model = InterpolatedNGram.from_counts(n, count, gammas[0], addone)
+    log_probs = []
+    for gamma in gammas:
+        model._gamma = gamma
+        log_probs.append(model.log_prob(held_out_sents))
+    return log_probs
+
+
+# shared with the pool workers (see _fold_log_probs)
+_total_count = None
+
+
+def _init_worker(count):
+    global _total_count
+    _total_count = count
+
+
+def _fold_log_probs(args):
+    n, fold_count, addone, held_out_sents, gammas = args
+    # the training counts of the fold, in the same dict
+    count = subtract_counts(_total_count, fold_count)
+    try:
+        return held_out_log_probs(n, count, addone, held_out_sents, gammas)
+    finally:
+        add_counts(_total_count, fold_count)
+
+
 class InterpolatedNGram(NGram):
 
-    def __init__(self, n, sents, gamma=None, addone=True):
+    # candidate values for the grid search of gamma
+    gammas = [1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0, 200.0, 500.0, 1000.0,
+              2000.0, 5000.0]
+
+    def __init__(self, n, sents, gamma=None, addone=True, folds=None,
+                 workers=1):
         """
         n -- order of the model.
         sents -- list of sentences, each one being a list of tokens.
         gamma -- interpolation hyper-parameter (if not given, estimate using
             held-out data).
         addone -- whether to use addone smoothing (default: True).
+        folds -- if given, estimate gamma with k-fold cross-validation over
+            this many folds instead of a 90/10 held-out split. All the
+            sentences are then used for training.
+        workers -- number of processes to evaluate the folds in parallel
+            (default: 1).
         """
         assert n > 0
         self._n = n
 
+        count = None
+        if gamma is None and folds is not None:
+            gamma, count = self._cross_validate(sents, addone, folds,
+                                                workers)
+
         if gamma is not None:
             # everything is training data
             train_sents = sents
@@ -139,16 +287,16 @@ class InterpolatedNGram(NGram):
             train_sents = sents[:m]
             held_out_sents = sents[m:]
 
-        print('Computing counts...')
-        # WORK HERE!!
-        # COMPUTE COUNTS FOR ALL K-GRAMS WITH K <= N
+        if count is None:
+            print('Computing counts...')
+            count = dict(kgram_counts(n, train_sents))
+        self._count = count
 
         # compute vocabulary size for add-one in the last step
         self._addone = addone
         if addone:
             print('Computing vocabulary...')
-            self._voc = voc = set()
-            # WORK HERE!!
+            self._voc = voc = self._vocabulary(self._count)
 
             self._V = len(voc)
 
@@ -157,15 +305,93 @@ class InterpolatedNGram(NGram):
             self._gamma = gamma
         else:
             print('Computing gamma...')
-            # WORK HERE!!
-            # use grid search to choose gamma
+            log_probs = held_out_log_probs(n, self._count, addone,
+                                           held_out_sents, self.gammas)
+            self._gamma = self._best_gamma(log_probs)
+
+    @classmethod
+    def from_counts(cls, n, count, gamma, addone=True):
+        """Build a model from already computed counts.
+
+        n -- order of the model.
+        count -- counts for all the k-grams with k <= n.
+        gamma -- interpolation hyper-parameter.
+        addone -- whether to use addone smoothing (default: True).
+        """
+        model = cls.__new__(cls)
+        model._n = n
+        model._count = count
+        model._addone = addone
+        if addone:
+            model._voc = cls._vocabulary(count)
+            model._V = len(model._voc)
+        model._gamma = gamma
+        return model
+
+    @staticmethod
+    def _vocabulary(count):
+        # word types and the end marker, seen as unigrams
+        return {gram[0] for gram in count if len(gram) == 1} - {'<s>'}
+
+    def _best_gamma(self, log_probs):
+        best = max(range(len(log_probs)), key=lambda i: log_probs[i])
+        return self.gammas[best]
+
+    def _cross_validate(self, sents, addone, folds, workers):
+        """Choose gamma with k-fold cross-validation. Returns gamma and the
+        counts of all the sentences.
+
+        The counts of each fold are computed once, in a single pass over the
+        data. The training counts for fold i are then the total counts minus
+        the counts of fold i (subtracted in place and added back), so the
+        cost is about one counting pass plus one held-out scoring per fold.
+        """
+        n = self._n
+        print('Computing fold counts...')
+        fold_sents = [[] for _ in range(folds)]
+        fold_counts = [defaultdict(int) for _ in range(folds)]
+        for j, sent in enumerate(sents):
+            fold_sents[j % folds].append(sent)
+            kgram_counts(n, [sent], fold_counts[j % folds])
+
+        total = {}
+        for fold_count in fold_counts:
+            add_counts(total, fold_count)
+
+        print('Computing gamma...')
+        tasks = [(n, dict(fold_counts[i]), addone, fold_sents[i], self.gammas)
+                 for i in range(folds)]
+        if workers > 1:
+            with Pool(workers, _init_worker, (total,)) as pool:
+                results = pool.map(_fold_log_probs, tasks)
+        else:
+            _init_worker(total)
+            results = [_fold_log_probs(task) for task in tasks]
+            _init_worker(None)
+
+        log_probs = [sum(fold[i] for fold in results)
+                     for i in range(len(self.gammas))]
+        return self._best_gamma(log_probs), total
 
     def count(self, tokens):
         """Count for an k-gram for k <= n.
 
         tokens -- the k-gram tuple.
         """
-        # WORK HERE!! (JUST A RETURN STATEMENT)
+        return self._count.get(tokens, 0)
+
+    def cond_prob_grams(self, token, prev_tokens=None):
+        """The k-grams whose counts cond_prob() may look up.
+
+        token -- the token.
+        prev_tokens -- the previous n-1 tokens (optional only if n = 1).
+        """
+        prev_tokens = tuple(prev_tokens or ())
+        grams = [()]
+        for i in range(len(prev_tokens) + 1):
+            grams.append(prev_tokens[i:])
+            grams.append(prev_tokens[i:] + (token,))
+        return grams
 
     def cond_prob(self, token, prev_tokens=None):
         """Conditional probability of a token.
@@ -173,4 +399,29 @@ class InterpolatedNGram(NGram):
         token -- the token.
         prev_tokens -- the previous n-1 tokens (optional only if n = 1).
         """
-        # WORK HERE!!
+        n = self._n
+        if not prev_tokens:
+            prev_tokens = ()
+        else:
+            prev_tokens = tuple(prev_tokens)
+        assert len(prev_tokens) == n - 1
+
+        gamma = self._gamma
+        prob = 0.0
+        cum_lambda = 0.0
+        for i in range(n - 1):
+            # maximum likelihood estimate with context prev_tokens[i:]
+            tokens = prev_tokens[i:]
+            c = self.count(tokens)
+            if c > 0:
+                lambda_i = (1.0 - cum_lambda) * c / (c + gamma)
+                prob += lambda_i * self.count(tokens + (token,)) / c
+                cum_lambda += lambda_i
+
+        # unigram estimate (with add-one if requested) in the last step
+        c = self.count((token,))
+        if self._addone:
+            q = (c + 1.0) / (self.count(()) + self._V)
+        else:
+            q = c / self.count(())
+        return prob + (1.0 - cum_lambda) * q
@@ -1,11 +1,15 @@
 """Evaulate a language model using a test set.
 
 Usage:
-  eval.py -i <file>
+  eval.py -i <file> [-s <n>] [--profile <prof>] [--cprofile]
   eval.py -h | --help
 
 Options:
   -i <file>     Language model file.
+  -s <n>        Number of shards (-i is then the prefix given to shard.py).
+  --profile <prof>  Record wall time, CPU time and peak RSS per stage and
+                save a JSON summary to <prof>.
+  --cprofile    With --profile, also dump cProfile stats per stage.
   -h --help     Show this screen.
 """
 from docopt import docopt
@@ -14,26 +18,41 @@ import math
 
 from nltk.corpus import gutenberg
 
+from languagemodeling.sharded import ShardedLanguageModel
+from common.profiling import Profiler
+
 
 if __name__ == '__main__':
     opts = docopt(__doc__)
+    profiler = Profiler(opts['--profile'], opts['--cprofile'])
 
     # load the model
-    filename = opts['-i']
-    f = open(filename, 'rb')
-    model = pickle.load(f)
-    f.close()
+    with profiler.stage('deserialize'):
+        filename = opts['-i']
+        if opts['-s']:
+            n_shards = int(opts['-s'])
+            filenames = ['{}.{}'.format(filename, i) for i in range(n_shards)]
+            model = ShardedLanguageModel(filenames)
+        else:
+            f = open(filename, 'rb')
+            model = pickle.load(f)
+            f.close()
 
     # load the data
-    # WORK HERE!! LOAD YOUR EVALUATION CORPUS
-    sents = gutenberg.sents('austen-persuasion.txt')
+    with profiler.stage('load'):
+        # WORK HERE!! LOAD YOUR EVALUATION CORPUS
+        sents = gutenberg.sents('austen-persuasion.txt')
 
     # compute the cross entropy
-    # WORK HERE!!
-    log_prob = None
-    e = None
-    p = None
+    with profiler.stage('evaluate'):
+        log_prob = model.log_prob(sents)
+        # the end marker '</s>' is also predicted, once per sentence
+        m = sum(len(sent) + 1 for sent in sents)
+        e = -log_prob / m
+        p = math.pow(2.0, e)
 
     print('Log probability: {}'.format(log_prob))
     print('Cross entropy: {}'.format(e))
     print('Perplexity: {}'.format(p))
+
+    profiler.close()
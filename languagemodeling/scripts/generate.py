@@ -1,34 +1,44 @@
 """Generate natural language sentences using a language model.
 
 Usage:
-  generate.py -i <file> -n <n>
+  generate.py -i <file> -n <n> [--profile <prof>] [--cprofile]
   generate.py -h | --help
 
 Options:
   -i <file>     Language model file.
   -n <n>        Number of sentences to generate.
+  --profile <prof>  Record wall time, CPU time and peak RSS per stage and
+                save a JSON summary to <prof>.
+  --cprofile    With --profile, also dump cProfile stats per stage.
   -h --help     Show this screen.
 """
 from docopt import docopt
 import pickle
 
 from languagemodeling.ngram_generator import NGramGenerator
+from common.profiling import Profiler
 
 
 if __name__ == '__main__':
     opts = docopt(__doc__)
+    profiler = Profiler(opts['--profile'], opts['--cprofile'])
 
     # load the model
-    filename = opts['-i']
-    f = open(filename, 'rb')
-    model = pickle.load(f)
-    f.close()
+    with profiler.stage('deserialize'):
+        filename = opts['-i']
+        f = open(filename, 'rb')
+        model = pickle.load(f)
+        f.close()
 
     # build generator
-    generator = NGramGenerator(model)
+    with profiler.stage('train'):
+        generator = NGramGenerator(model)
 
     # generate sentences
-    n = int(opts['-n'])
-    for i in range(n):
-        sent = generator.generate_sent()
-        print(' '.join(sent))
+    with profiler.stage('predict'):
+        n = int(opts['-n'])
+        for i in range(n):
+            sent = generator.generate_sent()
+            print(' '.join(sent))
+
+    profiler.close()
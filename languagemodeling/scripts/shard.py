@@ -0,0 +1,40 @@
+"""Split a language model into shards to be served by separate processes.
+
+Usage:
+  shard.py -i <file> -s <n> -o <prefix> [--profile <prof>] [--cprofile]
+  shard.py -h | --help
+
+Options:
+  -i <file>     Language model file.
+  -s <n>        Number of shards.
+  -o <prefix>   Prefix for the shard files (one '<prefix>.<i>' per shard).
+  --profile <prof>  Record wall time, CPU time and peak RSS per stage and
+                save a JSON summary to <prof>.
+  --cprofile    With --profile, also dump cProfile stats per stage.
+  -h --help     Show this screen.
+"""
+from docopt import docopt
+import pickle
+
+from languagemodeling.sharded import shard_model
+from common.profiling import Profiler
+
+
+if __name__ == '__main__':
+    opts = docopt(__doc__)
+    profiler = Profiler(opts['--profile'], opts['--cprofile'])
+
+    # load the model
+    with profiler.stage('deserialize'):
+        filename = opts['-i']
+        f = open(filename, 'rb')
+        model = pickle.load(f)
+        f.close()
+
+    # split and save it
+    with profiler.stage('serialize'):
+        filenames = shard_model(model, int(opts['-s']), opts['-o'])
+    for filename in filenames:
+        print(filename)
+
+    profiler.close()
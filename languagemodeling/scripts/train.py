@@ -1,7 +1,8 @@
 """Train an n-gram model.
 
 Usage:
-  train.py [-m <model>] -n <n> -o <file>
+  train.py [-m <model>] [-k <k> [-w <w>]] [-c] -n <n> -o <file>
+           [--profile <prof>] [--cprofile]
   train.py -h | --help
 
 Options:
@@ -10,36 +11,61 @@ Options:
                   ngram: Unsmoothed n-grams.
                   addone: N-grams with add-one smoothing.
                   inter: N-grams with interpolation smoothing.
+  -k <k>        Choose the smoothing hyper-parameter with k-fold
+                cross-validation (inter only).
+  -w <w>        Number of processes for the cross-validation (default: 1).
+  -c            Store the counts in compact NumPy buffers, so that
+                processes forked after loading the model share them.
   -o <file>     Output model file.
+  --profile <prof>  Record wall time, CPU time and peak RSS per stage and
+                save a JSON summary to <prof>.
+  --cprofile    With --profile, also dump cProfile stats per stage.
   -h --help     Show this screen.
 """
-from docopt import docopt
+from docopt import docopt, DocoptExit
 import pickle
 
 from nltk.corpus import gutenberg
 
-from languagemodeling.ngram import NGram
+from languagemodeling.ngram import NGram, InterpolatedNGram
+from languagemodeling.compact import compact
+from common.profiling import Profiler
 
 
 models = {
     'ngram': NGram,
+    'inter': InterpolatedNGram,
 }
 
 
 if __name__ == '__main__':
     opts = docopt(__doc__)
+    if (opts['-k'] or opts['-w']) and opts['-m'] != 'inter':
+        raise DocoptExit('-k and -w are only for -m inter')
+    profiler = Profiler(opts['--profile'], opts['--cprofile'])
 
     # load the data
-    # WORK HERE!! LOAD YOUR TRAINING CORPUS
-    sents = gutenberg.sents(['austen-emma.txt', 'austen-sense.txt'])
+    with profiler.stage('load'):
+        # WORK HERE!! LOAD YOUR TRAINING CORPUS
+        sents = gutenberg.sents(['austen-emma.txt', 'austen-sense.txt'])
 
     # train the model
-    n = int(opts['-n'])
-    model_class = models[opts['-m']]
-    model = model_class(n, sents)
+    with profiler.stage('train'):
+        n = int(opts['-n'])
+        model_class = models[opts['-m']]
+        if opts['-k']:
+            model = model_class(n, sents, folds=int(opts['-k']),
+                                workers=int(opts['-w'] or 1))
+        else:
+            model = model_class(n, sents)
+        if opts['-c']:
+            compact(model)
 
     # save it
-    filename = opts['-o']
-    f = open(filename, 'wb')
-    pickle.dump(model, f)
-    f.close()
+    with profiler.stage('serialize'):
+        filename = opts['-o']
+        f = open(filename, 'wb')
+        pickle.dump(model, f)
+        f.close()
+
+    profiler.close()
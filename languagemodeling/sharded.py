@@ -0,0 +1,278 @@
+"""Language models partitioned by context into shards served by separate
+processes.
+
+A trained model is split with shard_model() into N shard files, with every
+count stored in exactly one of them (see gram_shard()). A
+ShardedLanguageModel starts one process per shard file and behaves as a
+regular LanguageModel, batching the lookups of each call per shard.
+
+For NGram models a query only needs the counts of an n-gram and of its
+context, which are stored together, so each shard answers cond_prob() on
+its own. Models that look up counts of several orders in cond_prob()
+(InterpolatedNGram) tell which ones with a cond_prob_grams() method: their
+shards only answer counts, and the client computes the probabilities.
+"""
+from copy import copy
+from multiprocessing import Pipe, Process
+import math
+import pickle
+import zlib
+
+from languagemodeling.ngram import LanguageModel
+
+
+def context_shard(prev_tokens, n_shards):
+    """Shard responsible for a given context.
+
+    Python's hash() is salted per process, so a CRC of the tokens is used to
+    get the same partition in every process and every run.
+
+    prev_tokens -- the context tuple.
+    n_shards -- number of shards.
+    """
+    key = '\x1f'.join(prev_tokens).encode('utf-8')
+    return zlib.crc32(key) % n_shards
+
+
+def gram_shard(gram, n, n_shards):
+    """Shard that stores the count of a k-gram.
+
+    An n-gram goes to the shard of its context, and a shorter k-gram to its
+    own shard, so an (n-1)-gram is stored with the n-grams it is the context
+    of.
+
+    gram -- the k-gram tuple.
+    n -- order of the model.
+    n_shards -- number of shards.
+    """
+    if len(gram) == n:
+        gram = gram[:-1]
+    return context_shard(gram, n_shards)
+
+
+def shard_model(model, n_shards, prefix):
+    """Split a model into shard files and return their names.
+
+    model -- n-gram model (with counts in a '_count' dict).
+    n_shards -- number of shards.
+    prefix -- prefix for the shard filenames ('<prefix>.<i>').
+    """
+    n = model._n
+    counts = [{} for _ in range(n_shards)]
+    for gram, c in model._count.items():
+        counts[gram_shard(gram, n, n_shards)][gram] = c
+
+    client = None
+    if hasattr(model, 'cond_prob_grams'):
+        # the model without its counts, to compute the probabilities on the
+        # client side (only the size of the vocabulary is used)
+        client = copy(model)
+        client._count = {}
+        client._voc = None
+
+    filenames = []
+    for i, count in enumerate(counts):
+        shard = copy(model)
+        shard._count = count
+        if client is not None:
+            shard._voc = None
+        filename = '{}.{}'.format(prefix, i)
+        with open(filename, 'wb') as f:
+            pickle.dump({'shard': i, 'n_shards': n_shards, 'model': shard,
+                         'client': client}, f)
+        filenames.append(filename)
+
+    return filenames
+
+
+def serve_shard(filename, conn):
+    """Worker process loop: answer batches of queries.
+
+    The queries are pairs (token, prev_tokens) to answer with cond_prob(),
+    or k-grams to answer with their counts if the model is computed on the
+    client side.
+
+    filename -- the shard file.
+    conn -- connection to the client.
+    """
+    with open(filename, 'rb') as f:
+        shard = pickle.load(f)
+    model, client = shard['model'], shard['client']
+    conn.send((shard['shard'], shard['n_shards'], model._n, client))
+
+    while True:
+        queries = conn.recv()
+        if queries is None:
+            break
+        if client is None:
+            conn.send([model.cond_prob(token, prev_tokens)
+                       for token, prev_tokens in queries])
+        else:
+            conn.send([model.count(gram) for gram in queries])
+    conn.close()
+
+
+class ShardedLanguageModel(LanguageModel):
+    """Client-side facade for a model split with shard_model().
+    """
+
+    def __init__(self, filenames):
+        """
+        filenames -- the shard files, one process is started for each.
+        """
+        self._procs = procs = []
+        self._conns = conns = {}
+        for filename in filenames:
+            conn, child_conn = Pipe()
+            proc = Process(target=serve_shard, args=(filename, child_conn),
+                           daemon=True)
+            proc.start()
+            # only the child keeps its end open, so that recv() fails if it
+            # dies instead of waiting forever
+            child_conn.close()
+            procs.append(proc)
+            try:
+                shard, n_shards, n, client = conn.recv()
+            except EOFError:
+                conn.close()
+                self.close()
+                raise IOError('shard process could not load {}'.format(
+                    filename)) from None
+            conns[shard] = conn
+
+        assert set(conns) == set(range(n_shards)), 'missing or repeated shards'
+        self._n_shards = n_shards
+        self._n = n
+        self._client = client
+
+    def _scatter_gather(self, batches):
+        """Send a batch of queries to each shard, all of them working at the
+        same time, and return the answers of each one.
+
+        batches -- list of query lists, one per shard.
+        """
+        for shard, batch in enumerate(batches):
+            if batch:
+                self._conns[shard].send(batch)
+        return [self._conns[shard].recv() if batch else []
+                for shard, batch in enumerate(batches)]
+
+    def counts(self, grams):
+        """Counts of k-grams, as a dict.
+
+        grams -- iterable of k-gram tuples.
+        """
+        n, n_shards = self._n, self._n_shards
+        batches = [[] for _ in range(n_shards)]
+        for gram in set(grams):
+            batches[gram_shard(gram, n, n_shards)].append(gram)
+
+        count = {}
+        for batch, answers in zip(batches, self._scatter_gather(batches)):
+            count.update(zip(batch, answers))
+        return count
+
+    def cond_probs(self, queries):
+        """Conditional probabilities for a batch of queries.
+
+        All the lookups of a shard are sent in a single message.
+
+        queries -- list of pairs (token, prev_tokens).
+        """
+        queries = [(token, tuple(prev_tokens or ()))
+                   for token, prev_tokens in queries]
+
+        client = self._client
+        if client is not None:
+            # fetch the counts, and compute the probabilities here
+            model = copy(client)
+            model._count = self.counts(
+                gram for token, prev_tokens in queries
+                for gram in client.cond_prob_grams(token, prev_tokens))
+            return [model.cond_prob(token, prev_tokens)
+                    for token, prev_tokens in queries]
+
+        n_shards = self._n_shards
+        batches = [[] for _ in range(n_shards)]
+        positions = [[] for _ in range(n_shards)]
+        for i, (token, prev_tokens) in enumerate(queries):
+            shard = context_shard(prev_tokens, n_shards)
+            batches[shard].append((token, prev_tokens))
+            positions[shard].append(i)
+
+        probs = [None] * len(queries)
+        answers = self._scatter_gather(batches)
+        for shard_positions, shard_probs in zip(positions, answers):
+            for i, p in zip(shard_positions, shard_probs):
+                probs[i] = p
+        return probs
+
+    def cond_prob(self, token, prev_tokens=None):
+        """Conditional probability of a token.
+
+        token -- the token.
+        prev_tokens -- the previous n-1 tokens (optional only if n = 1).
+        """
+        return self.cond_probs([(token, prev_tokens)])[0]
+
+    def sent_prob(self, sent):
+        """Probability of a sentence. Warning: subject to underflow problems.
+
+        sent -- the sentence as a list of tokens.
+        """
+        prob = 1.0
+        for p in self.cond_probs(self.sent_ngrams(sent)):
+            prob *= p
+        return prob
+
+    def sent_log_prob(self, sent):
+        """Log-probability of a sentence.
+
+        sent -- the sentence as a list of tokens.
+        """
+        return self.sents_log_probs([sent])[0]
+
+    def sents_log_probs(self, sents):
+        """Log-probabilities of a list of sentences, in a single round trip to
+        the shards.
+
+        sents -- the sentences.
+        """
+        queries, lengths = [], []
+        for sent in sents:
+            ngrams = self.sent_ngrams(sent)
+            queries.extend(ngrams)
+            lengths.append(len(ngrams))
+
+        probs = iter(self.cond_probs(queries))
+        result = []
+        for length in lengths:
+            log_prob = 0.0
+            for _ in range(length):
+                p = next(probs)
+                log_prob += math.log2(p) if p > 0.0 else -math.inf
+            result.append(log_prob)
+        return result
+
+    def log_prob(self, sents):
+        """Log-probability of a list of sentences.
+
+        sents -- the sentences.
+        """
+        return sum(self.sents_log_probs(sents))
+
+    def close(self):
+        """Stop the shard processes."""
+        for conn in self._conns.values():
+            conn.send(None)
+            conn.close()
+        for proc in self._procs:
+            proc.join()
+        self._conns = {}
+        self._procs = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
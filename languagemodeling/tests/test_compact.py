@@ -0,0 +1,62 @@
+# https://docs.python.org/3/library/unittest.html
+from unittest import TestCase
+from tempfile import TemporaryDirectory
+import pickle
+
+import numpy as np
+
+from languagemodeling.ngram import NGram
+from languagemodeling.compact import CompactCounts, compact
+
+
+class TestCompactCounts(TestCase):
+
+    def setUp(self):
+        self.sents = [
+            'el gato come pescado .'.split(),
+            'la gata come salmón .'.split(),
+        ]
+
+    def test_counts(self):
+        for n in [1, 2, 3]:
+            ngram = NGram(n, self.sents)
+            count = dict(ngram._count)
+            compact(ngram)
+
+            self.assertIsInstance(ngram._count, CompactCounts)
+            self.assertEqual(dict(ngram._count), count)
+            for gram, c in count.items():
+                self.assertEqual(ngram.count(gram), c, gram)
+            self.assertEqual(ngram.count(('salame',)), 0)
+            self.assertEqual(ngram.count(('come', 'salame')), 0)
+
+    def test_cond_prob(self):
+        ngram = compact(NGram(2, self.sents))
+
+        probs = {
+            ('pescado', 'come'): 0.5,
+            ('salmón', 'come'): 0.5,
+            ('salame', 'come'): 0.0,
+        }
+        for (token, prev), p in probs.items():
+            self.assertAlmostEqual(ngram.cond_prob(token, (prev,)), p)
+
+    def test_pickle_and_mmap(self):
+        ngram = NGram(3, self.sents)
+        count = dict(ngram._count)
+        compact(ngram)
+
+        ngram2 = pickle.loads(pickle.dumps(ngram))
+        self.assertEqual(dict(ngram2._count), count)
+        self.assertEqual(ngram2.count(('el', 'gato', 'come')), 1)
+        # the key buffers are stored once, and shared by their views
+        counts2 = ngram2._count
+        for k, keys in counts2._keys.items():
+            if k:
+                self.assertTrue(
+                    np.shares_memory(counts2._void_keys[k], keys))
+
+        with TemporaryDirectory() as dirname:
+            ngram._count.save(dirname)
+            counts = CompactCounts.load(dirname)
+            self.assertEqual(dict(counts), count)
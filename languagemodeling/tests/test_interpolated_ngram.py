@@ -1,7 +1,9 @@
 # https://docs.python.org/3/library/unittest.html
 from unittest import TestCase
+from unittest.mock import patch
 
 from languagemodeling.ngram import InterpolatedNGram
+from languagemodeling.ngram import kgram_counts, subtract_counts, add_counts
 
 
 class TestInterpolatedNGram(TestCase):
@@ -173,5 +175,44 @@ class TestInterpolatedNGram(TestCase):
         for gram, c in counts.items():
             self.assertEqual(model.count(gram), c, gram)
 
+    def test_subtract_counts(self):
+        sents = self.sents + ['el gato come salmón .'.split()]
+        for n in [1, 2, 3]:
+            total = dict(kgram_counts(n, sents))
+            fold = kgram_counts(n, sents[1:2])
+            count = subtract_counts(total, fold)
+            # in place, without zero entries
+            self.assertIs(count, total)
+            self.assertEqual(count, dict(kgram_counts(n, sents[::2])))
+
+            add_counts(total, fold)
+            self.assertEqual(total, dict(kgram_counts(n, sents)))
+
+    def test_folds(self):
+        sents = self.sents * 3
+        model = InterpolatedNGram(2, sents, folds=3)
+
+        # all the sentences are used for training
+        self.assertEqual(model.count(()), 36)
+        self.assertEqual(model.count(('come', 'pescado')), 3)
+        self.assertIn(model._gamma, InterpolatedNGram.gammas)
+
+        model2 = InterpolatedNGram(2, sents, folds=3, workers=2)
+        self.assertEqual(model2._gamma, model._gamma)
+        self.assertEqual(model2._count, model._count)
+
+        # each sentence is counted once
+        counted = []
+
+        def spy(n, sents, count=None):
+            sents = list(sents)
+            counted.extend(sents)
+            return kgram_counts(n, sents, count)
+
+        with patch('languagemodeling.ngram.kgram_counts', spy):
+            model3 = InterpolatedNGram(2, sents, folds=3)
+        self.assertEqual(len(counted), len(sents))
+        self.assertEqual(model3._count, dict(kgram_counts(2, sents)))
+
     def assertAlmostLessEqual(self, a, b, places=7, msg=None):
         self.assertTrue(a < b or round(abs(a - b), places) == 0, msg=msg)
@@ -0,0 +1,98 @@
+# https://docs.python.org/3/library/unittest.html
+from unittest import TestCase
+from tempfile import TemporaryDirectory
+import os
+import pickle
+
+from languagemodeling.ngram import NGram, InterpolatedNGram
+from languagemodeling.sharded import shard_model, ShardedLanguageModel
+
+
+class TestShardedNGram(TestCase):
+
+    def setUp(self):
+        self.sents = [
+            'el gato come pescado .'.split(),
+            'la gata come salmón .'.split(),
+        ]
+        self.tmpdir = TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def sharded(self, model, n_shards):
+        prefix = os.path.join(self.tmpdir.name, 'model')
+        filenames = shard_model(model, n_shards, prefix)
+        self.assertEqual(len(filenames), n_shards)
+        return ShardedLanguageModel(filenames)
+
+    def test_cond_prob_2gram(self):
+        ngram = NGram(2, self.sents)
+
+        with self.sharded(ngram, 3) as model:
+            probs = {
+                ('pescado', 'come'): 0.5,
+                ('salmón', 'come'): 0.5,
+                ('salame', 'come'): 0.0,
+                ('el', '<s>'): 0.5,
+            }
+            for (token, prev), p in probs.items():
+                self.assertAlmostEqual(model.cond_prob(token, (prev,)), p)
+
+    def test_sent_log_prob(self):
+        sents = [
+            'el gato come pescado .'.split(),
+            'la gata come salmón .'.split(),
+            'el gato come salame .'.split(),
+            'la la la'.split(),
+        ]
+        for n in [1, 2, 3]:
+            ngram = NGram(n, self.sents)
+            with self.sharded(ngram, 4) as model:
+                for sent in sents:
+                    self.assertAlmostEqual(model.sent_log_prob(sent),
+                                           ngram.sent_log_prob(sent),
+                                           msg=(n, sent))
+                    self.assertAlmostEqual(model.sent_prob(sent),
+                                           ngram.sent_prob(sent),
+                                           msg=(n, sent))
+                self.assertAlmostEqual(model.log_prob(sents[:2]),
+                                       ngram.log_prob(sents[:2]))
+
+    def test_partition(self):
+        ngram = InterpolatedNGram(3, self.sents, gamma=1.0)
+        prefix = os.path.join(self.tmpdir.name, 'model')
+
+        # every count is stored in exactly one shard
+        count = {}
+        for filename in shard_model(ngram, 4, prefix):
+            with open(filename, 'rb') as f:
+                shard = pickle.load(f)
+            shard_count = shard['model']._count
+            self.assertFalse(set(shard_count) & set(count))
+            count.update(shard_count)
+        self.assertEqual(count, ngram._count)
+
+    def test_interpolated(self):
+        sents = [
+            'el gato come pescado .'.split(),
+            'el gato come salame .'.split(),
+            'la la la'.split(),
+        ]
+        for n in [1, 2, 3]:
+            for addone in [True, False]:
+                ngram = InterpolatedNGram(n, self.sents, gamma=1.0,
+                                          addone=addone)
+                with self.sharded(ngram, 3) as model:
+                    for sent in sents:
+                        self.assertAlmostEqual(model.sent_log_prob(sent),
+                                               ngram.sent_log_prob(sent),
+                                               msg=(n, addone, sent))
+                    prev = ('el',) * (n - 1)
+                    self.assertAlmostEqual(model.cond_prob('gato', prev),
+                                           ngram.cond_prob('gato', prev))
+
+    def test_missing_shard(self):
+        filename = os.path.join(self.tmpdir.name, 'missing.0')
+        with self.assertRaises(IOError):
+            ShardedLanguageModel([filename])
@@ -4,6 +4,8 @@ from sklearn.naive_bayes import MultinomialNB
 from sklearn.svm import LinearSVC
 from sklearn.linear_model import LogisticRegression
 
+from common.memory import memory_report
+
 
 classifiers = {
     'maxent': LogisticRegression,
@@ -29,3 +31,10 @@ class SentimentClassifier(object):
 
     def predict(self, X):
         return self._pipeline.predict(X)
+
+    def memory_report(self, seen=None):
+        """Memory usage of the model, broken down by component.
+
+        seen -- set of ids of objects already counted (updated in place).
+        """
+        return memory_report(self, seen)
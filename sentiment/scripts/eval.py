@@ -1,13 +1,16 @@
 """Evaulate a Sentiment Analysis model.
 
 Usage:
-  eval.py -c <corpus> -i <file>
+  eval.py -c <corpus> -i <file> [--profile <prof>] [--cprofile]
   eval.py -h | --help
 
 Options:
   -c <corpus>   Evaluation corpus.
   -i <file>     Trained model file.
   -f --final    Use final test set instead of development.
+  --profile <prof>  Record wall time, CPU time and peak RSS per stage and
+                save a JSON summary to <prof>.
+  --cprofile    With --profile, also dump cProfile stats per stage.
   -h --help     Show this screen.
 """
 from docopt import docopt
@@ -17,31 +20,39 @@ from collections import defaultdict
 
 from sentiment.evaluator import Evaluator
 from sentiment.tass import InterTASSReader
+from common.profiling import Profiler
 
 if __name__ == '__main__':
     opts = docopt(__doc__)
+    profiler = Profiler(opts['--profile'], opts['--cprofile'])
 
     # load model
-    filename = opts['-i']
-    f = open(filename, 'rb')
-    model = pickle.load(f)
-    f.close()
+    with profiler.stage('deserialize'):
+        filename = opts['-i']
+        f = open(filename, 'rb')
+        model = pickle.load(f)
+        f.close()
 
     # load evaluation corpus
-    corpus = opts['-c']
-    reader = InterTASSReader(corpus)
-    X, y_true = list(reader.X()), list(reader.y())
+    with profiler.stage('load'):
+        corpus = opts['-c']
+        reader = InterTASSReader(corpus)
+        X, y_true = list(reader.X()), list(reader.y())
 
     # classify
-    y_pred = model.predict(X)
+    with profiler.stage('predict'):
+        y_pred = model.predict(X)
 
     # evaluate and print
-    evaluator = Evaluator()
-    evaluator.evaluate(y_true, y_pred)
-    evaluator.print_results()
-    evaluator.print_confusion_matrix()
-
-    # detailed confusion matrix, for result analysis
-    cm_items = defaultdict(list)
-    for i, (true, pred) in enumerate(zip(y_true, y_pred)):
-        cm_items[true, pred] += [i]
+    with profiler.stage('evaluate'):
+        evaluator = Evaluator()
+        evaluator.evaluate(y_true, y_pred)
+        evaluator.print_results()
+        evaluator.print_confusion_matrix()
+
+        # detailed confusion matrix, for result analysis
+        cm_items = defaultdict(list)
+        for i, (true, pred) in enumerate(zip(y_true, y_pred)):
+            cm_items[true, pred] += [i]
+
+    profiler.close()
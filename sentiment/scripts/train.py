@@ -14,6 +14,9 @@ Options:
                   svm: Support Vector Machine
                   mnb: Multinomial Bayes
   -o <file>    Output model file.
+  --profile <prof>  Record wall time, CPU time and peak RSS per stage and
+                save a JSON summary to <prof>.
+  --cprofile    With --profile, also dump cProfile stats per stage.
   -h --help     Show this screen.
 """
 from docopt import docopt
@@ -22,6 +25,7 @@ import pickle
 from sentiment.tass import InterTASSReader
 from sentiment.baselines import MostFrequent
 from sentiment.classifier import SentimentClassifier
+from common.profiling import Profiler
 
 
 models = {
@@ -32,23 +36,29 @@ models = {
 
 if __name__ == '__main__':
     opts = docopt(__doc__)
+    profiler = Profiler(opts['--profile'], opts['--cprofile'])
 
     # load corpora
-    corpus = opts['-i']
-    reader = InterTASSReader(corpus)
-    X, y = list(reader.X()), list(reader.y())
+    with profiler.stage('load'):
+        corpus = opts['-i']
+        reader = InterTASSReader(corpus)
+        X, y = list(reader.X()), list(reader.y())
 
     # train model
-    model_type = opts['-m']
-    if model_type == 'clf':
-        model = models[model_type](clf=opts['-c'])
-    else:
-        model = models[model_type]()  # baseline
+    with profiler.stage('train'):
+        model_type = opts['-m']
+        if model_type == 'clf':
+            model = models[model_type](clf=opts['-c'])
+        else:
+            model = models[model_type]()  # baseline
 
-    model.fit(X, y)
+        model.fit(X, y)
 
     # save model
-    filename = opts['-o']
-    f = open(filename, 'wb')
-    pickle.dump(model, f)
-    f.close()
+    with profiler.stage('serialize'):
+        filename = opts['-o']
+        f = open(filename, 'wb')
+        pickle.dump(model, f)
+        f.close()
+
+    profiler.close()
@@ -1,18 +1,27 @@
+from collections import deque
+from itertools import chain
+from multiprocessing import Pool
+import os
+from xml.etree import ElementTree
+
 from nltk.corpus.reader.api import SyntaxCorpusReader
 from nltk.corpus.reader import xmldocs
 from nltk import tree
 from nltk.util import LazyMap, LazyConcatenation
 
+from tagging.cache import TaggedCorpus, cache_filename
+
 
-def parsed(element):
+def parsed(element, tag=None):
     """Converts a 'sentence' XML element (xml.etree.ElementTree.Element) to
     an NLTK tree.
 
     element -- the XML sentence element (or a subelement)
+    tag -- function to convert the POS tags (default: keep them).
     """
     if element:
         # element viewed as a list is non-empty (it has subelements)
-        subtrees = map(parsed, element)  # recursive call here!
+        subtrees = (parsed(e, tag) for e in element)  # recursive call here!
         subtrees = [t for t in subtrees if t is not None]
         return tree.Tree(element.tag, subtrees)
     else:
@@ -20,8 +29,32 @@ def parsed(element):
         if element.get('elliptic') == 'yes' and not element.get('wd'):
             return None
         else:
-            return tree.Tree(element.get('pos') or element.get('ne') or 'unk',
-                             [element.get('wd')])
+            label = element.get('pos') or element.get('ne') or 'unk'
+            if tag is not None:
+                label = tag(label)
+            return tree.Tree(label, [element.get('wd')])
+
+
+def terminals(element):
+    """Iterates over the terminal elements with a word of a 'sentence' XML
+    element, in order. These are the leaves of parsed(element), without
+    building the tree: elliptic nodes and nodes without a word are skipped.
+
+    element -- the XML sentence element (or a subelement)
+    """
+    for e in element.iter():
+        if not len(e):
+            w = e.get('wd')
+            if w is not None and (w or e.get('elliptic') != 'yes'):
+                yield e
+
+
+def has_words(element):
+    """Checks if a 'sentence' XML element results in a non-empty sentence.
+
+    element -- the XML sentence element (or a subelement)
+    """
+    return next(terminals(element), None) is not None
 
 
 def tagged(element):
@@ -30,15 +63,9 @@ def tagged(element):
 
     element -- the XML sentence element (or a subelement)
     """
-    # http://www.w3schools.com/xpath/xpath_syntax.asp
-    # XXX: XPath '//*[@wd]' not working
-    # return [(x.get('wd'), x.get('pos') or x.get('ne'))
-    #         for x in element.findall('*//*[@wd]')] + [('.', 'fp')]
-
-    # convert to tree and get the tagged sent
-    pos = parsed(element).pos()
-    # filter None words (may return an emtpy list)
-    return list(filter(lambda x: x[0] is not None, pos))
+    # same as parsed(element).pos() without the None words
+    return [(e.get('wd'), e.get('pos') or e.get('ne') or 'unk')
+            for e in terminals(element)]
 
 
 def untagged(element):
@@ -47,40 +74,212 @@ def untagged(element):
 
     element -- the XML sentence element (or a subelement)
     """
-    # http://www.w3schools.com/xpath/xpath_syntax.asp
-    # XXX: XPath '//*[@wd]' not working
-    # return [x.get('wd') for x in element.findall('*//*[@wd]')] + [('.', 'fp')]
+    # same as parsed(element).leaves() without the None words
+    return [e.get('wd') for e in terminals(element)]
+
+
+def simple_parsed(element):
+    """Converts a 'sentence' XML element to an NLTK tree with the simplified
+    POS tags (see simple_tag()).
+
+    element -- the XML sentence element (or a subelement)
+    """
+    return parsed(element, cached_simple_tag)
+
+
+def simple_tagged(element):
+    """Converts a 'sentence' XML element to a sentence tagged with the
+    simplified POS tags (see simple_tag()).
+
+    element -- the XML sentence element (or a subelement)
+    """
+    return [(w, cached_simple_tag(t)) for w, t in tagged(element)]
+
+
+def iter_elements(source):
+    """Iterates over the sentence elements of an AnCora XML file (the
+    children of the top element), parsing it incrementally.
+
+    Each element is cleared and dropped when the next one is requested, so
+    memory stays bounded by the size of a sentence instead of a file.
+
+    source -- file name or binary file object.
+    """
+    root = None
+    depth = 0
+    for event, element in ElementTree.iterparse(source, ('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = element
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 1:
+            yield element
+            element.clear()
+            # drop the finished sentences from the top element
+            root.clear()
+
 
-    # convert to tree and get the sent
-    sent = parsed(element).leaves()
-    # filter None words (may return an emtpy list)
-    return list(filter(lambda x: x is not None, sent))
+def _convert_file(args):
+    function, path = args
+    return [function(element) for element in iter_elements(path)
+            if has_words(element)]
+
+
+def convert_files(function, paths, workers):
+    """Converts the sentence elements of several files in a pool of
+    processes, one file per task, and yields the results in file order.
+
+    At most two files per worker are parsed ahead of the consumer, so memory
+    stays bounded even if it is slower than the pool.
+
+    function -- module level conversion function (e.g. parsed, tagged or
+        untagged).
+    paths -- the file paths.
+    workers -- number of worker processes.
+    """
+    with Pool(workers) as pool:
+        pending = deque()
+        for path in paths:
+            task = (function, path)
+            pending.append(pool.apply_async(_convert_file, (task,)))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
 
 
 class AncoraCorpusReader(SyntaxCorpusReader):
 
-    def __init__(self, path, files=None):
+    # name of the tagset of the tagged sentences (part of the cache keys of
+    # the data computed from them)
+    tagset = 'ancora'
+
+    def __init__(self, path, files=None, cache_dir=None, stream=False,
+                 workers=1):
+        """
+        path -- corpus root directory.
+        files -- regular expression for the corpus files (default: all the
+            '.tbf.xml' files).
+        cache_dir -- if given, tagged_sents() and sents() are served from a
+            binary cache in this directory, written on first use.
+        stream -- if True, the corpus views are single-pass generators that
+            parse the files incrementally, with memory bounded by the size
+            of a sentence (default: False, lazy sequences).
+        workers -- number of processes that parse files in parallel. With
+            more than one, the sentence views are also single-pass
+            generators, in file order (default: 1).
+        """
         if files is None:
             files = '.*\.tbf\.xml'
         self.xmlreader = xmldocs.XMLCorpusReader(path, files)
+        self._cache_dir = cache_dir
+        self._cached = {}
+        self._stream = stream
+        self._workers = workers
+
+    def _map(self, function, items):
+        """Maps lazily: a generator when streaming, a LazyMap otherwise."""
+        if self._stream or self._workers > 1:
+            return map(function, items)
+        return LazyMap(function, items)
+
+    def _convert(self, function, fileids=None):
+        """Converts the sentence elements with a module level function,
+        in parallel if there are several workers."""
+        if self._workers > 1:
+            if not fileids:
+                fileids = self.xmlreader.fileids()
+            paths = [str(self.xmlreader.abspath(f)) for f in fileids]
+            return convert_files(function, paths, self._workers)
+        return self._map(function, self.elements(fileids))
 
     def parsed_sents(self, fileids=None):
-        return LazyMap(parsed, self.elements(fileids))
+        return self._convert(parsed, fileids)
 
     def tagged_sents(self, fileids=None):
-        return LazyMap(tagged, self.elements(fileids))
+        if self._cache_dir is not None:
+            return self.cached_corpus(fileids).tagged_sents()
+        return self._tagged_sents(fileids)
+
+    def _tagged_sents(self, fileids=None):
+        return self._convert(tagged, fileids)
 
     def sents(self, fileids=None):
-        return LazyMap(untagged, self.elements(fileids))
+        if self._cache_dir is not None:
+            return self.cached_corpus(fileids).sents()
+        return self._convert(untagged, fileids)
+
+    def cached_corpus(self, fileids=None):
+        """The tagged sentences as a TaggedCorpus, loaded from the cache or
+        parsed and saved to it.
+
+        fileids -- the files (default: all the files of the reader).
+        """
+        # the cache keeps the full tags, other tagsets are derived from them
+        filename = cache_filename(self._cache_dir, self._paths(fileids),
+                                  'ancora')
+
+        corpus = self._cached.get(filename)
+        if corpus is None:
+            if os.path.exists(filename):
+                corpus = TaggedCorpus.load(filename)
+            else:
+                corpus = TaggedCorpus.from_tagged_sents(
+                    self._convert(tagged, fileids))
+                corpus.save(filename)
+            corpus = self._map_tags(corpus)
+            self._cached[filename] = corpus
+        return corpus
+
+    def cache_filename(self, name, settings=None, fileids=None):
+        """Cache file for data computed from the tagged sentences, such as
+        feature matrices (None if the reader has no cache directory).
+
+        name -- kind of data, also the file name prefix (e.g. 'features').
+        settings -- JSON-serializable settings that the data depends on.
+        fileids -- the files (default: all the files of the reader).
+        """
+        if self._cache_dir is None:
+            return None
+        return cache_filename(self._cache_dir, self._paths(fileids), name,
+                              [self.tagset, settings])
+
+    def _paths(self, fileids=None):
+        if not fileids:
+            fileids = self.xmlreader.fileids()
+        return [os.path.abspath(str(self.xmlreader.abspath(f)))
+                for f in fileids]
+
+    def _map_tags(self, corpus):
+        """Converts a TaggedCorpus with the full tags to the tagset of the
+        reader."""
+        return corpus
 
     def elements(self, fileids=None):
-        # FIXME: skip sentence elements that will result in empty sentences!
+        """Sentence elements, skipping those that result in empty sentences
+        (e.g. with only elliptic nodes).
+
+        fileids -- the files (default: all the files of the reader).
+        """
         if not fileids:
             fileids = self.xmlreader.fileids()
+        if self._stream:
+            return self._iter_elements(fileids)
         # xml() returns a top element that is also a list of sentence elements
-        return LazyConcatenation(self.xmlreader.xml(f) for f in fileids)
+        return LazyConcatenation(
+            [e for e in self.xmlreader.xml(f) if has_words(e)]
+            for f in fileids)
+
+    def _iter_elements(self, fileids):
+        for f in fileids:
+            with self.xmlreader.abspath(f).open() as stream:
+                yield from filter(has_words, iter_elements(stream))
 
     def tagged_words(self, fileids=None):
+        if self._stream or self._workers > 1:
+            return chain.from_iterable(self.tagged_sents(fileids))
         return LazyConcatenation(self.tagged_sents(fileids))
 
     def __repr__(self):
@@ -93,22 +292,22 @@ class SimpleAncoraCorpusReader(AncoraCorpusReader):
     https://nlp.stanford.edu/software/spanish-faq.shtml#tagset
     """
 
-    def __init__(self, path, files=None):
-        super().__init__(path, files)
+    tagset = 'simple'
 
-    def tagged_sents(self, fileids=None):
-        def f(s): return [(w, simple_tag(t)) for w, t in s]
-        return LazyMap(f, super().tagged_sents(fileids))
+    def __init__(self, path, files=None, cache_dir=None, stream=False,
+                 workers=1):
+        super().__init__(path, files, cache_dir, stream, workers)
+
+    def _tagged_sents(self, fileids=None):
+        return self._convert(simple_tagged, fileids)
 
     def parsed_sents(self, fileids=None):
-        def f(t):
-            for p in t.treepositions('leaves'):
-                if len(p) > 1:
-                    tag = t[p[:-1]].label()
-                    t[p[:-1]].set_label(simple_tag(tag))
-            return t
+        # the trees are built with the simplified tags, not relabeled
+        return self._convert(simple_parsed, fileids)
 
-        return LazyMap(f, super().parsed_sents(fileids))
+    def _map_tags(self, corpus):
+        # a gather over the tag ids, with a table for the (small) tagset
+        return corpus.map_tags(cached_simple_tag)
 
 
 def simple_tag(t):
@@ -153,3 +352,18 @@ def simple_tag(t):
     else:
         # not a valid POS: named entity ('ne' field) or 'unk'
         return t
+
+
+# simple_tag() of the tags seen so far (the full tagset is small)
+_simple_tags = {}
+
+
+def cached_simple_tag(t):
+    """Memoized simple_tag().
+
+    t -- the AnCora POS tag.
+    """
+    s = _simple_tags.get(t)
+    if s is None:
+        s = _simple_tags[t] = simple_tag(t)
+    return s
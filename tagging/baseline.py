@@ -1,5 +1,8 @@
 from collections import defaultdict
 
+from common.memory import memory_report
+from tagging.parallel import pool_tag_sents
+
 
 class BadBaselineTagger:
 
@@ -16,6 +19,17 @@ class BadBaselineTagger:
         """
         return [self.tag_word(w) for w in sent]
 
+    def tag_sents(self, sents, workers=1, chunksize=None):
+        """Tag sentences.
+
+        sents -- the sentences.
+        workers -- number of worker processes (default: 1).
+        chunksize -- number of sentences sent to a worker at a time.
+        """
+        if workers > 1:
+            return pool_tag_sents(self, sents, workers, chunksize)
+        return [self.tag(sent) for sent in sents]
+
     def tag_word(self, w):
         """Tag a word.
 
@@ -38,7 +52,15 @@ class BaselineTagger:
         tagged_sents -- training sentences, each one being a list of pairs.
         default_tag -- tag for unknown words.
         """
-        # WORK HERE!!
+        self._default_tag = default_tag
+
+        # most frequent tag of each word
+        counts = defaultdict(lambda: defaultdict(int))
+        for sent in tagged_sents:
+            for w, t in sent:
+                counts[w][t] += 1
+        self._tag = {w: max(c.items(), key=lambda x: x[1])[0]
+                     for w, c in counts.items()}
 
     def tag(self, sent):
         """Tag a sentence.
@@ -47,16 +69,34 @@ class BaselineTagger:
         """
         return [self.tag_word(w) for w in sent]
 
+    def tag_sents(self, sents, workers=1, chunksize=None):
+        """Tag sentences.
+
+        sents -- the sentences.
+        workers -- number of worker processes (default: 1).
+        chunksize -- number of sentences sent to a worker at a time.
+        """
+        if workers > 1:
+            return pool_tag_sents(self, sents, workers, chunksize)
+        return [self.tag(sent) for sent in sents]
+
     def tag_word(self, w):
         """Tag a word.
 
         w -- the word.
         """
-        # WORK HERE!!
+        return self._tag.get(w, self._default_tag)
 
     def unknown(self, w):
         """Check if a word is unknown for the model.
 
         w -- the word.
         """
-        # WORK HERE!!
+        return w not in self._tag
+
+    def memory_report(self, seen=None):
+        """Memory usage of the model, broken down by component.
+
+        seen -- set of ids of objects already counted (updated in place).
+        """
+        return memory_report(self, seen)
@@ -0,0 +1,239 @@
+"""Binary cache of tagged corpora and feature matrices.
+
+Parsing the AnCora XML files takes much longer than training most of the
+taggers. A TaggedCorpus keeps the tagged sentences in a few integer columns
+(word ids, tag ids and sentence offsets, plus the word and tag vocabularies)
+that are saved once to a single .npz file and loaded back in the next runs.
+The file name is a hash of the corpus files (names, sizes and modification
+times) and of the tagset, so that any change in the corpus gives a new cache
+file instead of stale data.
+
+Feature matrices computed from a corpus (and their labels) are cached in the
+same way by save_features() and load_features(), with the feature settings
+as part of the key.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+from scipy import sparse
+from nltk.util import LazyMap
+
+
+# bump when the file layout or the sentences given by the readers change
+CACHE_VERSION = 2
+
+
+def cache_filename(cache_dir, paths, name, settings=None):
+    """Cache file for data computed from a list of corpus files.
+
+    cache_dir -- the cache directory.
+    paths -- list of paths of the corpus files.
+    name -- kind of data, also the file name prefix (e.g. 'ancora' or
+        'features').
+    settings -- JSON-serializable settings that the data depends on
+        (default: None).
+    """
+    files = []
+    for path in paths:
+        st = os.stat(path)
+        files.append([str(path), st.st_size, st.st_mtime_ns])
+    key = json.dumps([CACHE_VERSION, name, settings, files])
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, '{}-{}.npz'.format(name, digest[:16]))
+
+
+def _savez(filename, **arrays):
+    """np.savez to a temporary file renamed at the end, so that concurrent
+    runs never read a partial file."""
+    os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+    tmp = '{}.{}.tmp'.format(filename, os.getpid())
+    with open(tmp, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, filename)
+
+
+def _encode_strings(strings):
+    """UTF-8 blob and byte offsets of a list of strings."""
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def _decode_strings(blob, offsets):
+    data = blob.tobytes()
+    offsets = offsets.tolist()
+    return [data[offsets[i]:offsets[i + 1]].decode('utf-8')
+            for i in range(len(offsets) - 1)]
+
+
+def save_features(filename, X, y=None, words=None, feature_names=None,
+                  word_tags=None):
+    """Save a sparse feature matrix to a .npz file (atomically).
+
+    filename -- the file name.
+    X -- the feature matrix (scipy sparse, saved in CSR format).
+    y -- the labels of the rows (optional).
+    words -- the training words (optional).
+    feature_names -- the names of the columns (optional).
+    word_tags -- the labels seen with each word of words (optional, needs
+        y).
+    """
+    if word_tags is not None and y is None:
+        # the tags are saved as ids into the labels of y
+        raise ValueError('word_tags needs y')
+    X = X.tocsr()
+    arrays = {'data': X.data, 'indices': X.indices, 'indptr': X.indptr,
+              'shape': np.array(X.shape, dtype=np.int64)}
+    # the labels as ids into their (small) set of values
+    if y is not None:
+        labels, y_ids = np.unique(np.asarray(y, dtype=str),
+                                  return_inverse=True)
+        arrays['labels'], arrays['labels_offsets'] = _encode_strings(labels)
+        arrays['y_ids'] = y_ids.astype(np.int32)
+    for key, strings in [('words', words), ('feature_names', feature_names)]:
+        if strings is not None:
+            arrays[key], arrays[key + '_offsets'] = _encode_strings(strings)
+    if word_tags is not None:
+        label_ids = {l: i for i, l in enumerate(labels.tolist())}
+        arrays['word_tags'] = np.array(
+            [label_ids[t] for tags in word_tags for t in tags], dtype=np.int32)
+        arrays['word_tags_offsets'] = np.zeros(len(word_tags) + 1,
+                                               dtype=np.int64)
+        arrays['word_tags_offsets'][1:] = np.cumsum(
+            [len(tags) for tags in word_tags])
+    _savez(filename, **arrays)
+
+
+def load_features(filename):
+    """Load the data saved with save_features(): a (X, y, words,
+    feature_names, word_tags) tuple, with None for the missing parts.
+
+    filename -- the file name.
+    """
+    with np.load(filename) as data:
+        X = sparse.csr_matrix(
+            (data['data'], data['indices'], data['indptr']),
+            shape=tuple(data['shape']))
+        y = word_tags = None
+        if 'y_ids' in data:
+            labels = _decode_strings(data['labels'], data['labels_offsets'])
+            y = np.array(labels)[data['y_ids']]
+        words, feature_names = [
+            _decode_strings(data[key], data[key + '_offsets'])
+            if key in data else None
+            for key in ['words', 'feature_names']]
+        if 'word_tags' in data:
+            tags = [labels[i] for i in data['word_tags'].tolist()]
+            offsets = data['word_tags_offsets'].tolist()
+            word_tags = [tags[offsets[i]:offsets[i + 1]]
+                         for i in range(len(offsets) - 1)]
+    return X, y, words, feature_names, word_tags
+
+
+class TaggedCorpus:
+    """Tagged sentences stored as integer columns.
+    """
+
+    def __init__(self, words, tags, word_ids, tag_ids, offsets):
+        """
+        words -- list of word types (the word vocabulary).
+        tags -- list of tags.
+        word_ids -- array with the word id of each token.
+        tag_ids -- array with the tag id of each token.
+        offsets -- array with the position of the first token of each
+            sentence, plus the total number of tokens.
+        """
+        self._words = words
+        self._tags = tags
+        self._word_ids = word_ids
+        self._tag_ids = tag_ids
+        self._offsets = offsets
+
+    @classmethod
+    def from_tagged_sents(cls, tagged_sents):
+        """Encode a corpus.
+
+        tagged_sents -- iterable of tagged sentences.
+        """
+        word_index, tag_index = {}, {}
+        word_ids, tag_ids, offsets = [], [], [0]
+        for sent in tagged_sents:
+            for w, t in sent:
+                word_ids.append(word_index.setdefault(w, len(word_index)))
+                tag_ids.append(tag_index.setdefault(t, len(tag_index)))
+            offsets.append(len(word_ids))
+
+        return cls(list(word_index), list(tag_index),
+                   np.array(word_ids, dtype=np.int32),
+                   np.array(tag_ids, dtype=np.int32),
+                   np.array(offsets, dtype=np.int64))
+
+    def save(self, filename):
+        """Save to a .npz file (atomically, so that concurrent runs never
+        read a partial file).
+
+        filename -- the file name.
+        """
+        words, words_offsets = _encode_strings(self._words)
+        tags, tags_offsets = _encode_strings(self._tags)
+        _savez(filename, words=words, words_offsets=words_offsets,
+               tags=tags, tags_offsets=tags_offsets,
+               word_ids=self._word_ids, tag_ids=self._tag_ids,
+               offsets=self._offsets)
+
+    @classmethod
+    def load(cls, filename):
+        """Load a corpus saved with save().
+
+        filename -- the file name.
+        """
+        with np.load(filename) as data:
+            return cls(_decode_strings(data['words'], data['words_offsets']),
+                       _decode_strings(data['tags'], data['tags_offsets']),
+                       data['word_ids'], data['tag_ids'], data['offsets'])
+
+    def map_tags(self, function):
+        """Corpus with each tag t replaced by function(t).
+
+        function is called once per tag of the tagset, and the tag column is
+        converted with a single gather through the resulting table.
+
+        function -- the tag conversion function.
+        """
+        tag_index = {}
+        table = np.array([tag_index.setdefault(function(t), len(tag_index))
+                          for t in self._tags], dtype=np.int32)
+        return TaggedCorpus(self._words, list(tag_index), self._word_ids,
+                            table[self._tag_ids], self._offsets)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def tagged_sent(self, i):
+        """The i-th tagged sentence.
+
+        i -- the sentence index.
+        """
+        start, end = self._offsets[i], self._offsets[i + 1]
+        words, tags = self._words, self._tags
+        return [(words[w], tags[t]) for w, t in
+                zip(self._word_ids[start:end].tolist(),
+                    self._tag_ids[start:end].tolist())]
+
+    def sent(self, i):
+        """The i-th sentence (without tags).
+
+        i -- the sentence index.
+        """
+        start, end = self._offsets[i], self._offsets[i + 1]
+        words = self._words
+        return [words[w] for w in self._word_ids[start:end].tolist()]
+
+    def tagged_sents(self):
+        return LazyMap(self.tagged_sent, range(len(self)))
+
+    def sents(self):
+        return LazyMap(self.sent, range(len(self)))
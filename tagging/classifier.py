@@ -1,7 +1,21 @@
+from collections import defaultdict
+from itertools import chain, repeat
+import hashlib
+import os
+import random
+
+import numpy as np
+from scipy import sparse
+from sklearn.base import BaseEstimator, TransformerMixin
 from sklearn.pipeline import Pipeline
-from sklearn.feature_extraction import DictVectorizer
+from sklearn.feature_extraction import FeatureHasher
 from sklearn.svm import LinearSVC
-from sklearn.linear_model import LogisticRegression
+from sklearn.linear_model import LogisticRegression, Perceptron
+from sklearn.linear_model import SGDClassifier
+
+from common.memory import memory_report
+from tagging.cache import load_features, save_features
+from tagging.parallel import pool_tag_sents
 
 
 classifiers = {
@@ -9,6 +23,27 @@ classifiers = {
     'svm': LinearSVC,
 }
 
+# models that can be trained incrementally (with partial_fit)
+online_classifiers = {
+    'sgd': SGDClassifier,
+    'perceptron': Perceptron,
+}
+
+
+# bump when feature_dict() (or BatchFeaturizer) or the layout of the cached
+# features change, to invalidate the cached feature matrices
+FEATURES_VERSION = 2
+
+
+def feature_settings(n_features=None):
+    """Settings that the feature matrix of a corpus depends on (for the
+    cache keys).
+
+    n_features -- number of hashed features (None for a vocabulary).
+    """
+    vect = ['dict'] if n_features is None else ['hash', n_features]
+    return [FEATURES_VERSION] + vect
+
 
 def feature_dict(sent, i):
     """Feature dictionary for a given sentence and position.
@@ -16,45 +51,469 @@ def feature_dict(sent, i):
     sent -- the sentence.
     i -- the position.
     """
-    # WORK HERE!!
-    return {}
+    w = sent[i]
+    pw = sent[i - 1].lower() if i > 0 else '<s>'
+    nw = sent[i + 1] if i + 1 < len(sent) else '</s>'
+    return {
+        'w': w.lower(),
+        'wu': w.isupper(),
+        'wt': w.istitle(),
+        'wd': w.isdigit(),
+        'pw': pw,
+        'nw': nw.lower(),
+        'nwu': nw.isupper(),
+        'nwt': nw.istitle(),
+        'nwd': nw.isdigit(),
+    }
+
+
+class FeatureDicts(BaseEstimator, TransformerMixin):
+    """Transformer from sentences to the feature dicts of their tokens (one
+    per token, see feature_dict()).
+    """
+
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X):
+        return [feature_dict(sent, i) for sent in X for i in range(len(sent))]
+
+
+class BatchFeaturizer(BaseEstimator, TransformerMixin):
+    """Vectorizer from sentences to the sparse feature matrix of their tokens
+    (one row per token). Gives the same matrix as feature_dict() followed by
+    a DictVectorizer, without building a dict per token.
+
+    The tokens are mapped to word type ids, the word properties (lowercase,
+    isupper, istitle, isdigit) are computed once per type, and the columns
+    of each token, of its previous word and of its next word are gathered
+    with integer arrays.
+    """
+
+    # boolean features: (feature name, word property, 'w' or 'nw')
+    bool_features = [
+        ('wu', 'isupper', 'w'),
+        ('wt', 'istitle', 'w'),
+        ('wd', 'isdigit', 'w'),
+        ('nwu', 'isupper', 'nw'),
+        ('nwt', 'istitle', 'nw'),
+        ('nwd', 'isdigit', 'nw'),
+    ]
+
+    def _encode(self, sents):
+        """Word types, and type ids of the tokens, their previous words and
+        their next words ('<s>' and '</s>' at the sentence boundaries)."""
+        index = {'<s>': 0, '</s>': 1}
+        ids, lengths = [], []
+        for sent in sents:
+            ids.extend(index.setdefault(w, len(index)) for w in sent)
+            lengths.append(len(sent))
+        w = np.array(ids, dtype=np.int64)
+        lengths = np.array(lengths, dtype=np.int64)
+        ends = np.cumsum(lengths)[lengths > 0]
+        starts = ends - lengths[lengths > 0]
+
+        pw = np.empty_like(w)
+        pw[1:] = w[:-1]
+        pw[starts] = 0
+        nw = np.empty_like(w)
+        nw[:-1] = w[1:]
+        nw[ends - 1] = 1
+        return list(index), {'w': w, 'pw': pw, 'nw': nw}
+
+    def fit(self, X, y=None):
+        """Learn the feature names.
+
+        X -- list of sentences.
+        """
+        types, tokens = self._encode(X)
+        lower = [t.lower() for t in types]
+        names = set()
+        for name, ids in tokens.items():
+            names.update('{}={}'.format(name, lower[i])
+                         for i in np.unique(ids))
+        if len(tokens['w']):
+            names.update(name for name, _, _ in self.bool_features)
+        self.feature_names_ = sorted(names)
+        self.vocabulary_ = {f: i for i, f in enumerate(self.feature_names_)}
+        return self
+
+    def transform(self, X):
+        """Feature matrix, one row per token.
+
+        X -- list of sentences.
+        """
+        types, tokens = self._encode(X)
+        vocab = self.vocabulary_
+        n = len(tokens['w'])
+
+        lower = [t.lower() for t in types]
+        columns = []
+        for name, ids in tokens.items():
+            col = np.array([vocab.get('{}={}'.format(name, l), -1)
+                            for l in lower], dtype=np.int64)
+            columns.append(col[ids])
+        for name, prop, word in self.bool_features:
+            value = np.array([getattr(t, prop)() for t in types], dtype=bool)
+            col = np.full(n, -1, dtype=np.int64)
+            col[value[tokens[word]]] = vocab.get(name, -1)
+            columns.append(col)
+
+        columns = np.column_stack(columns) if n else \
+            np.zeros((0, len(columns)), dtype=np.int64)
+        present = columns >= 0
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(present.sum(axis=1))
+        indices = columns[present]
+        data = np.ones(len(indices))
+        result = sparse.csr_matrix((data, indices, indptr),
+                                   shape=(n, len(vocab)))
+        result.sort_indices()
+        return result
 
 
 class ClassifierTagger:
     """Simple and fast classifier based tagger.
     """
 
-    def __init__(self, tagged_sents, clf='lr'):
+    def __init__(self, tagged_sents, clf='lr', n_features=None,
+                 features_file=None, constrained=True):
         """
+        tagged_sents -- training sentences, each one being a list of pairs.
         clf -- classifying model, one of 'svm', 'lr' (default: 'lr').
+        n_features -- if given, hash the features into this number of
+            columns instead of learning a vocabulary of feature strings
+            (default: None, a DictVectorizer).
+        features_file -- cache of the training feature matrix, loaded
+            instead of featurizing tagged_sents if it exists, and saved
+            otherwise (see feature_settings() for its key).
+        constrained -- only score the tags seen in training with each known
+            word (default: True).
         """
-        # WORK HERE!!
+        self._clf = clf
+        self._n_features = n_features
+        self._constrained = constrained
+        # the pipelines take sentences and classify their tokens
+        if n_features is None:
+            steps = [('vect', BatchFeaturizer())]
+        else:
+            # fixed size and no vocabulary to store or look up
+            steps = [
+                ('feat', FeatureDicts()),
+                ('vect', FeatureHasher(n_features, input_type='dict')),
+            ]
+        self._pipeline = Pipeline(steps + [('clf', classifiers[clf]())])
+        self.fit(tagged_sents, features_file)
 
-    def fit(self, tagged_sents):
+    def fit(self, tagged_sents, features_file=None):
         """
         Train.
 
         tagged_sents -- list of sentences, each one being a list of pairs.
+        features_file -- cache of the feature matrix (see __init__).
+        """
+        vect = self._pipeline[:-1]
+        if features_file is not None and os.path.exists(features_file):
+            X, y, words, feature_names, word_tags = \
+                load_features(features_file)
+            if feature_names is not None:
+                featurizer = self._pipeline.named_steps['vect']
+                featurizer.feature_names_ = feature_names
+                featurizer.vocabulary_ = {
+                    f: i for i, f in enumerate(feature_names)}
+            tag_dict = dict(zip(words, word_tags))
+        else:
+            sents, y = [], []
+            tag_dict = defaultdict(set)
+            for tagged_sent in tagged_sents:
+                if not tagged_sent:
+                    continue
+                sent, tags = zip(*tagged_sent)
+                sents.append(sent)
+                y.extend(tags)
+                for w, t in tagged_sent:
+                    tag_dict[w].add(t)
+            X = vect.fit_transform(sents, y)
+            if features_file is not None:
+                words = sorted(tag_dict)
+                save_features(features_file, X, y, words,
+                              self._feature_names(),
+                              [sorted(tag_dict[w]) for w in words])
+        self._pipeline.named_steps['clf'].fit(X, y)
+        self._build_tag_dict(tag_dict)
+
+    def _build_tag_dict(self, tag_dict):
+        """Index the training words, with their tags as class ids in CSR
+        form (see candidate_index()).
+
+        tag_dict -- dict from the training words to their sets of tags.
+        """
+        classes = self._pipeline.named_steps['clf'].classes_.tolist()
+        self._words, self._cand_offsets, self._cand_tags = \
+            candidate_index(tag_dict, classes)
+
+    def set_constrained(self, constrained):
+        """Enable or disable the scoring of only the tags seen with each
+        known word.
+
+        constrained -- True or False.
+        """
+        self._constrained = constrained
+
+    def _feature_names(self):
+        """The learnt feature names (None with hashed features)."""
+        return getattr(self._pipeline.named_steps['vect'], 'feature_names_',
+                       None)
+
+    def feature_settings(self):
+        """Settings that the feature matrices of this model depend on: those
+        of feature_settings() plus a digest of the learnt vocabulary.
         """
-        # WORK HERE!!
+        settings = feature_settings(self._n_features)
+        names = self._feature_names()
+        if names is not None:
+            digest = hashlib.sha1('\n'.join(names).encode('utf-8'))
+            settings.append(digest.hexdigest())
+        return settings
 
-    def tag_sents(self, sents):
+    def tag_sents(self, sents, workers=1, chunksize=None, features_file=None):
         """Tag sentences.
 
-        sent -- the sentences.
+        All the words are classified in a single call to the pipeline.
+
+        sents -- the sentences.
+        workers -- number of worker processes (default: 1).
+        chunksize -- number of sentences sent to a worker at a time.
+        features_file -- cache of the feature matrix of the sentences,
+            loaded if it exists and saved otherwise (only with one worker,
+            the key must include self.feature_settings()).
+        """
+        if workers > 1:
+            return pool_tag_sents(self, sents, workers, chunksize)
+
+        sents = list(sents)
+        if not any(sents):
+            return [[] for _ in sents]
+        if features_file is not None and os.path.exists(features_file):
+            X = load_features(features_file)[0]
+        else:
+            X = self._pipeline[:-1].transform(sents)
+            if features_file is not None:
+                save_features(features_file, X)
+        tags = self._predict(X, sents).tolist()
+
+        y_pred, start = [], 0
+        for sent in sents:
+            y_pred.append(tags[start:start + len(sent)])
+            start += len(sent)
+        return y_pred
+
+    def _predict(self, X, sents):
+        """Tags of the tokens of the sentences, given their feature matrix.
+
+        If constrained, the tokens of known words are scored only for their
+        candidate tags: the stored rows of X are multiplied by the gathered
+        coefficients of each (token, candidate) pair and summed per pair,
+        and words with a single candidate are not scored at all. The other
+        tokens get the full decision function.
         """
-        # WORK HERE!!
+        clf = self._pipeline.named_steps['clf']
+        classes = clf.classes_
+        coef = getattr(clf, 'coef_', None)
+        if not self._constrained or coef is None or \
+                coef.shape[0] != len(classes):
+            # (binary models have a single row of coefficients)
+            return clf.predict(X)
+
+        tokens = chain.from_iterable(sents)
+        rows = np.fromiter(map(self._words.get, tokens, repeat(-1)),
+                           dtype=np.int64)
+        pred = np.empty(len(rows), dtype=np.int64)
+        unknown = np.flatnonzero(rows < 0)
+        if len(unknown):
+            pred[unknown] = clf.decision_function(X[unknown]).argmax(axis=1)
+
+        known = np.flatnonzero(rows >= 0)
+        starts = self._cand_offsets[rows[known]]
+        counts = self._cand_offsets[rows[known] + 1] - starts
+        single = counts == 1
+        pred[known[single]] = self._cand_tags[starts[single]]
+
+        tokens, starts, counts = known[~single], starts[~single], \
+            counts[~single]
+        if len(tokens):
+            # one pair per token and candidate, grouped by token
+            pair_token = np.repeat(np.arange(len(tokens)), counts)
+            pair_tag = self._cand_tags[_ranges(starts, counts)]
+            # one entry per pair and stored feature of its token
+            Xt = X[tokens].tocsr()
+            nnz = np.diff(Xt.indptr)[pair_token]
+            entry_pair = np.repeat(np.arange(len(pair_token)), nnz)
+            entries = _ranges(Xt.indptr[pair_token], nnz)
+            products = Xt.data[entries] * \
+                coef[pair_tag[entry_pair], Xt.indices[entries]]
+            scores = np.bincount(entry_pair, products,
+                                 minlength=len(pair_token))
+            scores += clf.intercept_[pair_tag]
+
+            # best candidate of each token (the first one on ties, like
+            # argmax over all the tags)
+            first = np.cumsum(counts) - counts
+            best = np.maximum.reduceat(scores, first)
+            is_best = np.flatnonzero(scores == best[pair_token])
+            _, i = np.unique(pair_token[is_best], return_index=True)
+            pred[tokens] = pair_tag[is_best[i]]
+        return classes[pred]
 
     def tag(self, sent):
         """Tag a sentence.
 
         sent -- the sentence.
         """
-        # WORK HERE!!
+        return self.tag_sents([sent])[0]
 
     def unknown(self, w):
         """Check if a word is unknown for the model.
 
         w -- the word.
         """
-        # WORK HERE!!
+        return w not in self._words
+
+    def memory_report(self, seen=None):
+        """Memory usage of the model, broken down by component.
+
+        seen -- set of ids of objects already counted (updated in place).
+        """
+        return memory_report(self, seen)
+
+
+def candidate_index(tag_dict, classes):
+    """Index of the training words, with their tags as class ids in CSR
+    form. Returns (words, offsets, cand_tags): words maps each word to its
+    index i, and its candidates are cand_tags[offsets[i]:offsets[i + 1]]
+    (sorted).
+
+    tag_dict -- dict from the training words to their sets of tags.
+    classes -- list of the classes of the model.
+    """
+    class_ids = {c: i for i, c in enumerate(classes)}
+    words = {w: i for i, w in enumerate(tag_dict)}
+    cand_tags = [sorted(class_ids[t] for t in tags)
+                 for tags in tag_dict.values()]
+    offsets = np.zeros(len(cand_tags) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(c) for c in cand_tags])
+    cand_tags = np.array([i for c in cand_tags for i in c], dtype=np.int64)
+    return words, offsets, cand_tags
+
+
+def _ranges(starts, counts):
+    """Concatenation of the integer ranges [start, start + count)."""
+    offsets = np.cumsum(counts) - counts
+    return np.repeat(starts - offsets, counts) + np.arange(counts.sum())
+
+
+def shuffled_batches(items, batch_size, buffer_size, rng):
+    """Mini-batches of a stream, shuffled by chunk: buffer_size items are
+    read at a time, shuffled and split into batches, so memory is bounded
+    by the buffer and not by the length of the stream.
+
+    items -- iterable of items.
+    batch_size -- number of items per batch.
+    buffer_size -- number of items shuffled together.
+    rng -- random.Random instance.
+    """
+    buffer = []
+    items = iter(items)
+    while True:
+        buffer.extend(item for _, item in zip(range(buffer_size), items))
+        if not buffer:
+            return
+        rng.shuffle(buffer)
+        for i in range(0, len(buffer), batch_size):
+            yield buffer[i:i + batch_size]
+        buffer = []
+
+
+class OnlineClassifierTagger(ClassifierTagger):
+    """Classifier based tagger trained out of core: the sentences are read
+    in mini-batches, hashed into a fixed number of features and fed to a
+    linear model with partial_fit, for several epochs.
+
+    Memory does not depend on the number of training sentences, only on the
+    size of the batches and of the model (plus the tag dictionary of the
+    training words, see ClassifierTagger).
+    """
+
+    def __init__(self, tagged_sents, tags=None, clf='sgd', n_features=2 ** 20,
+                 batch_size=1000, buffer_size=10000, epochs=5, seed=0,
+                 constrained=True):
+        """
+        tagged_sents -- training sentences, each one being a list of pairs:
+            an iterable that can be traversed once per epoch, or a function
+            that returns a new iterable for each epoch (e.g. the
+            tagged_sents method of a streaming corpus reader).
+        tags -- the tagset (default: None, collected in an extra pass).
+        clf -- classifying model, one of 'sgd', 'perceptron' (default:
+            'sgd').
+        n_features -- number of hashed features (default: 2 ** 20).
+        batch_size -- number of sentences per mini-batch (default: 1000).
+        buffer_size -- number of sentences shuffled together (default:
+            10000).
+        epochs -- number of passes over the sentences (default: 5).
+        seed -- seed of the shuffling and of the model (default: 0).
+        constrained -- only score the tags seen in training with each known
+            word (default: True).
+        """
+        self._clf = clf
+        self._n_features = n_features
+        self._batch_size = batch_size
+        self._buffer_size = buffer_size
+        self._epochs = epochs
+        self._seed = seed
+        self._constrained = constrained
+        self._pipeline = Pipeline([
+            ('feat', FeatureDicts()),
+            ('vect', FeatureHasher(n_features, input_type='dict')),
+            ('clf', online_classifiers[clf](random_state=seed)),
+        ])
+        self.fit(tagged_sents, tags)
+
+    def fit(self, tagged_sents, tags=None):
+        """
+        Train.
+
+        tagged_sents -- the training sentences (see __init__).
+        tags -- the tagset (default: None, collected in an extra pass).
+        """
+        if not callable(tagged_sents) and iter(tagged_sents) is tagged_sents:
+            # it would be exhausted after the first pass
+            raise ValueError('tagged_sents is a single-use iterator: pass a '
+                             'list, or a function that returns a new '
+                             'iterable for each epoch')
+
+        def epoch_sents():
+            sents = tagged_sents() if callable(tagged_sents) else tagged_sents
+            return (sent for sent in sents if sent)
+
+        if tags is None:
+            tags = {t for sent in epoch_sents() for _, t in sent}
+        # partial_fit needs all the classes from the first batch on
+        classes = np.array(sorted(tags))
+
+        vect = self._pipeline[:-1]
+        clf = self._pipeline.named_steps['clf']
+        rng = random.Random(self._seed)
+        tag_dict = defaultdict(set)
+        for epoch in range(self._epochs):
+            for batch in shuffled_batches(epoch_sents(), self._batch_size,
+                                          self._buffer_size, rng):
+                sents, y = [], []
+                for tagged_sent in batch:
+                    sent, sent_tags = zip(*tagged_sent)
+                    sents.append(sent)
+                    y.extend(sent_tags)
+                    if epoch == 0:
+                        for w, t in tagged_sent:
+                            tag_dict[w].add(t)
+                clf.partial_fit(vect.transform(sents), y, classes=classes)
+        self._build_tag_dict(tag_dict)
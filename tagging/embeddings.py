@@ -0,0 +1,131 @@
+"""Word embeddings exported from a fastText model to a memory-mapped table.
+
+Loading a binary fastText model takes seconds and gigabytes, in every
+process that uses it. export_embeddings() saves the vectors of a vocabulary
+to a float32 .npy matrix, followed by a small hashed table of character
+n-gram vectors for the other words, and the vocabulary to a .json file next
+to it. EmbeddingTable maps the matrix read-only, so it loads in milliseconds
+and processes share its pages.
+
+The vector of a word outside the vocabulary is the mean of the rows of its
+n-grams, like fastText does with its own (much larger) table.
+"""
+import json
+import os
+
+import numpy as np
+
+
+def fnv1a(s):
+    """32-bit FNV-1a hash of the UTF-8 encoding of a string.
+
+    s -- the string.
+    """
+    h = 2166136261
+    for b in s.encode('utf-8'):
+        h = ((h ^ b) * 16777619) & 0xffffffff
+    return h
+
+
+def char_ngrams(word, minn=3, maxn=6):
+    """Character n-grams of a word, with '<' and '>' as boundaries.
+
+    word -- the word.
+    minn -- minimum n-gram length (default: 3).
+    maxn -- maximum n-gram length (default: 6).
+    """
+    w = '<' + word + '>'
+    return [w[i:i + n] for n in range(minn, maxn + 1)
+            for i in range(len(w) - n + 1)]
+
+
+def meta_filename(filename):
+    """The .json file with the vocabulary of an exported table."""
+    return os.path.splitext(filename)[0] + '.json'
+
+
+def export_embeddings(model, words, filename, buckets=100000, minn=3,
+                      maxn=6):
+    """Export the vectors of a vocabulary and the hashed n-gram table.
+
+    Each row of the n-gram table is the mean of the model vectors of the
+    n-grams of the vocabulary that hash to it.
+
+    model -- the fastText model.
+    words -- the vocabulary.
+    filename -- the .npy file (the vocabulary goes to meta_filename()).
+    buckets -- number of rows of the n-gram table (default: 100000).
+    minn -- minimum n-gram length (default: 3).
+    maxn -- maximum n-gram length (default: 6).
+    """
+    words = list(dict.fromkeys(words))
+    n = len(words)
+    tmp = '{}.{}.tmp.npy'.format(os.path.splitext(filename)[0], os.getpid())
+    table = np.lib.format.open_memmap(
+        tmp, mode='w+', dtype=np.float32,
+        shape=(n + buckets, model.get_dimension()))
+    for i, w in enumerate(words):
+        table[i] = model.get_word_vector(w)
+
+    ngrams = {g for w in words for g in char_ngrams(w, minn, maxn)}
+    counts = np.zeros(buckets, dtype=np.int64)
+    for g in sorted(ngrams):
+        b = fnv1a(g) % buckets
+        table[n + b] += model.get_input_vector(model.get_subword_id(g))
+        counts[b] += 1
+    used = np.flatnonzero(counts)
+    table[n + used] /= counts[used, None]
+    table.flush()
+    del table
+
+    meta = {'words': words, 'buckets': buckets, 'minn': minn, 'maxn': maxn}
+    with open(meta_filename(tmp), 'w') as f:
+        json.dump(meta, f)
+    os.replace(meta_filename(tmp), meta_filename(filename))
+    os.replace(tmp, filename)
+
+
+class EmbeddingTable:
+    """Memory-mapped embeddings saved with export_embeddings().
+
+    It has the methods of a fastText model used by FasttextDictVectorizer.
+    """
+
+    def __init__(self, filename):
+        """
+        filename -- the .npy file.
+        """
+        with open(meta_filename(filename)) as f:
+            meta = json.load(f)
+        self.vocab = {w: i for i, w in enumerate(meta['words'])}
+        self.vectors = np.load(filename, mmap_mode='r')
+        self._buckets = meta['buckets']
+        self._minn = meta['minn']
+        self._maxn = meta['maxn']
+
+    def get_dimension(self):
+        return self.vectors.shape[1]
+
+    def subword_rows(self, word):
+        """Rows of the n-grams of a word in the n-gram table.
+
+        word -- the word.
+        """
+        n = len(self.vocab)
+        return [n + fnv1a(g) % self._buckets
+                for g in char_ngrams(word, self._minn, self._maxn)]
+
+    def get_word_vector(self, word):
+        """Vector of a word: its row if it is in the vocabulary, the mean of
+        its (non-empty) n-gram rows otherwise.
+
+        word -- the word.
+        """
+        i = self.vocab.get(word)
+        if i is not None:
+            return np.array(self.vectors[i])
+        rows = self.vectors[self.subword_rows(word)]
+        rows = rows[rows.any(axis=1)]
+        if not len(rows):
+            return np.zeros(self.get_dimension(), dtype=np.float32)
+        return rows.mean(axis=0, dtype=np.float32)
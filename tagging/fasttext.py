@@ -1,36 +1,133 @@
+from collections import OrderedDict
+from itertools import repeat
+
 import numpy as np
 from sklearn.base import BaseEstimator, TransformerMixin
-from fastText import load_model
+
+from tagging.embeddings import EmbeddingTable
+
+try:
+    from fastText import load_model
+except ImportError:
+    # only needed for binary models, not for exported tables
+    load_model = None
 
 
 class FasttextDictVectorizer(BaseEstimator, TransformerMixin):
-    """Vectorizer for fastText embeddings in binary format.
+    """Vectorizer for fastText embeddings in binary format, or exported
+    with tagging.embeddings.export_embeddings() ('.npy' files).
+
+    The vectors of the words seen in fit() are computed once and kept in a
+    float32 matrix (with an exported table, its memory-mapped vocabulary is
+    used instead). Other words go through the model, with a bounded LRU
+    cache of their vectors, and each one is computed once per batch.
     """
 
-    def __init__(self, filename, keys):
+    def __init__(self, filename, keys, cache_size=100000):
         """
-        filename -- Binary model file with embeddings.
-        keys -- list of keys that contain the words in the feature dict.s
+        filename -- Binary model file with embeddings, or '.npy' file of
+            an exported table.
+        keys -- list of keys that contain the words in the feature dicts.
+        cache_size -- maximum number of vectors of words outside the training
+            vocabulary kept in the LRU cache (default: 100000).
         """
         self._filename = filename
         self._keys = keys
+        self._cache_size = cache_size
         self._model = None
+        self._vocab = {}
+        self._vectors = None
+        self._cache = OrderedDict()
+
+    def _load_model(self):
+        if self._model is None:
+            if self._filename.endswith('.npy'):
+                self._model = EmbeddingTable(self._filename)
+            elif load_model is None:
+                raise ImportError('fastText is needed to load binary models')
+            else:
+                self._model = load_model(self._filename)
+        return self._model
 
     def fit(self, X, y=None):
+        """Precompute the vectors of the words of the feature dicts.
+
+        X -- list of feature dicts.
+        """
+        m = self._load_model()
+        if isinstance(m, EmbeddingTable):
+            # its vocabulary is already a (shared) matrix
+            return self
+        words = sorted({x[k] for x in X for k in self._keys})
+        self._vocab = {w: i for i, w in enumerate(words)}
+        self._vectors = np.empty((len(words), m.get_dimension()),
+                                 dtype=np.float32)
+        for i, w in enumerate(words):
+            self._vectors[i] = m.get_word_vector(w)
         return self
 
+    def word_vectors(self, words):
+        """Vectors of words outside the training vocabulary, one row per
+        word, through the LRU cache.
+
+        words -- list of words.
+        """
+        m = self._load_model()
+        result = np.empty((len(words), m.get_dimension()), dtype=np.float32)
+        cache = self._cache
+        for i, w in enumerate(words):
+            v = cache.get(w)
+            if v is None:
+                v = cache[w] = m.get_word_vector(w)
+                if len(cache) > self._cache_size:
+                    cache.popitem(last=False)
+            else:
+                cache.move_to_end(w)
+            result[i] = v
+        return result
+
     def transform(self, X):
-        if self._model is None:
-            self._model = load_model(self._filename)
-        m = self._model
-        result = []
-        for x in X:
-            result.append(np.concatenate([m.get_word_vector(x[k]) for k in self._keys]))
+        """Feature matrix, with the concatenated vectors of the words of
+        each feature dict (float32, one row per dict).
+
+        X -- list of feature dicts.
+        """
+        m = self._load_model()
+        dim = m.get_dimension()
+        keys, vocab = self._keys, self._vocab
+        vectors = self._vectors
+        if isinstance(m, EmbeddingTable):
+            vocab, vectors = m.vocab, m.vectors
+        if vectors is None:
+            vectors = np.empty((0, dim), dtype=np.float32)
+        X = list(X)
+        n = len(X)
+
+        # row of each word in the training vocabulary (-1 if not there)
+        ids = [np.fromiter(map(vocab.get, (x[k] for x in X), repeat(-1)),
+                           dtype=np.int64, count=n) for k in keys]
+        # the other words of the batch, computed once each
+        others = {}
+        for k, k_ids in zip(keys, ids):
+            for i in np.flatnonzero(k_ids < 0).tolist():
+                others.setdefault(X[i][k], len(others))
+        other_vectors = self.word_vectors(list(others))
+
+        result = np.empty((n, len(keys) * dim), dtype=np.float32)
+        for j, (k, k_ids) in enumerate(zip(keys, ids)):
+            out = result[:, j * dim:(j + 1) * dim]
+            known = k_ids >= 0
+            out[known] = vectors[k_ids[known]]
+            unknown = np.flatnonzero(~known)
+            if len(unknown):
+                rows = [others[X[i][k]] for i in unknown.tolist()]
+                out[unknown] = other_vectors[rows]
         return result
 
     def __getstate__(self):
         """Return internal state for pickling, omitting unneeded objects.
         """
-        state = self.__dict__
+        state = dict(self.__dict__)
         state['_model'] = None
+        state['_cache'] = OrderedDict()
         return state
@@ -0,0 +1,758 @@
+from array import array
+from collections import defaultdict
+from math import log2, inf
+
+import numpy as np
+from scipy import sparse
+
+from common.memory import MemoryItem, deep_sizeof, memory_report
+from tagging.parallel import pool_tag_sents
+
+
+class HMM:
+
+    # beam width for tag() (None for exact decoding)
+    _beam = None
+    # whether tag() expands only the candidate tags of each word
+    _constrained = False
+
+    def __init__(self, n, tagset, trans, out):
+        """
+        n -- n-gram size.
+        tagset -- set of tags.
+        trans -- transition probabilities dictionary.
+        out -- output probabilities dictionary.
+        """
+        self._n = n
+        self._tagset = tagset
+        self._trans = trans
+        self._out = out
+
+    def tagset(self):
+        """Returns the set of tags.
+        """
+        return self._tagset
+
+    def histories(self):
+        """Tag histories (tuples of n-1 tags) with an explicit transition
+        distribution. For any other history all the transition probabilities
+        are zero.
+        """
+        return self._trans.keys()
+
+    def trans_prob(self, tag, prev_tags):
+        """Probability of a tag.
+
+        tag -- the tag.
+        prev_tags -- tuple with the previous n-1 tags (optional only if n = 1).
+        """
+        if not prev_tags:
+            prev_tags = ()
+        return self._trans.get(prev_tags, {}).get(tag, 0.0)
+
+    def out_prob(self, word, tag):
+        """Probability of a word given a tag.
+
+        word -- the word.
+        tag -- the tag.
+        """
+        return self._out.get(tag, {}).get(word, 0.0)
+
+    def trans_probs(self, tags, prev_tags):
+        """Probabilities of a list of tags after the same history.
+
+        tags -- the tags.
+        prev_tags -- tuple with the previous n-1 tags (optional only if n = 1).
+        """
+        return [self.trans_prob(t, prev_tags) for t in tags]
+
+    def out_probs(self, word, tags):
+        """Probabilities of a word given each tag of a list.
+
+        word -- the word.
+        tags -- the tags.
+        """
+        return [self.out_prob(word, t) for t in tags]
+
+    def tag_prob(self, y):
+        """
+        Probability of a tagging.
+        Warning: subject to underflow problems.
+
+        y -- tagging.
+        """
+        prob = 1.0
+        for tag, prev_tags in self._tag_ngrams(y):
+            prob *= self.trans_prob(tag, prev_tags)
+        return prob
+
+    def prob(self, x, y):
+        """
+        Joint probability of a sentence and its tagging.
+        Warning: subject to underflow problems.
+
+        x -- sentence.
+        y -- tagging.
+        """
+        prob = self.tag_prob(y)
+        for word, tag in zip(x, y):
+            prob *= self.out_prob(word, tag)
+        return prob
+
+    def tag_log_prob(self, y):
+        """
+        Log-probability of a tagging.
+
+        y -- tagging.
+        """
+        log_prob = 0.0
+        for tag, prev_tags in self._tag_ngrams(y):
+            log_prob += _log2(self.trans_prob(tag, prev_tags))
+        return log_prob
+
+    def log_prob(self, x, y):
+        """
+        Joint log-probability of a sentence and its tagging.
+
+        x -- sentence.
+        y -- tagging.
+        """
+        log_prob = self.tag_log_prob(y)
+        for word, tag in zip(x, y):
+            log_prob += _log2(self.out_prob(word, tag))
+        return log_prob
+
+    def _tag_ngrams(self, y):
+        n = self._n
+        y = ['<s>'] * (n - 1) + list(y) + ['</s>']
+        return [(y[i], tuple(y[i - n + 1:i])) for i in range(n - 1, len(y))]
+
+    def tag(self, sent):
+        """Returns the most probable tagging for a sentence.
+
+        sent -- the sentence.
+        """
+        tagger = self.__dict__.get('_tagger')
+        if tagger is None:
+            self._tagger = tagger = VectorizedViterbiTagger(
+                self, self._beam, self._constrained)
+        return tagger.tag(sent)
+
+    def tag_sents(self, sents, workers=1, chunksize=None):
+        """Returns the most probable tagging for each sentence.
+
+        sents -- the sentences.
+        workers -- number of worker processes (default: 1).
+        chunksize -- number of sentences sent to a worker at a time.
+        """
+        if workers > 1:
+            return pool_tag_sents(self, sents, workers, chunksize)
+        return [self.tag(sent) for sent in sents]
+
+    def set_beam(self, beam):
+        """Set the beam width used by tag().
+
+        beam -- number of histories kept per position (None for exact
+            Viterbi decoding).
+        """
+        self._beam = beam
+        self.__dict__.pop('_tagger', None)
+
+    def set_constrained(self, constrained):
+        """Set whether tag() expands only the candidate tags of each word
+        (see candidate_tags()).
+
+        constrained -- True or False.
+        """
+        self._constrained = constrained
+        self.__dict__.pop('_tagger', None)
+
+    def candidate_tags(self, w):
+        """Tags that a word may have, or None if it may have any tag.
+
+        w -- the word.
+        """
+        return None
+
+    def memory_report(self, seen=None):
+        """Memory usage of the model, broken down by component.
+
+        seen -- set of ids of objects already counted (updated in place).
+        """
+        return memory_report(self, seen)
+
+    def __getstate__(self):
+        """Return internal state for pickling, omitting unneeded objects.
+        """
+        state = dict(self.__dict__)
+        state.pop('_tagger', None)
+        return state
+
+
+def _log2(p):
+    return log2(p) if p > 0.0 else -inf
+
+
+def _find(strings, s):
+    """Index of a string in a sorted 'S' array of UTF-8 encoded strings, or
+    None."""
+    enc = s.encode('utf-8')
+    i = int(strings.searchsorted(enc))
+    if i < len(strings) and strings[i] == enc:
+        return i
+    return None
+
+
+def _sorted_strings(strings):
+    """Sorted 'S' array of UTF-8 encoded strings, and the position of each
+    string in it."""
+    enc = np.array([s.encode('utf-8') for s in strings], dtype='S')
+    order = np.argsort(enc, kind='stable')
+    return enc[order], order
+
+
+class MLHMM(HMM):
+
+    # unknown words are constrained to the tags seen with rare training
+    # words that share their longest suffix of up to max_suffix characters
+    max_suffix = 4
+    rare_count = 10
+
+    def __init__(self, n, tagged_sents, addone=True, beam=None,
+                 constrained=False):
+        """
+        n -- order of the model.
+        tagged_sents -- training sentences, each one being a list of pairs.
+        addone -- whether to use addone smoothing (default: True).
+        beam -- beam width for tagging (default: None, exact decoding).
+        constrained -- whether tagging expands only the candidate tags of
+            each word (default: False).
+        """
+        self._n = n
+        self._addone = addone
+        self._beam = beam
+        self._constrained = constrained
+
+        word_index, tag_index = {}, {}
+        # compact buffers instead of lists of int objects
+        word_ids, tag_ids, lengths = array('q'), array('q'), array('q')
+        for sent in tagged_sents:
+            for word, tag in sent:
+                word_ids.append(word_index.setdefault(word, len(word_index)))
+                tag_ids.append(tag_index.setdefault(tag, len(tag_index)))
+            lengths.append(len(sent))
+
+        # tags in sorted order, then '<s>' and '</s>'
+        tag_names = sorted(tag_index)
+        K, V = len(tag_names), len(word_index)
+        order = np.array([tag_index[t] for t in tag_names], dtype=np.int64)
+        remap = np.empty(K, dtype=np.int64)
+        remap[order] = np.arange(K)
+        tag_ids = remap[np.frombuffer(tag_ids, dtype=np.int64)]
+        word_ids = np.frombuffer(word_ids, dtype=np.int64)
+        self._tag_names = tag_names = tag_names + ['<s>', '</s>']
+        self._tag_ids = {t: i for i, t in enumerate(tag_names)}
+        self._tagset = set(tag_names[:K])
+        # the vocabulary as a sorted array, with no per-word objects whose
+        # reference counts lookups would write to (after a fork, the pages
+        # stay shared)
+        self._vocab, order = _sorted_strings(word_index)
+        del word_index
+
+        # emission counts: a (words x tags) sparse matrix, with the rows in
+        # vocabulary order (the candidate tags of each word in CSR form)
+        self._out_count = sparse.coo_matrix(
+            (np.ones(len(tag_ids), dtype=np.int64), (word_ids, tag_ids)),
+            shape=(V, K)).tocsr()[order]
+        self._tag_count = np.bincount(tag_ids, minlength=K)
+        self._tcount = self._count_tag_ngrams(tag_ids, lengths)
+        self._build_tag_dict()
+
+    def _count_tag_ngrams(self, tag_ids, lengths):
+        """Counts of the tag n-grams and (n-1)-grams, as a dict from the
+        order to a pair of arrays (sorted keys, counts). An n-gram is encoded
+        as an integer in base B = K + 2 (the tags, '<s>' and '</s>')."""
+        n = self._n
+        B = len(self._tag_names)
+        if B ** n >= 2 ** 63:
+            raise ValueError('too many tags to encode {}-grams'.format(n))
+
+        # padded sequence: n-1 '<s>' before and one '</s>' after each sentence
+        lengths = np.frombuffer(lengths, dtype=np.int64)
+        pos = np.repeat(np.arange(len(lengths)) * n + n - 1, lengths)
+        pos += np.arange(len(tag_ids))
+        padded = np.full(len(tag_ids) + n * len(lengths), B - 2,
+                         dtype=np.int64)
+        padded[pos] = tag_ids
+        del pos
+        ends = np.cumsum(lengths + n) - 1
+        padded[ends] = B - 1
+
+        # positions where an n-gram ends: the tags and the '</s>'
+        last = np.flatnonzero(padded != B - 2)
+        tcount = {}
+        key = np.zeros(len(last), dtype=np.int64)
+        for k in range(n):
+            if k == n - 1:
+                # the (n-1)-gram contexts
+                tcount[k] = np.unique(key, return_counts=True)
+            key *= B
+            key += padded[last - (n - 1) + k]
+        tcount[n] = np.unique(key, return_counts=True)
+        return tcount
+
+    def memory_report(self, seen=None):
+        """Memory usage of the model, broken down by component, with one row
+        per order of the tag n-gram tables (like count dicts).
+
+        seen -- set of ids of objects already counted (updated in place).
+        """
+        if seen is None:
+            seen = set()
+        seen.add(id(self._tcount))
+        tables = [MemoryItem('tcount[{}]'.format(k),
+                             deep_sizeof(self._tcount[k], seen),
+                             len(self._tcount[k][0]))
+                  for k in sorted(self._tcount)]
+
+        report = []
+        for item in memory_report(self, seen):
+            if item.component == 'tcount':
+                report.extend(tables)
+            else:
+                report.append(item)
+        return report
+
+    def _build_tag_dict(self):
+        """Suffix to candidate tags index for unknown words, as a sorted
+        array of suffixes and their tag ids in CSR form: the candidates of
+        the suffix with index i are
+        _suffix_tags[_suffix_offsets[i]:_suffix_offsets[i + 1]] (the
+        candidates of known words are the columns of their emission row)."""
+        out = self._out_count
+        word_count = np.asarray(out.sum(axis=1)).ravel()
+        indptr, indices = out.indptr, out.indices
+
+        suffix_tags = defaultdict(set)
+        for j in np.flatnonzero(word_count <= self.rare_count).tolist():
+            w = self._vocab[j].decode('utf-8')
+            tags = indices[indptr[j]:indptr[j + 1]].tolist()
+            for k in range(1, min(len(w), self.max_suffix) + 1):
+                suffix_tags[w[-k:]].update(tags)
+
+        suffixes = list(suffix_tags)
+        self._suffixes, order = _sorted_strings(suffixes)
+        cand_tags = [sorted(suffix_tags[suffixes[i]]) for i in order]
+        self._suffix_offsets = np.zeros(len(cand_tags) + 1, dtype=np.int64)
+        self._suffix_offsets[1:] = np.cumsum([len(c) for c in cand_tags])
+        self._suffix_tags = np.array([t for c in cand_tags for t in c],
+                                     dtype=np.int64)
+
+    def _word_id(self, w):
+        """Row of a word in the emission matrix, or None if it is unknown.
+        """
+        return _find(self._vocab, w)
+
+    def _tag_key(self, tokens):
+        """Integer key of a tuple of tags (None if some tag is unknown)."""
+        key = 0
+        B = len(self._tag_names)
+        for t in tokens:
+            i = self._tag_ids.get(t)
+            if i is None:
+                return None
+            key = key * B + i
+        return key
+
+    def tcount(self, tokens):
+        """Count for an n-gram or (n-1)-gram of tags.
+
+        tokens -- the n-gram or (n-1)-gram tuple of tags.
+        """
+        table = self._tcount.get(len(tokens))
+        key = self._tag_key(tokens)
+        if table is None or key is None:
+            return 0
+        keys, counts = table
+        i = keys.searchsorted(key)
+        if i < len(keys) and keys[i] == key:
+            return int(counts[i])
+        return 0
+
+    def unknown(self, w):
+        """Check if a word is unknown for the model.
+
+        w -- the word.
+        """
+        return self._word_id(w) is None
+
+    def candidate_tags(self, w):
+        """Tags that a word may have, or None if it may have any tag.
+
+        Known words may only have the tags seen with them in training (any
+        other tag has zero output probability). Unknown words may have the
+        tags seen with rare words that share their longest suffix.
+
+        w -- the word.
+        """
+        j = self._word_id(w)
+        if j is not None:
+            out = self._out_count
+            ids = out.indices[out.indptr[j]:out.indptr[j + 1]]
+        else:
+            offsets = self._suffix_offsets
+            for k in range(min(len(w), self.max_suffix), 0, -1):
+                i = _find(self._suffixes, w[-k:])
+                if i is not None:
+                    ids = self._suffix_tags[offsets[i]:offsets[i + 1]]
+                    break
+            else:
+                return None
+        tag_names = self._tag_names
+        return frozenset(tag_names[t] for t in ids.tolist())
+
+    def histories(self):
+        """Tag histories (tuples of n-1 tags) seen in training.
+        """
+        n = self._n
+        B = len(self._tag_names)
+        keys, _ = self._tcount[n - 1]
+        histories = []
+        for key in keys.tolist():
+            tags = []
+            for _ in range(n - 1):
+                key, i = divmod(key, B)
+                tags.append(self._tag_names[i])
+            histories.append(tuple(reversed(tags)))
+        return histories
+
+    def trans_prob(self, tag, prev_tags):
+        """Probability of a tag.
+
+        tag -- the tag.
+        prev_tags -- tuple with the previous n-1 tags (optional only if n = 1).
+        """
+        if not prev_tags:
+            prev_tags = ()
+        c = self.tcount(prev_tags + (tag,))
+        prev_c = self.tcount(prev_tags)
+        if self._addone:
+            # the tags and the end marker
+            return (c + 1.0) / (prev_c + len(self._tagset) + 1)
+        elif prev_c == 0:
+            return 0.0
+        return c / prev_c
+
+    def out_prob(self, word, tag):
+        """Probability of a word given a tag.
+
+        word -- the word.
+        tag -- the tag.
+        """
+        j = self._word_id(word)
+        if j is None:
+            return 1.0 / len(self._vocab)
+        t = self._tag_ids.get(tag)
+        if t is None or t >= len(self._tag_count):
+            return 0.0
+        out = self._out_count
+        start, end = out.indptr[j], out.indptr[j + 1]
+        i = start + out.indices[start:end].searchsorted(t)
+        if i < end and out.indices[i] == t:
+            return float(out.data[i] / self._tag_count[t])
+        return 0.0
+
+    def trans_probs(self, tags, prev_tags):
+        """Probabilities of a list of tags after the same history, with a
+        single lookup in the count arrays.
+
+        tags -- the tags.
+        prev_tags -- tuple with the previous n-1 tags (optional only if n = 1).
+        """
+        if not prev_tags:
+            prev_tags = ()
+        B = len(self._tag_names)
+        prev_key = self._tag_key(prev_tags)
+        ids = np.array([self._tag_ids.get(t, -1) for t in tags])
+        c = np.zeros(len(tags))
+        keys, counts = self._tcount[self._n]
+        if prev_key is not None and len(keys):
+            ngram_keys = prev_key * B + ids
+            pos = np.minimum(keys.searchsorted(ngram_keys), len(keys) - 1)
+            found = (keys[pos] == ngram_keys) & (ids >= 0)
+            c[found] = counts[pos[found]]
+        prev_c = self.tcount(prev_tags)
+        if self._addone:
+            return (c + 1.0) / (prev_c + len(self._tagset) + 1)
+        elif prev_c == 0:
+            return np.zeros(len(tags))
+        return c / prev_c
+
+    def out_probs(self, word, tags):
+        """Probabilities of a word given each tag of a list, from a single
+        row of the emission matrix.
+
+        word -- the word.
+        tags -- the tags.
+        """
+        j = self._word_id(word)
+        if j is None:
+            return np.full(len(tags), 1.0 / len(self._vocab))
+        out = self._out_count
+        start, end = out.indptr[j], out.indptr[j + 1]
+        K = len(self._tag_count)
+        # one extra column for the tags that are not in the tagset
+        row = np.zeros(K + 1)
+        cols = out.indices[start:end]
+        row[cols] = out.data[start:end] / self._tag_count[cols]
+        ids = [self._tag_ids.get(t, K) for t in tags]
+        return row[np.minimum(ids, K)]
+
+
+class ViterbiTagger:
+
+    def __init__(self, hmm, beam=None, constrained=False):
+        """
+        hmm -- the HMM.
+        beam -- if given, keep only the beam most probable histories at each
+            position (beam search instead of exact decoding).
+        constrained -- whether to expand only the candidate tags of each word
+            given by hmm.candidate_tags() (default: False).
+        """
+        self._hmm = hmm
+        self._beam = beam
+        self._constrained = constrained
+
+    def tag(self, sent):
+        """Returns the most probable tagging for a sentence.
+
+        The chart is left in self._pi for inspection: self._pi[k] maps each
+        history of the last n-1 tags to (log-probability, tags) for the best
+        tagging of the first k words.
+
+        Returns None if every tagging of the words has zero probability. If
+        only the end of the sentence ('</s>') has zero probability, returns
+        the best tagging of the words.
+
+        sent -- the sentence.
+        """
+        hmm = self._hmm
+        n = hmm._n
+        tagset = hmm.tagset()
+
+        self._pi = pi = {}
+        pi[0] = {('<s>',) * (n - 1): (0.0, [])}
+        for k, word in enumerate(sent, 1):
+            pi[k] = {}
+            candidates = tagset
+            if self._constrained:
+                candidates = hmm.candidate_tags(word) or tagset
+            for prev_tags, (lp, tags) in pi[k - 1].items():
+                for t in candidates:
+                    o = hmm.out_prob(word, t)
+                    if o == 0.0:
+                        continue
+                    q = hmm.trans_prob(t, prev_tags)
+                    if q == 0.0:
+                        continue
+                    new_lp = lp + log2(q) + log2(o)
+                    h = (prev_tags + (t,))[1:]
+                    if h not in pi[k] or new_lp > pi[k][h][0]:
+                        pi[k][h] = (new_lp, tags + [t])
+
+            beam = self._beam
+            if beam is not None and len(pi[k]) > beam:
+                items = sorted(pi[k].items(), key=lambda item: -item[1][0])
+                pi[k] = dict(items[:beam])
+
+        m = len(sent)
+        if not pi[m]:
+            # no tagging with non-zero probability
+            return None
+
+        def final_lp(item):
+            # if no history can end the sentence, the best tagging of the
+            # words alone
+            prev_tags, (lp, _) = item
+            return lp + _log2(hmm.trans_prob('</s>', prev_tags)), lp
+
+        _, (_, tags) = max(pi[m].items(), key=final_lp)
+        return tags
+
+    def tag_sents(self, sents, workers=1, chunksize=None):
+        """Returns the most probable tagging for each sentence.
+
+        sents -- the sentences.
+        workers -- number of worker processes (default: 1).
+        chunksize -- number of sentences sent to a worker at a time.
+        """
+        if workers > 1:
+            return pool_tag_sents(self, sents, workers, chunksize)
+        return [self.tag(sent) for sent in sents]
+
+
+class VectorizedViterbiTagger:
+    """Viterbi decoding over NumPy arrays.
+
+    Tags are mapped to indices 0..K-1, and the start marker '<s>' to K, so
+    that a history of n-1 tags is an integer in base S = K + 1. Transition
+    log-probabilities are kept as dense rows for the histories with an
+    explicit distribution, plus a default row shared by all the others.
+    Each step scores all (active history, tag) pairs at once, only for the
+    tags that can output the word, and keeps, for each new history, the
+    maximum over the dropped oldest tag.
+
+    Returns the same taggings as ViterbiTagger (up to ties), which remains
+    available for debugging and chart inspection.
+    """
+
+    def __init__(self, hmm, beam=None, constrained=False):
+        """
+        hmm -- the HMM.
+        beam -- if given, keep only the beam most probable histories at each
+            position (beam search instead of exact decoding).
+        constrained -- whether to expand only the candidate tags of each word
+            given by hmm.candidate_tags() (default: False).
+        """
+        self._hmm = hmm
+        self._beam = beam
+        self._constrained = constrained
+        self._n = n = hmm._n
+        self._tags = tags = sorted(hmm.tagset())
+        self._K = K = len(tags)
+        self._S = S = K + 1
+        self._index = index = {t: i for i, t in enumerate(tags)}
+        index['<s>'] = K
+        # base of the history without its oldest tag
+        self._M = S ** (n - 2) if n > 1 else 1
+        self._start = self._history_key(('<s>',) * (n - 1))
+
+        # transition rows: columns are the tags and '</s>' (last column)
+        columns = tags + ['</s>']
+        keys, rows = [], []
+        for prev_tags in hmm.histories():
+            if all(t in index for t in prev_tags):
+                keys.append(self._history_key(prev_tags))
+                rows.append(hmm.trans_probs(columns, prev_tags))
+        order = np.argsort(keys)
+        self._hist_keys = np.array(keys, dtype=np.int64)[order]
+        self._trans = self._log2(np.array(rows, dtype=np.float64)
+                                 .reshape(len(rows), K + 1)[order])
+        # '</s>' never occurs in a history: this is the unseen history row
+        unseen = ('</s>',) * (n - 1)
+        self._default = self._log2(np.array(
+            hmm.trans_probs(columns, unseen)))
+
+        self._out = {}
+
+    @staticmethod
+    def _log2(a):
+        with np.errstate(divide='ignore'):
+            return np.log2(a)
+
+    def _history_key(self, prev_tags):
+        key = 0
+        for t in prev_tags:
+            key = key * self._S + self._index[t]
+        return key
+
+    def _trans_rows(self, keys):
+        """Transition log-probabilities for an array of history keys."""
+        hist_keys = self._hist_keys
+        if len(hist_keys) == 0:
+            return np.tile(self._default, (len(keys), 1))
+        pos = np.searchsorted(hist_keys, keys)
+        pos = np.minimum(pos, len(hist_keys) - 1)
+        found = hist_keys[pos] == keys
+        return np.where(found[:, None], self._trans[pos], self._default)
+
+    def _out_row(self, word):
+        """Tags that can output a word (as an index array) and their output
+        log-probabilities."""
+        hmm = self._hmm
+        unknown = hasattr(hmm, 'unknown') and hmm.unknown(word)
+        candidates = None
+        if self._constrained:
+            candidates = hmm.candidate_tags(word)
+        # all unknown words with the same candidates share the same row
+        key = (None, candidates) if unknown else word
+        result = self._out.get(key)
+        if result is None:
+            row = self._log2(np.array(hmm.out_probs(word, self._tags)))
+            allowed = row > -inf
+            if candidates is not None:
+                mask = np.zeros(self._K, dtype=bool)
+                mask[[self._index[t] for t in candidates]] = True
+                allowed &= mask
+            cols = np.flatnonzero(allowed)
+            self._out[key] = result = (cols, row[cols])
+        return result
+
+    def tag(self, sent):
+        """Returns the most probable tagging for a sentence (None or the best
+        tagging of the words alone when there is none with non-zero
+        probability, like ViterbiTagger).
+
+        sent -- the sentence.
+        """
+        K, S, M = self._K, self._S, self._M
+        n = self._n
+
+        keys = np.array([self._start], dtype=np.int64)
+        scores = np.zeros(1)
+        steps = []
+        for word in sent:
+            # only the tags that can output the word
+            cols, out = self._out_row(word)
+            C = len(cols)
+            cand = scores[:, None] + self._trans_rows(keys)[:, cols] + \
+                out[None, :]
+            if n > 1:
+                new_keys = (keys % M * S)[:, None] + cols
+            else:
+                new_keys = np.zeros_like(cand, dtype=np.int64)
+            cand, new_keys = cand.ravel(), new_keys.ravel()
+
+            finite = np.flatnonzero(cand > -inf)
+            if len(finite) == 0:
+                # no tagging with non-zero probability
+                return None
+            # best candidate for each new history: sort by key, then score
+            order = finite[np.lexsort((-cand[finite], new_keys[finite]))]
+            sorted_keys = new_keys[order]
+            first = np.ones(len(order), dtype=bool)
+            first[1:] = sorted_keys[1:] != sorted_keys[:-1]
+            best = order[first]
+
+            beam = self._beam
+            if beam is not None and len(best) > beam:
+                best = best[np.argpartition(-cand[best], beam - 1)[:beam]]
+
+            keys, scores = new_keys[best], cand[best]
+            # (parent row, tag) of each kept candidate
+            steps.append((best // C, cols[best % C]))
+
+        final = scores + self._trans_rows(keys)[:, K]
+        if final.max() == -inf:
+            # no history can end the sentence: the best tagging of the
+            # words alone
+            final = scores
+        row = int(np.argmax(final))
+
+        tags = []
+        for parents, tag_ids in reversed(steps):
+            tags.append(self._tags[tag_ids[row]])
+            row = parents[row]
+        tags.reverse()
+        return tags
+
+    def tag_sents(self, sents, workers=1, chunksize=None):
+        """Returns the most probable tagging for each sentence.
+
+        sents -- the sentences.
+        workers -- number of worker processes (default: 1).
+        chunksize -- number of sentences sent to a worker at a time.
+        """
+        if workers > 1:
+            return pool_tag_sents(self, sents, workers, chunksize)
+        return [self.tag(sent) for sent in sents]
@@ -0,0 +1,244 @@
+"""Maximum Entropy Markov Model tagger.
+
+A linear classifier predicts the tag of each token from feature_dict()
+features plus features of the previous n-1 tags, and tagging searches the
+sequence of tags with the highest sum of log-probabilities.
+
+The score of a tag is linear in the features, so it splits into a part that
+only depends on the sentence and a part that only depends on the history of
+previous tags. The first one is computed for all the tokens of a sentence
+with one sparse-times-dense product, and the second one is a vector per
+history (memoized across sentences), added to it for each hypothesis of the
+beam.
+"""
+import numpy as np
+from scipy import sparse
+from scipy.special import logsumexp
+
+from common.memory import memory_report
+from tagging.classifier import BatchFeaturizer, candidate_index, classifiers
+from tagging.parallel import pool_tag_sents
+
+
+def history_features(prev_tags):
+    """Feature names of a history of previous tags: the previous tag, the
+    two previous tags, and so on.
+
+    prev_tags -- tuple of the previous tags (the last one is the nearest).
+    """
+    return ['pt{}={}'.format(k, ','.join(prev_tags[-k:]))
+            for k in range(1, len(prev_tags) + 1)]
+
+
+class MEMM:
+
+    def __init__(self, n, tagged_sents, clf='lr', beam=8, constrained=False):
+        """
+        n -- order of the model (the previous n-1 tags are used).
+        tagged_sents -- training sentences, each one being a list of pairs.
+        clf -- classifying model, one of 'svm', 'lr' (default: 'lr').
+        beam -- number of histories kept per position (default: 8, None for
+            exact Viterbi decoding).
+        constrained -- only expand the tags seen in training with each known
+            word (default: False).
+        """
+        self._n = n
+        self._clf = clf
+        self._beam = beam
+        self._constrained = constrained
+        self.fit(tagged_sents)
+
+    def fit(self, tagged_sents):
+        """
+        Train.
+
+        tagged_sents -- list of sentences, each one being a list of pairs.
+        """
+        n = self._n
+        sents, histories, y = [], [], []
+        tag_dict = {}
+        for tagged_sent in tagged_sents:
+            if not tagged_sent:
+                continue
+            sent, tags = zip(*tagged_sent)
+            sents.append(sent)
+            y.extend(tags)
+            for w, t in tagged_sent:
+                tag_dict.setdefault(w, set()).add(t)
+            padded = ('<s>',) * (n - 1) + tags
+            histories.extend(padded[i:i + n - 1] for i in range(len(tags)))
+
+        self._featurizer = BatchFeaturizer().fit(sents)
+        X_static = self._featurizer.transform(sents)
+        names = {f for h in set(histories) for f in history_features(h)}
+        self._history_vocab = {f: i for i, f in enumerate(sorted(names))}
+        X = sparse.hstack([X_static, self._history_matrix(histories)])
+        model = classifiers[self._clf]()
+        model.fit(X.tocsr(), y)
+
+        coef, intercept = model.coef_, model.intercept_
+        if coef.shape[0] == 1:
+            # binary models only score the second class
+            coef = np.vstack([np.zeros_like(coef), coef])
+            intercept = np.concatenate([[0.0], intercept])
+        n_static = X_static.shape[1]
+        self._tags = model.classes_.tolist()
+        self._static_coef = np.ascontiguousarray(coef[:, :n_static].T)
+        self._history_coef = coef[:, n_static:]
+        self._intercept = intercept
+        self._model = model
+        self._history_cache = {}
+        self._words, self._cand_offsets, self._cand_tags = \
+            candidate_index(tag_dict, self._tags)
+
+    def _history_matrix(self, histories):
+        """Sparse matrix of history features, one row per history."""
+        vocab = self._history_vocab
+        rows, cols = [], []
+        for i, h in enumerate(histories):
+            for f in history_features(h):
+                j = vocab.get(f)
+                if j is not None:
+                    rows.append(i)
+                    cols.append(j)
+        return sparse.csr_matrix((np.ones(len(rows)), (rows, cols)),
+                                 shape=(len(histories), len(vocab)))
+
+    def history_scores(self, prev_tags):
+        """Contribution of a history to the score of each tag (memoized).
+
+        prev_tags -- tuple of the previous n-1 tags.
+        """
+        scores = self._history_cache.get(prev_tags)
+        if scores is None:
+            vocab = self._history_vocab
+            cols = [vocab[f] for f in history_features(prev_tags)
+                    if f in vocab]
+            scores = self._history_coef[:, cols].sum(axis=1)
+            self._history_cache[prev_tags] = scores
+        return scores
+
+    def static_scores(self, sent):
+        """History independent part of the scores, one row per token and
+        one column per tag.
+
+        sent -- the sentence.
+        """
+        X = self._featurizer.transform([sent])
+        return X @ self._static_coef + self._intercept
+
+    def allowed_tags(self, sent):
+        """Mask of the tags that may be expanded, one row per token and one
+        column per tag: the tags seen in training with each known word, or
+        all of them.
+
+        sent -- the sentence.
+        """
+        allowed = np.ones((len(sent), len(self._tags)), dtype=bool)
+        offsets, cand_tags = self._cand_offsets, self._cand_tags
+        for k, w in enumerate(sent):
+            i = self._words.get(w)
+            if i is not None:
+                allowed[k] = False
+                allowed[k, cand_tags[offsets[i]:offsets[i + 1]]] = True
+        return allowed
+
+    def tag(self, sent):
+        """Returns the most probable tagging for a sentence.
+
+        The log-probabilities of the tags are the log-softmax of the scores
+        (for 'svm' this is a normalization of the decision function).
+
+        sent -- the sentence.
+        """
+        if not sent:
+            return []
+        tags = self._tags
+        n_tags = len(tags)
+        static = self.static_scores(sent)
+        allowed = self.allowed_tags(sent) if self._constrained else None
+
+        hists = [('<s>',) * (self._n - 1)]
+        lps = np.zeros(1)
+        backptrs = []
+        for k, row in enumerate(static):
+            scores = row + np.array([self.history_scores(h) for h in hists])
+            total = lps[:, None] + scores - \
+                logsumexp(scores, axis=1, keepdims=True)
+            if allowed is not None:
+                total[:, ~allowed[k]] = -np.inf
+
+            # best expansions, keeping one hypothesis per history
+            total = total.ravel()
+            new_hists, new_lps, back = [], [], []
+            seen = set()
+            for i in np.argsort(-total, kind='stable').tolist():
+                if total[i] == -np.inf:
+                    break
+                b, t = divmod(i, n_tags)
+                h = (hists[b] + (tags[t],))[1:]
+                if h in seen:
+                    continue
+                seen.add(h)
+                new_hists.append(h)
+                new_lps.append(total[i])
+                back.append((b, t))
+                if len(new_hists) == self._beam:
+                    break
+            hists, lps = new_hists, np.array(new_lps)
+            backptrs.append(back)
+
+        # hypotheses are sorted, the first one is the best
+        result, b = [], 0
+        for back in reversed(backptrs):
+            b, t = back[b]
+            result.append(tags[t])
+        return result[::-1]
+
+    def tag_sents(self, sents, workers=1, chunksize=None):
+        """Returns the most probable tagging for each sentence.
+
+        sents -- the sentences.
+        workers -- number of worker processes (default: 1).
+        chunksize -- number of sentences sent to a worker at a time.
+        """
+        if workers > 1:
+            return pool_tag_sents(self, sents, workers, chunksize)
+        return [self.tag(sent) for sent in sents]
+
+    def set_beam(self, beam):
+        """Set the beam width used by tag().
+
+        beam -- number of histories kept per position (None for exact
+            Viterbi decoding).
+        """
+        self._beam = beam
+
+    def set_constrained(self, constrained):
+        """Enable or disable the expansion of only the tags seen with each
+        known word.
+
+        constrained -- True or False.
+        """
+        self._constrained = constrained
+
+    def unknown(self, w):
+        """Check if a word is unknown for the model.
+
+        w -- the word.
+        """
+        return w not in self._words
+
+    def memory_report(self, seen=None):
+        """Memory usage of the model, broken down by component.
+
+        seen -- set of ids of objects already counted (updated in place).
+        """
+        return memory_report(self, seen)
+
+    def __getstate__(self):
+        """Return internal state for pickling, omitting unneeded objects.
+        """
+        state = dict(self.__dict__)
+        state['_history_cache'] = {}
+        return state
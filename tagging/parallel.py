@@ -0,0 +1,54 @@
+"""Tagging of sentence batches with a pool of worker processes.
+
+The model is handed to each worker once, when the pool starts (with the fork
+start method it is simply inherited), and then only the chunks of sentences
+and their taggings travel between processes.
+"""
+from multiprocessing import Pool
+import math
+
+
+# the model of the worker process (see _init_worker)
+_tagger = None
+
+
+def _init_worker(tagger):
+    global _tagger
+    _tagger = tagger
+
+
+def _tag_chunk(sents):
+    return _tagger.tag_sents(sents)
+
+
+def chunks(sents, chunksize):
+    """Split a list of sentences into consecutive chunks.
+
+    sents -- the sentences.
+    chunksize -- number of sentences per chunk.
+    """
+    return [sents[i:i + chunksize] for i in range(0, len(sents), chunksize)]
+
+
+def pool_tag_sents(tagger, sents, workers, chunksize=None):
+    """Tag sentences in a pool of processes, keeping their order.
+
+    Each worker tags its chunks with tagger.tag_sents(chunk).
+
+    tagger -- the tagger.
+    sents -- the sentences.
+    workers -- number of worker processes.
+    chunksize -- number of sentences sent to a worker at a time (default:
+        about four chunks per worker).
+    """
+    sents = list(sents)
+    if not sents:
+        return []
+    if chunksize is None:
+        chunksize = math.ceil(len(sents) / (4 * workers))
+
+    with Pool(workers, _init_worker, (tagger,)) as pool:
+        y_pred = []
+        for chunk_pred in pool.imap(_tag_chunk, chunks(sents, chunksize)):
+            y_pred.extend(chunk_pred)
+    return y_pred
@@ -0,0 +1,93 @@
+"""Benchmark the fastText feature vectorizer on the AnCora feature dicts.
+
+Compares the vectorizer (training vocabulary precomputed, LRU cache for the
+other words) with a call to the model for each word of each feature dict.
+
+Usage:
+  bench_fasttext.py -e <file> [options]
+  bench_fasttext.py -h | --help
+
+Options:
+  -e <file>     fastText binary model file.
+  -k <keys>     Comma-separated keys of the feature dicts with words
+                [default: w,pw,nw].
+  --cache-size <c>  Size of the LRU cache of the vectorizer
+                [default: 100000].
+  --parse-workers <w>  Number of processes that parse the corpus files
+                [default: 1].
+  --cache <dir>  Cache the parsed corpus in <dir> (reused while the corpus
+                files do not change).
+  --profile <prof>  Record wall time, CPU time and peak RSS per stage and
+                save a JSON summary to <prof>.
+  --cprofile    With --profile, also dump cProfile stats per stage.
+  -h --help     Show this screen.
+"""
+from docopt import docopt
+import time
+
+import numpy as np
+
+from tagging.ancora import SimpleAncoraCorpusReader
+from tagging.classifier import FeatureDicts
+from tagging.fasttext import FasttextDictVectorizer
+from common.profiling import Profiler
+
+
+def feature_dicts(files, opts):
+    corpus = SimpleAncoraCorpusReader(
+        'ancora/ancora-3.0.1es/', files, cache_dir=opts['--cache'],
+        workers=int(opts['--parse-workers']))
+    sents = [[w for w, _ in sent] for sent in corpus.tagged_sents()]
+    return FeatureDicts().transform(sents)
+
+
+def report(name, n, elapsed):
+    print('{}\t{:.2f}\t{:.1f}'.format(name, elapsed, n / elapsed))
+
+
+if __name__ == '__main__':
+    opts = docopt(__doc__)
+    keys = opts['-k'].split(',')
+    profiler = Profiler(opts['--profile'], opts['--cprofile'])
+
+    # the feature dicts of the training and test corpora
+    with profiler.stage('load'):
+        train = feature_dicts('CESS-CAST-(A|AA|P)/.*\.tbf\.xml', opts)
+        test = feature_dicts('3LB-CAST/.*\.tbf\.xml', opts)
+    print('train: {} tokens, test: {} tokens'.format(len(train), len(test)))
+
+    with profiler.stage('deserialize'):
+        vect = FasttextDictVectorizer(opts['-e'], keys,
+                                      int(opts['--cache-size']))
+        m = vect._load_model()
+
+    print('method\ttime (s)\ttokens/s')
+    with profiler.stage('predict-per-word'):
+        start = time.perf_counter()
+        expected = np.array([np.concatenate([m.get_word_vector(x[k])
+                                             for k in keys]) for x in test])
+        report('per word', len(test), time.perf_counter() - start)
+
+    with profiler.stage('predict-lru'):
+        start = time.perf_counter()
+        X = vect.transform(test)
+        report('LRU only', len(test), time.perf_counter() - start)
+    assert np.array_equal(X, expected)
+
+    with profiler.stage('train'):
+        start = time.perf_counter()
+        vect.fit(train)
+        report('fit', len(train), time.perf_counter() - start)
+
+    with profiler.stage('predict-train'):
+        start = time.perf_counter()
+        X = vect.transform(train)
+        report('train batch', len(train), time.perf_counter() - start)
+
+    with profiler.stage('predict-test'):
+        start = time.perf_counter()
+        X = vect.transform(test)
+        report('test batch', len(test), time.perf_counter() - start)
+    assert np.array_equal(X, expected)
+
+    profiler.close()
@@ -1,35 +1,196 @@
 """Evaulate a tagger.
 
 Usage:
-  eval.py -i <file> [-c]
+  eval.py -i <file> [options]
   eval.py -h | --help
 
 Options:
   -c            Show confusion matrix.
   -i <file>     Tagging model file.
+  -b <b>        Beam width for HMM and MEMM decoding (overrides the model's).
+  -d            Constrain decoding with the tag dictionary (taggers that
+                have one).
+  -w <w>        Number of worker processes for tagging [default: 1].
+  --chunksize <c>  Number of sentences sent to a worker at a time (default:
+                about four chunks per worker).
+  --beams <list>  Compare exact HMM decoding with beam search for each of
+                the comma-separated beam widths, with and without the tag
+                dictionary (accuracy and speed).
+  --parse-workers <w>  Number of processes that parse the corpus files
+                [default: 1].
+  --cache <dir>  Cache the parsed corpus, and the classifier features, in
+                <dir> (reused while the corpus files do not change).
+  --profile <prof>  Record wall time, CPU time and peak RSS per stage and
+                save a JSON summary to <prof>.
+  --cprofile    With --profile, also dump cProfile stats per stage.
   -h --help     Show this screen.
 """
-from docopt import docopt
+from docopt import docopt, DocoptExit
 import pickle
 import sys
+import time
 from collections import defaultdict
 
 from tagging.ancora import SimpleAncoraCorpusReader
+from common.profiling import Profiler
+
+
+def progress(msg, width=None):
+    """Ouput the progress of something on the same line."""
+    if not width:
+        width = len(msg)
+    print('\b' * width + msg, end='')
+    sys.stdout.flush()
+
+
+def tag_sents(model, sents, verbose=True, workers=1, chunksize=None,
+              features_file=None):
+    """Tag the words of a list of tagged sentences.
+
+    model -- the tagger.
+    sents -- the tagged sentences.
+    verbose -- whether to show the progress (only with one worker).
+    workers -- number of worker processes (default: 1).
+    chunksize -- number of sentences sent to a worker at a time.
+    features_file -- cache of the feature matrix of the sentences (only for
+        classifier taggers with one worker).
+    """
+    word_sents = [[w for w, _ in sent] for sent in sents]
+    if workers > 1:
+        return model.tag_sents(word_sents, workers, chunksize)
+    if features_file is not None:
+        return model.tag_sents(word_sents, features_file=features_file)
+
+    y_pred = []
+    n = len(sents)
+    for i, sent in enumerate(sents):
+        word_sent, _ = zip(*sent)
+        y_pred.append(model.tag(word_sent))
+        if verbose:
+            progress('{:3.1f}%'.format(float(i) * 100 / n))
+    if verbose:
+        print('')
+    return y_pred
+
+
+def evaluate(model, sents, y_pred):
+    """Accuracy (overall, known and unknown words) and confusion counts.
+
+    model -- the tagger.
+    sents -- the tagged sentences (gold tags).
+    y_pred -- the predicted taggings.
+    """
+    hits, total = 0, 0
+    hits_known, total_known = 0, 0
+    confusion = defaultdict(lambda: defaultdict(int))
+    for sent, model_tag_sent in zip(sents, y_pred):
+        for (w, gold_tag), model_tag in zip(sent, model_tag_sent):
+            hit = model_tag == gold_tag
+            hits += hit
+            total += 1
+            if not model.unknown(w):
+                hits_known += hit
+                total_known += 1
+            confusion[gold_tag][model_tag] += 1
+
+    hits_unknown = hits - hits_known
+    total_unknown = total - total_known
+    acc = float(hits) / total
+    acc_known = float(hits_known) / total_known if total_known else 0.0
+    acc_unknown = float(hits_unknown) / total_unknown if total_unknown else 0.0
+    return acc, acc_known, acc_unknown, confusion, total
 
 
 if __name__ == '__main__':
     opts = docopt(__doc__)
+    workers = int(opts['-w'])
+    chunksize = int(opts['--chunksize']) if opts['--chunksize'] else None
+    profiler = Profiler(opts['--profile'], opts['--cprofile'])
 
     # load the model
-    filename = opts['-i']
-    f = open(filename, 'rb')
-    model = pickle.load(f)
-    f.close()
+    with profiler.stage('deserialize'):
+        filename = opts['-i']
+        f = open(filename, 'rb')
+        model = pickle.load(f)
+        f.close()
+        # the decoding options are only for the taggers that have them
+        if (opts['-b'] or opts['--beams']) and not hasattr(model, 'set_beam'):
+            raise DocoptExit('-b and --beams need a tagger with beam search '
+                             '(HMM or MEMM)')
+        if (opts['-d'] or opts['--beams']) and \
+                not hasattr(model, 'set_constrained'):
+            raise DocoptExit('-d and --beams need a tagger with a tag '
+                             'dictionary')
+        if opts['-b']:
+            model.set_beam(int(opts['-b']))
+        if opts['-d']:
+            model.set_constrained(True)
 
     # load the data
-    files = '3LB-CAST/.*\.tbf\.xml'
-    corpus = SimpleAncoraCorpusReader('ancora/ancora-3.0.1es/', files)
-    sents = list(corpus.tagged_sents())
+    with profiler.stage('load'):
+        files = '3LB-CAST/.*\.tbf\.xml'
+        corpus = SimpleAncoraCorpusReader(
+            'ancora/ancora-3.0.1es/', files, cache_dir=opts['--cache'],
+            workers=int(opts['--parse-workers']))
+        sents = list(corpus.tagged_sents())
+
+    if opts['--beams']:
+        # accuracy and speed of beam search and the tag dictionary against
+        # exact decoding
+        beams = [None] + [int(b) for b in opts['--beams'].split(',')]
+        print('beam\tdict\tacc\tagree\tsent/s\tspeedup')
+        for constrained in [False, True]:
+            model.set_constrained(constrained)
+            for beam in beams:
+                model.set_beam(beam)
+                stage = 'predict-beam-{}{}'.format(
+                    beam or 'exact', '-dict' if constrained else '')
+                with profiler.stage(stage):
+                    start = time.perf_counter()
+                    y_pred = tag_sents(model, sents, False, workers,
+                                       chunksize)
+                    speed = len(sents) / (time.perf_counter() - start)
+                if beam is None and not constrained:
+                    exact_pred, exact_speed = y_pred, speed
+                acc = evaluate(model, sents, y_pred)[0]
+                agree = sum(y == y2 for y, y2 in zip(y_pred, exact_pred))
+                print('{}\t{}\t{:2.2f}%\t{:2.2f}%\t{:.1f}\t{:.2f}x'.format(
+                    beam or 'exact', 'yes' if constrained else 'no',
+                    acc * 100, agree * 100 / len(sents), speed,
+                    speed / exact_speed))
+    else:
+        # tag
+        with profiler.stage('predict'):
+            start = time.perf_counter()
+            features_file = None
+            if hasattr(model, 'feature_settings'):
+                # None without --cache
+                features_file = corpus.cache_filename(
+                    'features', model.feature_settings())
+            y_pred = tag_sents(model, sents, True, workers, chunksize,
+                               features_file)
+            elapsed = time.perf_counter() - start
+
+        # evaluate
+        with profiler.stage('evaluate'):
+            acc, acc_known, acc_unknown, confusion, total = \
+                evaluate(model, sents, y_pred)
+
+        print('Accuracy: {:2.2f}%'.format(acc * 100))
+        print('Accuracy (known words): {:2.2f}%'.format(acc_known * 100))
+        print('Accuracy (unknown words): {:2.2f}%'.format(acc_unknown * 100))
+        print('Speed: {:.1f} tokens/s ({} workers)'.format(total / elapsed,
+                                                          workers))
+
+        if opts['-c']:
+            # confusion matrix for the 10 most frequent gold tags
+            tags = sorted(confusion, key=lambda t: -sum(confusion[t].values()))
+            tags = tags[:10]
+            print('')
+            print('g \\ m\t' + '\t'.join(tags))
+            for t1 in tags:
+                row = ['{:2.2f}'.format(confusion[t1][t2] * 100 / total)
+                       for t2 in tags]
+                print(t1 + '\t' + '\t'.join(row))
 
-    # tag and evaluate
-    # WORK HERE!!
+    profiler.close()
@@ -0,0 +1,61 @@
+"""Export the fastText vectors of the AnCora vocabulary to a memory-mapped
+table (see tagging.embeddings).
+
+Usage:
+  export_fasttext.py -e <file> -o <file> [options]
+  export_fasttext.py -h | --help
+
+Options:
+  -e <file>     fastText binary model file.
+  -o <file>     Output table file ('.npy', the vocabulary goes to a '.json'
+                file next to it).
+  -v <file>     Also export the words of this file (one per line).
+  --buckets <n>  Number of rows of the hashed n-gram table for the other
+                words [default: 100000].
+  --minn <n>    Minimum n-gram length (as in the fastText model)
+                [default: 3].
+  --maxn <n>    Maximum n-gram length (as in the fastText model)
+                [default: 6].
+  --parse-workers <w>  Number of processes that parse the corpus files
+                [default: 1].
+  --cache <dir>  Cache the parsed corpus in <dir> (reused while the corpus
+                files do not change).
+  --profile <prof>  Record wall time, CPU time and peak RSS per stage and
+                save a JSON summary to <prof>.
+  --cprofile    With --profile, also dump cProfile stats per stage.
+  -h --help     Show this screen.
+"""
+from docopt import docopt
+
+from fastText import load_model
+
+from tagging.ancora import SimpleAncoraCorpusReader
+from tagging.embeddings import export_embeddings
+from common.profiling import Profiler
+
+
+if __name__ == '__main__':
+    opts = docopt(__doc__)
+    profiler = Profiler(opts['--profile'], opts['--cprofile'])
+
+    # the words of the whole corpus, lowercased like in feature_dict()
+    with profiler.stage('load'):
+        corpus = SimpleAncoraCorpusReader(
+            'ancora/ancora-3.0.1es/', cache_dir=opts['--cache'],
+            workers=int(opts['--parse-workers']))
+        words = {w.lower() for sent in corpus.sents() for w in sent}
+        words.update(['<s>', '</s>'])
+        if opts['-v']:
+            with open(opts['-v']) as f:
+                words.update(line.strip() for line in f if line.strip())
+
+    with profiler.stage('deserialize'):
+        model = load_model(opts['-e'])
+
+    with profiler.stage('serialize'):
+        export_embeddings(model, sorted(words), opts['-o'],
+                          buckets=int(opts['--buckets']),
+                          minn=int(opts['--minn']), maxn=int(opts['--maxn']))
+    print('Exported {} words to {}'.format(len(words), opts['-o']))
+
+    profiler.close()
@@ -1,117 +1,456 @@
 """Print corpus statistics.
 
 Usage:
-  stats.py
+  stats.py [options]
   stats.py -h | --help
 
 Options:
+  --stream      Parse the corpus incrementally, one sentence at a time
+                (single pass, bounded memory).
+  -w <w>        Number of processes that compute the statistics of shards of
+                the corpus files, merged at the end (they parse their own
+                files, without --cache and --parse-workers) [default: 1].
+  --parse-workers <w>  Number of processes that parse the corpus files
+                [default: 1].
+  --approx      Approximate word statistics in fixed memory, with their
+                error bounds (no ambiguity levels).
+  --cms-width <w>  Counters per row of the Count-Min sketch of word
+                frequencies, with --approx [default: 262144].
+  --cms-depth <d>  Rows of the Count-Min sketch, with --approx [default: 4].
+  --hll-precision <p>  The HyperLogLog estimator of the vocabulary size has
+                2^<p> registers, with --approx [default: 14].
+  --top <k>     Words tracked per tag, with --approx [default: 100].
+  --cache <dir>  Cache the parsed corpus in <dir> (reused while the corpus
+                files do not change).
+  --profile <prof>  Record wall time, CPU time and peak RSS per stage and
+                save a JSON summary to <prof>.
+  --cprofile    With --profile, also dump cProfile stats per stage.
   -h --help     Show this screen.
 """
 from docopt import docopt
-from collections import defaultdict
+from collections import defaultdict, Counter
+from functools import partial
+from multiprocessing import Pool
+from operator import itemgetter
+import heapq
+import math
 
 from tagging.ancora import SimpleAncoraCorpusReader
+from tagging.parallel import chunks
+from tagging.sketches import CountMinSketch, HyperLogLog, MisraGries
+from tagging.sketches import stable_hashes
+from common.profiling import Profiler
 
 
 class POSStats:
     """Several statistics for a POS tagged corpus.
+
+    The only counts are those of the (word, tag) pairs, so statistics of
+    parts of a corpus can be computed separately and merged. The other
+    statistics are derived from them in a single pass, on first use after
+    each update.
     """
 
-    def __init__(self, tagged_sents):
+    def __init__(self, tagged_sents=()):
         """
         tagged_sents -- corpus (list/iterable/generator of tagged sentences)
         """
-        # WORK HERE!!
-        # COLLECT REQUIRED STATISTICS INTO DICTIONARIES.
+        self._sent_count = 0
+        self._counts = Counter()
+        self.update(tagged_sents)
+
+    def update(self, tagged_sents):
+        """Add the counts of more sentences.
+
+        tagged_sents -- list/iterable/generator of tagged sentences.
+        """
+        counts = self._counts
+        for sent in tagged_sents:
+            counts.update(sent)
+            self._sent_count += 1
+        self._derived = False
+
+    def merge(self, other):
+        """Add the counts of another POSStats (returns self).
+
+        other -- the other POSStats.
+        """
+        self._counts.update(other._counts)
+        self._sent_count += other._sent_count
+        self._derived = False
+        return self
+
+    def _derive(self):
+        """Compute the word and tag statistics, if not done yet."""
+        if self._derived:
+            return
+        wcount = defaultdict(int)
+        tag_freq = defaultdict(int)
+        tcount = defaultdict(dict)
+        ntags = defaultdict(int)
+        for (w, t), c in self._counts.items():
+            wcount[w] += c
+            tag_freq[t] += c
+            tcount[t][w] = c
+            ntags[w] += 1
+        ambiguity = defaultdict(list)
+        for w, n in ntags.items():
+            ambiguity[n].append(w)
+        self._wcount = dict(wcount)
+        self._tag_freq = dict(tag_freq)
+        self._tcount = dict(tcount)
+        self._ambiguity = dict(ambiguity)
+        self._derived = True
 
     def sent_count(self):
         """Total number of sentences."""
-        # WORK HERE!!
+        return self._sent_count
 
     def token_count(self):
         """Total number of tokens."""
-        # WORK HERE!!
+        return sum(self._counts.values())
 
     def words(self):
         """Vocabulary (set of word types)."""
-        # WORK HERE!!
+        self._derive()
+        return set(self._wcount)
 
     def word_count(self):
         """Vocabulary size."""
-        # WORK HERE!!
+        self._derive()
+        return len(self._wcount)
 
     def word_freq(self, w):
         """Frequency of word w."""
-        # WORK HERE!!
+        self._derive()
+        return self._wcount.get(w, 0)
 
     def unambiguous_words(self):
         """List of words with only one observed POS tag."""
-        # WORK HERE!!
+        return self.ambiguous_words(1)
 
     def ambiguous_words(self, n):
         """List of words with n different observed POS tags.
 
         n -- number of tags.
         """
-        # WORK HERE!!
+        self._derive()
+        return self._ambiguity.get(n, [])
+
+    def top_ambiguous_words(self, n, k):
+        """The k most frequent words with n different observed POS tags.
+
+        n -- number of tags.
+        k -- number of words.
+        """
+        self._derive()
+        return heapq.nlargest(k, self.ambiguous_words(n),
+                              key=self._wcount.__getitem__)
 
     def tags(self):
         """POS Tagset."""
-        # WORK HERE!!
+        self._derive()
+        return set(self._tag_freq)
 
     def tag_count(self):
         """POS tagset size."""
-        # WORK HERE!!
+        self._derive()
+        return len(self._tag_freq)
 
     def tag_freq(self, t):
         """Frequency of tag t."""
-        # WORK HERE!!
+        self._derive()
+        return self._tag_freq.get(t, 0)
+
+    def top_tags(self, k):
+        """The k most frequent tags, with their frequencies.
+
+        k -- number of tags.
+        """
+        self._derive()
+        return heapq.nlargest(k, self._tag_freq.items(), key=itemgetter(1))
 
     def tag_word_dict(self, t):
         """Dictionary of words and their counts for tag t."""
-        return dict(self._tcount[t])
+        self._derive()
+        return dict(self._tcount.get(t, {}))
+
+    def top_tag_words(self, t, k):
+        """The k most frequent words with tag t, with their counts.
+
+        t -- the tag.
+        k -- number of words.
+        """
+        self._derive()
+        return heapq.nlargest(k, self._tcount.get(t, {}).items(),
+                              key=itemgetter(1))
+
+
+class ApproxPOSStats:
+    """Approximate statistics for huge POS tagged corpora, in fixed memory.
+
+    Word frequencies come from a Count-Min sketch, the vocabulary size from
+    a HyperLogLog estimator and the most frequent words of each tag from
+    Misra-Gries summaries, with the error bounds given by the *_error()
+    methods. The sentence, token and tag counts are exact (the tagset is
+    small). There are no ambiguity statistics. Like POSStats, statistics of
+    parts of a corpus can be merged.
+    """
+
+    def __init__(self, tagged_sents=(), width=2 ** 18, depth=4, precision=14,
+                 top=100, batch_size=100000):
+        """
+        tagged_sents -- corpus (list/iterable/generator of tagged sentences)
+        width -- counters per row of the Count-Min sketch (default: 2 ** 18).
+        depth -- rows of the Count-Min sketch (default: 4).
+        precision -- the HyperLogLog estimator has 2 ** precision registers
+            (default: 14).
+        top -- number of words tracked per tag (default: 100).
+        batch_size -- tokens counted exactly before updating the summaries
+            (default: 100000).
+        """
+        self._sent_count = 0
+        self._tag_freq = defaultdict(int)
+        self._word_freqs = CountMinSketch(width, depth)
+        self._vocab = HyperLogLog(precision)
+        self._top = top
+        self._tag_words = {}
+        self._batch_size = batch_size
+        self.update(tagged_sents)
+
+    def update(self, tagged_sents):
+        """Add the counts of more sentences.
+
+        tagged_sents -- list/iterable/generator of tagged sentences.
+        """
+        batch, n = Counter(), 0
+        for sent in tagged_sents:
+            batch.update(sent)
+            n += len(sent)
+            self._sent_count += 1
+            if n >= self._batch_size:
+                self._add_batch(batch)
+                batch, n = Counter(), 0
+        self._add_batch(batch)
+
+    def _add_batch(self, batch):
+        """Update the summaries with the counts of (word, tag) pairs."""
+        words = defaultdict(int)
+        tag_words = defaultdict(dict)
+        for (w, t), c in batch.items():
+            words[w] += c
+            tag_words[t][w] = c
+        # one hash per distinct word of the batch
+        hashes = stable_hashes(list(words))
+        self._word_freqs.add(hashes, list(words.values()))
+        self._vocab.add(hashes)
+        for t, counts in tag_words.items():
+            self._tag_freq[t] += sum(counts.values())
+            if t not in self._tag_words:
+                self._tag_words[t] = MisraGries(self._top)
+            self._tag_words[t].update(counts)
+
+    def merge(self, other):
+        """Add the counts of another ApproxPOSStats with the same settings
+        (returns self).
+
+        other -- the other ApproxPOSStats.
+        """
+        self._sent_count += other._sent_count
+        for t, f in other._tag_freq.items():
+            self._tag_freq[t] += f
+        self._word_freqs.merge(other._word_freqs)
+        self._vocab.merge(other._vocab)
+        for t, summary in other._tag_words.items():
+            if t not in self._tag_words:
+                self._tag_words[t] = MisraGries(self._top)
+            self._tag_words[t].merge(summary)
+        return self
+
+    def sent_count(self):
+        """Total number of sentences."""
+        return self._sent_count
+
+    def token_count(self):
+        """Total number of tokens."""
+        return sum(self._tag_freq.values())
+
+    def word_count(self):
+        """Estimated vocabulary size."""
+        return round(self._vocab.estimate())
+
+    def word_count_error(self):
+        """Relative standard error of word_count()."""
+        return self._vocab.relative_error()
+
+    def word_freq(self, w):
+        """Estimated frequency of word w (never below the true one)."""
+        return self._word_freqs.estimate(w)
+
+    def word_freq_error(self):
+        """Bound of the overestimation of word_freq(), and the probability
+        that it holds for a word."""
+        return (self._word_freqs.error_bound(),
+                self._word_freqs.confidence())
+
+    def tags(self):
+        """POS Tagset."""
+        return set(self._tag_freq)
+
+    def tag_count(self):
+        """POS tagset size."""
+        return len(self._tag_freq)
+
+    def tag_freq(self, t):
+        """Frequency of tag t."""
+        return self._tag_freq.get(t, 0)
+
+    def top_tags(self, k):
+        """The k most frequent tags, with their frequencies.
+
+        k -- number of tags.
+        """
+        return heapq.nlargest(k, self._tag_freq.items(), key=itemgetter(1))
+
+    def top_tag_words(self, t, k):
+        """The (estimated) k most frequent words with tag t, with their
+        estimated counts (never above the true ones).
+
+        t -- the tag.
+        k -- number of words.
+        """
+        summary = self._tag_words.get(t)
+        return summary.top(k) if summary is not None else []
+
+    def top_tag_words_error(self, t):
+        """Bound of the underestimation of the counts of top_tag_words(t).
+
+        t -- the tag.
+        """
+        summary = self._tag_words.get(t)
+        return summary.error_bound() if summary is not None else 0
+
+
+# the corpus reader and the statistics class of the worker process (see
+# _init_worker)
+_corpus = None
+_stats_class = None
+
+
+def _init_worker(corpus, stats_class):
+    global _corpus, _stats_class
+    _corpus = corpus
+    _stats_class = stats_class
+
+
+def _shard_stats(fileids):
+    return _stats_class(_corpus.tagged_sents(fileids))
+
+
+def parallel_stats(corpus, workers, shards=None, stats_class=POSStats):
+    """Statistics of a corpus computed per shard of files in a pool of
+    processes, and merged.
+
+    corpus -- the corpus reader (without cache or parse workers).
+    workers -- number of worker processes.
+    shards -- number of shards (default: four per worker).
+    stats_class -- function that computes the statistics of some tagged
+        sentences, such as POSStats or a partial of ApproxPOSStats (default:
+        POSStats).
+    """
+    fileids = corpus.xmlreader.fileids()
+    if shards is None:
+        shards = 4 * workers
+    size = max(1, math.ceil(len(fileids) / shards))
+
+    stats = stats_class(())
+    with Pool(workers, _init_worker, (corpus, stats_class)) as pool:
+        for shard in pool.imap_unordered(_shard_stats,
+                                         chunks(fileids, size)):
+            stats.merge(shard)
+    return stats
 
 
 if __name__ == '__main__':
     opts = docopt(__doc__)
+    profiler = Profiler(opts['--profile'], opts['--cprofile'])
 
     # load the data
-    corpus = SimpleAncoraCorpusReader('ancora/ancora-3.0.1es/')
-    sents = corpus.tagged_sents()
+    with profiler.stage('load'):
+        workers = int(opts['-w'])
+        if workers > 1:
+            # each worker parses its own files
+            corpus = SimpleAncoraCorpusReader('ancora/ancora-3.0.1es/',
+                                              stream=opts['--stream'])
+        else:
+            corpus = SimpleAncoraCorpusReader(
+                'ancora/ancora-3.0.1es/', cache_dir=opts['--cache'],
+                stream=opts['--stream'],
+                workers=int(opts['--parse-workers']))
+            sents = corpus.tagged_sents()
 
     # compute the statistics
-    stats = POSStats(sents)
-
-    print('Basic Statistics')
-    print('================')
-    print('sents: {}'.format(stats.sent_count()))
-    token_count = stats.token_count()
-    print('tokens: {}'.format(token_count))
-    word_count = stats.word_count()
-    print('words: {}'.format(word_count))
-    print('tags: {}'.format(stats.tag_count()))
-    print('')
-
-    print('Most Frequent POS Tags')
-    print('======================')
-    tags = [(t, stats.tag_freq(t)) for t in stats.tags()]
-    sorted_tags = sorted(tags, key=lambda t_f: -t_f[1])
-    print('tag\tfreq\t%\ttop')
-    for t, f in sorted_tags[:10]:
-        words = stats.tag_word_dict(t).items()
-        sorted_words = sorted(words, key=lambda w_f: -w_f[1])
-        top = [w for w, _ in sorted_words[:5]]
-        print('{0}\t{1}\t{2:2.2f}\t({3})'.format(t, f, f * 100 / token_count, ', '.join(top)))
-    print('')
-
-    print('Word Ambiguity Levels')
-    print('=====================')
-    print('n\twords\t%\ttop')
-    for n in range(1, 10):
-        words = list(stats.ambiguous_words(n))
-        m = len(words)
-
-        # most frequent words:
-        sorted_words = sorted(words, key=lambda w: -stats.word_freq(w))
-        top = sorted_words[:5]
-        print('{0}\t{1}\t{2:2.2f}\t({3})'.format(n, m, m * 100 / word_count, ', '.join(top)))
+    with profiler.stage('stats'):
+        approx = opts['--approx']
+        stats_class = POSStats
+        if approx:
+            stats_class = partial(
+                ApproxPOSStats, width=int(opts['--cms-width']),
+                depth=int(opts['--cms-depth']),
+                precision=int(opts['--hll-precision']),
+                top=int(opts['--top']))
+        if workers > 1:
+            stats = parallel_stats(corpus, workers, stats_class=stats_class)
+        else:
+            stats = stats_class(sents)
+
+    # print them
+    with profiler.stage('report'):
+        print('Basic Statistics')
+        print('================')
+        print('sents: {}'.format(stats.sent_count()))
+        token_count = stats.token_count()
+        print('tokens: {}'.format(token_count))
+        word_count = stats.word_count()
+        if approx:
+            print('words: ~{} (standard error {:.2f}%)'.format(
+                word_count, stats.word_count_error() * 100))
+            bound, confidence = stats.word_freq_error()
+            print('word frequencies: +{:.1f} at most (with probability '
+                  '{:.3f})'.format(bound, confidence))
+        else:
+            print('words: {}'.format(word_count))
+        print('tags: {}'.format(stats.tag_count()))
+        print('')
+
+        print('Most Frequent POS Tags')
+        print('======================')
+        if approx:
+            # the top word counts are lower bounds
+            print('tag\tfreq\t%\ttop (count, up to +error)\terror')
+            for t, f in stats.top_tags(10):
+                top = ['{} ({})'.format(w, c)
+                       for w, c in stats.top_tag_words(t, 5)]
+                print('{0}\t{1}\t{2:2.2f}\t({3})\t{4}'.format(
+                    t, f, f * 100 / token_count, ', '.join(top),
+                    stats.top_tag_words_error(t)))
+        else:
+            print('tag\tfreq\t%\ttop')
+            for t, f in stats.top_tags(10):
+                top = [w for w, _ in stats.top_tag_words(t, 5)]
+                print('{0}\t{1}\t{2:2.2f}\t({3})'.format(
+                    t, f, f * 100 / token_count, ', '.join(top)))
+            print('')
+
+            print('Word Ambiguity Levels')
+            print('=====================')
+            print('n\twords\t%\ttop')
+            for n in range(1, 10):
+                m = len(stats.ambiguous_words(n))
+
+                # most frequent words:
+                top = stats.top_ambiguous_words(n, 5)
+                print('{0}\t{1}\t{2:2.2f}\t({3})'.format(
+                    n, m, m * 100 / word_count, ', '.join(top)))
+
+    profiler.close()
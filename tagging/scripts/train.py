@@ -8,7 +8,36 @@ Options:
   -m <model>    Model to use [default: badbase]:
                   badbase: Bad baseline
                   base: Baseline
+                  mlhmm: Hidden Markov Model
+                  classifier: Classifier based tagger
+                  online: Classifier based tagger trained out of core
+                  memm: Maximum Entropy Markov Model
+  -c <clf>      Classifier to use if the model is 'classifier' or 'memm'
+                (default: 'lr') or 'online' (default: 'sgd'):
+                  lr: Logistic Regression
+                  svm: Support Vector Machine
+                  sgd: Linear model with stochastic gradient descent
+                  perceptron: Perceptron
+  -f <n>        Hash the classifier features into <n> columns instead of
+                keeping a feature vocabulary (e.g. 262144; always hashed
+                for 'online', default: 1048576).
+  --epochs <e>  Passes over the corpus for 'online' [default: 5].
+  --batch-size <b>  Sentences per mini-batch for 'online' [default: 1000].
+  -n <n>        Order of the model for mlhmm and memm [default: 3].
+  -b <b>        Beam width for decoding (default: exact Viterbi for mlhmm,
+                8 for memm).
+  -d            Constrain mlhmm decoding with a tag dictionary (suffix
+                based for unknown words).
   -o <file>     Output model file.
+  --stream      Parse the corpus incrementally, one sentence at a time
+                (single pass, bounded memory).
+  --parse-workers <w>  Number of processes that parse the corpus files
+                [default: 1].
+  --cache <dir>  Cache the parsed corpus, and the classifier features, in
+                <dir> (reused while the corpus files do not change).
+  --profile <prof>  Record wall time, CPU time and peak RSS per stage and
+                save a JSON summary to <prof>.
+  --cprofile    With --profile, also dump cProfile stats per stage.
   -h --help     Show this screen.
 """
 from docopt import docopt
@@ -16,28 +45,69 @@ import pickle
 
 from tagging.ancora import SimpleAncoraCorpusReader
 from tagging.baseline import BaselineTagger, BadBaselineTagger
+from tagging.hmm import MLHMM
+from tagging.memm import MEMM
+from tagging.classifier import ClassifierTagger, OnlineClassifierTagger
+from tagging.classifier import feature_settings
+from common.profiling import Profiler
 
 
 models = {
     'badbase': BadBaselineTagger,
     'base': BaselineTagger,
+    'mlhmm': MLHMM,
+    'classifier': ClassifierTagger,
+    'online': OnlineClassifierTagger,
+    'memm': MEMM,
 }
 
 
 if __name__ == '__main__':
     opts = docopt(__doc__)
+    profiler = Profiler(opts['--profile'], opts['--cprofile'])
 
     # load the data
-    files = 'CESS-CAST-(A|AA|P)/.*\.tbf\.xml'
-    corpus = SimpleAncoraCorpusReader('ancora/ancora-3.0.1es/', files)
-    sents = corpus.tagged_sents()
+    with profiler.stage('load'):
+        files = 'CESS-CAST-(A|AA|P)/.*\.tbf\.xml'
+        corpus = SimpleAncoraCorpusReader(
+            'ancora/ancora-3.0.1es/', files, cache_dir=opts['--cache'],
+            stream=opts['--stream'], workers=int(opts['--parse-workers']))
+        sents = corpus.tagged_sents()
 
     # train the model
-    model_class = models[opts['-m']]
-    model = model_class(sents)
+    with profiler.stage('train'):
+        model_class = models[opts['-m']]
+        if opts['-m'] == 'mlhmm':
+            beam = int(opts['-b']) if opts['-b'] else None
+            model = model_class(int(opts['-n']), sents, beam=beam,
+                                constrained=opts['-d'])
+        elif opts['-m'] == 'memm':
+            beam = int(opts['-b']) if opts['-b'] else 8
+            model = model_class(int(opts['-n']), sents, clf=opts['-c'] or 'lr',
+                                beam=beam)
+        elif opts['-m'] == 'classifier':
+            n_features = int(opts['-f']) if opts['-f'] else None
+            # None without --cache
+            features_file = corpus.cache_filename(
+                'features', feature_settings(n_features))
+            model = model_class(sents, clf=opts['-c'] or 'lr',
+                                n_features=n_features,
+                                features_file=features_file)
+        elif opts['-m'] == 'online':
+            # the corpus is read again in each epoch (use --stream to keep
+            # memory bounded)
+            model = model_class(corpus.tagged_sents, clf=opts['-c'] or 'sgd',
+                                n_features=int(opts['-f'] or 2 ** 20),
+                                batch_size=int(opts['--batch-size']),
+                                epochs=int(opts['--epochs']))
+        else:
+            model = model_class(sents)
 
     # save it
-    filename = opts['-o']
-    f = open(filename, 'wb')
-    pickle.dump(model, f)
-    f.close()
+    with profiler.stage('serialize'):
+        filename = opts['-o']
+        f = open(filename, 'wb')
+        pickle.dump(model, f)
+        f.close()
+
+    profiler.close()
@@ -0,0 +1,194 @@
+"""Fixed-memory summaries of large streams of counts.
+
+CountMinSketch estimates frequencies, HyperLogLog the number of distinct
+keys and MisraGries the most frequent keys. All of them can be merged with
+summaries of other parts of a stream (built with the same settings), and
+give a bound of their error.
+
+The keys are hashed with stable_hashes(), which, unlike hash(), gives the
+same values in every process.
+"""
+from hashlib import blake2b
+from operator import itemgetter
+import heapq
+import math
+
+import numpy as np
+
+
+def stable_hashes(keys):
+    """64-bit hashes of strings, as an uint64 array.
+
+    keys -- list of strings.
+    """
+    return np.array([int.from_bytes(blake2b(k.encode('utf-8'),
+                                            digest_size=8).digest(), 'little')
+                     for k in keys], dtype=np.uint64)
+
+
+class CountMinSketch:
+    """Count-Min sketch: depth rows of width counters, each key adds to one
+    counter per row and its estimate is the minimum of them. Estimates never
+    fall below the true counts.
+    """
+
+    def __init__(self, width=2 ** 18, depth=4):
+        """
+        width -- counters per row (the error bound is e / width times the
+            total count).
+        depth -- number of rows (the bound fails with probability
+            exp(-depth)).
+        """
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+
+    def _columns(self, hashes):
+        # one column per row and key, from two halves of the hash
+        h1 = hashes & np.uint64(0xffffffff)
+        h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        return ((h1 + rows * h2) % np.uint64(self.width)).astype(np.int64)
+
+    def add(self, hashes, counts):
+        """Add counts of keys.
+
+        hashes -- array of key hashes (see stable_hashes()).
+        counts -- the count of each key.
+        """
+        counts = np.asarray(counts, dtype=np.int64)
+        for row, cols in zip(self.table, self._columns(hashes)):
+            np.add.at(row, cols, counts)
+        self.total += int(counts.sum())
+
+    def estimate(self, key):
+        """Estimated count of a key.
+
+        key -- the key (a string).
+        """
+        cols = self._columns(stable_hashes([key]))[:, 0]
+        return int(self.table[np.arange(self.depth), cols].min())
+
+    def error_bound(self):
+        """Bound of the overestimation, for each key with probability
+        confidence()."""
+        return math.e / self.width * self.total
+
+    def confidence(self):
+        return 1.0 - math.exp(-self.depth)
+
+    def merge(self, other):
+        """Add the counts of another sketch with the same settings.
+
+        other -- the other sketch.
+        """
+        if self.table.shape != other.table.shape:
+            raise ValueError('sketches with different settings')
+        self.table += other.table
+        self.total += other.total
+        return self
+
+
+class HyperLogLog:
+    """HyperLogLog estimator of the number of distinct keys, with 2 ** p
+    registers of one byte.
+    """
+
+    def __init__(self, p=14):
+        """
+        p -- precision (the relative standard error is 1.04 / sqrt(2 ** p)).
+        """
+        self.p = p
+        self.registers = np.zeros(2 ** p, dtype=np.uint8)
+
+    def add(self, hashes):
+        """Add keys.
+
+        hashes -- array of key hashes (see stable_hashes()).
+        """
+        p = self.p
+        bits = 64 - p
+        mask = (1 << bits) - 1
+        index, ranks = [], []
+        for h in hashes.tolist():
+            index.append(h >> bits)
+            # position of the first 1 bit of the rest
+            ranks.append(bits - (h & mask).bit_length() + 1)
+        np.maximum.at(self.registers, np.array(index, dtype=np.int64),
+                      np.array(ranks, dtype=np.uint8))
+
+    def estimate(self):
+        """Estimated number of distinct keys."""
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        e = alpha * m * m / np.sum(2.0 ** -self.registers.astype(np.float64))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if e <= 2.5 * m and zeros:
+            # linear counting for small cardinalities
+            e = m * math.log(m / zeros)
+        return e
+
+    def relative_error(self):
+        """Relative standard error of the estimate."""
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def merge(self, other):
+        """Add the keys of another estimator with the same precision.
+
+        other -- the other estimator.
+        """
+        if self.p != other.p:
+            raise ValueError('estimators with different precisions')
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+
+class MisraGries:
+    """Misra-Gries summary of the most frequent keys, with at most k
+    counters. The counts are lowered by the same amount whenever there are
+    more than k keys, so the estimates are never above the true counts and
+    at most error_bound() below them.
+    """
+
+    def __init__(self, k=100):
+        """
+        k -- number of counters.
+        """
+        self.k = k
+        self.counts = {}
+        self.decrement = 0
+
+    def update(self, counts):
+        """Add counts of keys.
+
+        counts -- dict from keys to counts.
+        """
+        summary = self.counts
+        for key, c in counts.items():
+            summary[key] = summary.get(key, 0) + c
+        if len(summary) > self.k:
+            # lower everything by the (k+1)-th largest count
+            d = heapq.nlargest(self.k + 1, summary.values())[-1]
+            self.counts = {key: c - d for key, c in summary.items() if c > d}
+            self.decrement += d
+
+    def top(self, n):
+        """The n keys with the highest estimates, with their estimates.
+
+        n -- number of keys.
+        """
+        return heapq.nlargest(n, self.counts.items(), key=itemgetter(1))
+
+    def error_bound(self):
+        """Bound of the underestimation of any key."""
+        return self.decrement
+
+    def merge(self, other):
+        """Add the counts of another summary.
+
+        other -- the other summary.
+        """
+        self.decrement += other.decrement
+        self.update(other.counts)
+        return self
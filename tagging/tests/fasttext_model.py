@@ -0,0 +1,22 @@
+import numpy as np
+
+
+class Model:
+    """Stands for a fastText model, with deterministic vectors."""
+
+    def __init__(self):
+        # words whose vectors were asked for, in order
+        self.calls = []
+
+    def get_dimension(self):
+        return 3
+
+    def get_word_vector(self, w):
+        self.calls.append(w)
+        return np.array([len(w), ord(w[0]), ord(w[-1])], dtype=np.float32)
+
+    def get_subword_id(self, g):
+        return 1000 + sum(map(ord, g))
+
+    def get_input_vector(self, i):
+        return np.array([i, i % 7, 1.0], dtype=np.float32)
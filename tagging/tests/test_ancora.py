@@ -0,0 +1,220 @@
+# https://docs.python.org/3/library/unittest.html
+from unittest import TestCase
+import os
+import tempfile
+import time
+
+import nltk
+
+from tagging.ancora import AncoraCorpusReader, SimpleAncoraCorpusReader
+from tagging.ancora import iter_elements, parsed, tagged, untagged
+from tagging.ancora import simple_tag
+
+
+doc1 = """<?xml version="1.0" encoding="UTF-8"?>
+<article>
+<sentence>
+  <sn func="suj">
+    <spec><d wd="El" pos="da0ms0" lem="el"/></spec>
+    <grup.nom><n wd="gato" pos="ncms000" lem="gato"/></grup.nom>
+  </sn>
+  <grup.verb><v wd="come" pos="vmip3s0" lem="comer"/></grup.verb>
+  <sn func="cd"><grup.nom><n wd="pescado" pos="ncms000"/></grup.nom></sn>
+  <f wd="." pos="fp"/>
+</sentence>
+<sentence>
+  <sn elliptic="yes" func="suj"/>
+  <grup.verb><v wd="Come" pos="vmip3s0"/></grup.verb>
+  <sn func="cd"><grup.nom><n wd="Juan_Pérez" ne="person"/></grup.nom></sn>
+  <sn func="cc">
+    <grup.nom><n pos="ncms000"/><n elliptic="yes" wd=""/></grup.nom>
+  </sn>
+  <f wd="." pos="fp"/>
+</sentence>
+<sentence>
+  <sn elliptic="yes" func="suj"/>
+  <grup.verb><v elliptic="yes" pos="vmip3s0"/></grup.verb>
+</sentence>
+</article>
+"""
+
+doc2 = """<?xml version="1.0" encoding="UTF-8"?>
+<article>
+<sentence>
+  <sn func="suj"><grup.nom><n wd="Ella" pos="pp3fs000"/></grup.nom></sn>
+  <grup.verb><v wd="lee" pos="vmip3s0"/></grup.verb>
+  <f wd="." pos="fp"/>
+</sentence>
+</article>
+"""
+
+
+class TestAncoraCorpusReader(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        # recent NLTK versions only read corpora under nltk.data.path
+        nltk.data.path.append(self.tmp.name)
+        self.path = os.path.join(self.tmp.name, 'corpus')
+        os.mkdir(self.path)
+        for name, doc in [('a.tbf.xml', doc1), ('b.tbf.xml', doc2)]:
+            with open(os.path.join(self.path, name), 'w') as f:
+                f.write(doc)
+        self.cache_dir = os.path.join(self.tmp.name, 'cache')
+
+        self.tagged_sents = [
+            [('El', 'da0ms0'), ('gato', 'ncms000'), ('come', 'vmip3s0'),
+             ('pescado', 'ncms000'), ('.', 'fp')],
+            [('Come', 'vmip3s0'), ('Juan_Pérez', 'person'), ('.', 'fp')],
+            [('Ella', 'pp3fs000'), ('lee', 'vmip3s0'), ('.', 'fp')],
+        ]
+
+    def tearDown(self):
+        nltk.data.path.remove(self.tmp.name)
+        self.tmp.cleanup()
+
+    def test_tagged_sents(self):
+        corpus = AncoraCorpusReader(self.path)
+
+        self.assertEqual(list(corpus.tagged_sents()), self.tagged_sents)
+        sents = [[w for w, _ in s] for s in self.tagged_sents]
+        self.assertEqual(list(corpus.sents()), sents)
+
+    def test_stream(self):
+        corpus = AncoraCorpusReader(self.path, stream=True)
+
+        tagged_sents = corpus.tagged_sents()
+        self.assertFalse(hasattr(tagged_sents, '__len__'))
+        self.assertEqual(list(tagged_sents), self.tagged_sents)
+        self.assertEqual(list(corpus.sents()),
+                         [[w for w, _ in s] for s in self.tagged_sents])
+        self.assertEqual(list(corpus.tagged_words(['b.tbf.xml'])),
+                         self.tagged_sents[2])
+
+        # same output as the non-streaming reader, also for parsed trees
+        for simple in [False, True]:
+            cls = SimpleAncoraCorpusReader if simple else AncoraCorpusReader
+            stream = cls(self.path, stream=True)
+            lazy = cls(self.path)
+            self.assertEqual(list(stream.tagged_sents()),
+                             list(lazy.tagged_sents()))
+            self.assertEqual(list(stream.parsed_sents()),
+                             list(lazy.parsed_sents()))
+
+    def test_workers(self):
+        for cls in [AncoraCorpusReader, SimpleAncoraCorpusReader]:
+            parallel = cls(self.path, workers=2)
+            lazy = cls(self.path)
+            # same sentences, in file order
+            self.assertEqual(list(parallel.tagged_sents()),
+                             list(lazy.tagged_sents()))
+            self.assertEqual(list(parallel.sents()), list(lazy.sents()))
+            self.assertEqual(list(parallel.parsed_sents()),
+                             list(lazy.parsed_sents()))
+            self.assertEqual(list(parallel.tagged_sents(['b.tbf.xml'])),
+                             list(lazy.tagged_sents(['b.tbf.xml'])))
+
+    def test_iter_elements(self):
+        elements = iter_elements(os.path.join(self.path, 'a.tbf.xml'))
+
+        first = next(elements)
+        self.assertEqual(first.tag, 'sentence')
+        self.assertEqual(len(first), 4)
+        second = next(elements)
+        # the previous sentence is released
+        self.assertEqual(len(first), 0)
+        self.assertEqual(len(second), 5)
+        # the empty sentence (dropped by the readers)
+        self.assertEqual(len(list(elements)), 1)
+
+    def test_tagged_untagged(self):
+        # same output as the tree based conversion
+        for name in ['a.tbf.xml', 'b.tbf.xml']:
+            for element in iter_elements(os.path.join(self.path, name)):
+                t = parsed(element)
+                pos = [(w, tag) for w, tag in t.pos() if w is not None]
+                leaves = [w for w in t.leaves() if w is not None]
+                self.assertEqual(tagged(element), pos)
+                self.assertEqual(untagged(element), leaves)
+
+    def test_simple_tags(self):
+        corpus = SimpleAncoraCorpusReader(self.path)
+        tagged_sents = [[(w, simple_tag(t)) for w, t in sent]
+                        for sent in self.tagged_sents]
+        self.assertEqual(list(corpus.tagged_sents()), tagged_sents)
+
+        # same trees as relabeling the full trees in place
+        full = AncoraCorpusReader(self.path)
+        for t1, t2 in zip(corpus.parsed_sents(), full.parsed_sents()):
+            for p in t2.treepositions('leaves'):
+                t2[p[:-1]].set_label(simple_tag(t2[p[:-1]].label()))
+            self.assertEqual(t1, t2)
+
+        # repeated reads give the same trees
+        self.assertEqual(list(corpus.parsed_sents()),
+                         list(corpus.parsed_sents()))
+
+    def test_empty_sents(self):
+        for stream in [False, True]:
+            for workers in [1, 2]:
+                corpus = AncoraCorpusReader(self.path, stream=stream,
+                                            workers=workers)
+                self.assertEqual(len(list(corpus.tagged_sents())), 3)
+                self.assertEqual(len(list(corpus.sents())), 3)
+                self.assertEqual(len(list(corpus.parsed_sents())), 3)
+
+    def test_cache(self):
+        corpus = AncoraCorpusReader(self.path, cache_dir=self.cache_dir)
+        tagged_sents = list(corpus.tagged_sents())
+        self.assertEqual(tagged_sents, self.tagged_sents)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        # a new reader is served from the cache file
+        corpus = AncoraCorpusReader(self.path, cache_dir=self.cache_dir)
+        self.assertEqual(list(corpus.tagged_sents()), self.tagged_sents)
+        self.assertEqual(list(corpus.sents()),
+                         [[w for w, _ in s] for s in self.tagged_sents])
+        self.assertEqual(list(corpus.tagged_sents(['b.tbf.xml'])),
+                         self.tagged_sents[2:])
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+        # the simplified tagset is derived from the same cache file
+        corpus = SimpleAncoraCorpusReader(self.path, cache_dir=self.cache_dir)
+        simple = SimpleAncoraCorpusReader(self.path)
+        self.assertEqual(list(corpus.tagged_sents()),
+                         list(simple.tagged_sents()))
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+    def test_cache_filename(self):
+        corpus = AncoraCorpusReader(self.path, cache_dir=self.cache_dir)
+        filename = corpus.cache_filename('features', [1, 'dict'])
+        self.assertEqual(os.path.dirname(filename), self.cache_dir)
+        self.assertTrue(os.path.basename(filename).startswith('features-'))
+
+        # the key depends on the settings, the tagset and the files
+        self.assertEqual(corpus.cache_filename('features', [1, 'dict']),
+                         filename)
+        simple = SimpleAncoraCorpusReader(self.path, cache_dir=self.cache_dir)
+        others = [
+            corpus.cache_filename('features', [1, 'hash', 1024]),
+            simple.cache_filename('features', [1, 'dict']),
+            corpus.cache_filename('features', [1, 'dict'], ['b.tbf.xml']),
+        ]
+        self.assertEqual(len(set(others + [filename])), 4)
+
+        # no cache directory
+        self.assertIsNone(AncoraCorpusReader(self.path).cache_filename('x'))
+
+    def test_cache_invalidation(self):
+        corpus = AncoraCorpusReader(self.path, cache_dir=self.cache_dir)
+        list(corpus.tagged_sents())
+
+        # a modified file gives a new cache key
+        filename = os.path.join(self.path, 'b.tbf.xml')
+        with open(filename, 'w') as f:
+            f.write(doc2.replace('lee', 'escribe'))
+        t = time.time() + 10
+        os.utime(filename, (t, t))
+
+        corpus = AncoraCorpusReader(self.path, cache_dir=self.cache_dir)
+        self.assertEqual(corpus.tagged_sents()[2][1], ('escribe', 'vmip3s0'))
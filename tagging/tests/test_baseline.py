@@ -42,3 +42,15 @@ class TestBaselineTagger(TestCase):
         unknown = {'perro', 'salame'}
         for w in unknown:
             self.assertTrue(baseline.unknown(w))
+
+    def test_tag_sents(self):
+        baseline = BaselineTagger(self.tagged_sents, default_tag='N')
+        sents = [
+            'el gato come pescado .'.split(),
+            'la gata come salmón .'.split(),
+            'come el perro'.split(),
+        ]
+
+        y = [baseline.tag(sent) for sent in sents]
+        self.assertEqual(baseline.tag_sents(sents), y)
+        self.assertEqual(baseline.tag_sents(sents, workers=2, chunksize=1), y)
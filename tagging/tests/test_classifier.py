@@ -1,7 +1,14 @@
 # https://docs.python.org/3/library/unittest.html
 from unittest import TestCase
+import os
+import random
+import tempfile
 
-from tagging.classifier import feature_dict
+from sklearn.feature_extraction import DictVectorizer
+
+from tagging.classifier import feature_dict, ClassifierTagger, BatchFeaturizer
+from tagging.classifier import OnlineClassifierTagger, shuffled_batches
+from tagging.cache import save_features
 
 
 class TestFeatureDict(TestCase):
@@ -22,3 +29,212 @@ class TestFeatureDict(TestCase):
         }
 
         self.assertEqual(feature_dict(sent, 0), fdict)
+
+
+class TestBatchFeaturizer(TestCase):
+
+    def test_same_as_dict_vectorizer(self):
+        train = [
+            'El gato come pescado .'.split(),
+            'La gata come 25 SALMONES .'.split(),
+            ['Hola'],
+            [],
+            '<s> come </s>'.split(),
+        ]
+        test = [
+            'El perro come 3 ALFAJORES'.split(),
+            [],
+            ['gato'],
+        ]
+
+        def dicts(sents):
+            return [feature_dict(sent, i)
+                    for sent in sents for i in range(len(sent))]
+
+        vect = DictVectorizer()
+        X1 = vect.fit_transform(dicts(train))
+        featurizer = BatchFeaturizer()
+        X2 = featurizer.fit_transform(train)
+
+        self.assertEqual(featurizer.feature_names_,
+                         list(vect.get_feature_names_out()))
+        self.assertEqual(featurizer.vocabulary_, vect.vocabulary_)
+        self.assertEqual(X1.shape, X2.shape)
+        self.assertEqual((X1 != X2).nnz, 0)
+
+        X1 = vect.transform(dicts(test))
+        X2 = featurizer.transform(test)
+        self.assertEqual(X1.shape, X2.shape)
+        self.assertEqual((X1 != X2).nnz, 0)
+
+
+class TestClassifierTagger(TestCase):
+
+    def setUp(self):
+        self.tagged_sents = [
+            list(zip('el gato come pescado .'.split(),
+                 'D N V N P'.split())),
+            list(zip('la gata come salmón .'.split(),
+                 'D N V N P'.split())),
+        ]
+
+    def test_tag(self):
+        tagger = ClassifierTagger(self.tagged_sents)
+
+        y = tagger.tag('el gato come pescado .'.split())
+        self.assertEqual(y, 'D N V N P'.split())
+
+    def test_hashing(self):
+        tagger = ClassifierTagger(self.tagged_sents, n_features=2 ** 10)
+
+        y = tagger.tag('el gato come pescado .'.split())
+        self.assertEqual(y, 'D N V N P'.split())
+        vect = tagger._pipeline.named_steps['vect']
+        self.assertFalse(hasattr(vect, 'vocabulary_'))
+        clf = tagger._pipeline.named_steps['clf']
+        self.assertEqual(clf.coef_.shape[1], 2 ** 10)
+
+    def test_tag_sents(self):
+        tagger = ClassifierTagger(self.tagged_sents)
+        sents = [
+            'el gato come pescado .'.split(),
+            [],
+            'la gata come salmón .'.split(),
+            'el perro come salame .'.split(),
+        ]
+
+        y = [tagger.tag(sent) for sent in sents]
+        self.assertEqual(tagger.tag_sents(sents), y)
+        self.assertEqual(tagger.tag_sents(sents, workers=2, chunksize=1), y)
+
+    def test_features_file(self):
+        sents = ['el perro come salame .'.split(), 'la gata .'.split()]
+        with tempfile.TemporaryDirectory() as tmp:
+            for n_features in [None, 2 ** 10]:
+                filename = os.path.join(tmp, 'train{}.npz'.format(n_features))
+                tagger = ClassifierTagger(self.tagged_sents,
+                                          n_features=n_features,
+                                          features_file=filename)
+                self.assertTrue(os.path.exists(filename))
+
+                # the cached matrix is used instead of the sentences
+                cached = ClassifierTagger([], n_features=n_features,
+                                          features_file=filename)
+                self.assertEqual(cached.tag_sents(sents),
+                                 tagger.tag_sents(sents))
+                self.assertEqual(cached.feature_settings(),
+                                 tagger.feature_settings())
+                self.assertFalse(cached.unknown('gato'))
+                self.assertTrue(cached.unknown('perro'))
+
+                filename = os.path.join(tmp, 'test{}.npz'.format(n_features))
+                y = tagger.tag_sents(sents, features_file=filename)
+                self.assertEqual(y, tagger.tag_sents(sents))
+                self.assertTrue(os.path.exists(filename))
+                self.assertEqual(
+                    tagger.tag_sents(sents, features_file=filename), y)
+
+            # the tags of the words are saved as ids into the labels
+            X = BatchFeaturizer().fit_transform(sents)
+            with self.assertRaises(ValueError):
+                save_features(filename, X, words=['la'], word_tags=[['D']])
+
+    def test_unknown(self):
+        tagger = ClassifierTagger(self.tagged_sents)
+
+        self.assertFalse(tagger.unknown('gato'))
+        self.assertTrue(tagger.unknown('perro'))
+
+    def test_constrained(self):
+        tagged_sents = self.tagged_sents + [
+            list(zip('el bajo canta bajo la lluvia .'.split(),
+                 'D N V S D N P'.split())),
+            list(zip('la gata come bajo .'.split(),
+                 'D N V A P'.split())),
+            list(zip('come !'.split(), 'V P'.split())),
+        ]
+        sents = [
+            'el bajo come bajo la lluvia .'.split(),
+            'la gata bajo canta salame .'.split(),
+            [],
+            'bajo bajo el perro .'.split(),
+        ]
+        for clf, n_features in [('lr', None), ('svm', None), ('lr', 2 ** 10)]:
+            tagger = ClassifierTagger(tagged_sents, clf, n_features)
+            y = tagger.tag_sents(sents)
+
+            # argmax of the full decision function over the candidate tags
+            model = tagger._pipeline.named_steps['clf']
+            classes = model.classes_.tolist()
+            tag_dict = {}
+            for sent in tagged_sents:
+                for w, t in sent:
+                    tag_dict.setdefault(w, set()).add(t)
+            for sent, tags in zip(sents, y):
+                if not sent:
+                    self.assertEqual(tags, [])
+                    continue
+                scores = tagger._pipeline.decision_function([sent])
+                for w, t, row in zip(sent, tags, scores):
+                    cands = sorted(tag_dict.get(w, classes),
+                                   key=classes.index)
+                    best = max(cands, key=lambda c: row[classes.index(c)])
+                    self.assertEqual(t, best)
+
+            # not constrained: the plain classifier predictions
+            tagger.set_constrained(False)
+            for sent, tags in zip(sents, tagger.tag_sents(sents)):
+                self.assertEqual(
+                    tags, tagger._pipeline.predict([sent]).tolist()
+                    if sent else [])
+
+
+class TestOnlineClassifierTagger(TestCase):
+
+    def setUp(self):
+        self.tagged_sents = [
+            list(zip('el gato come pescado .'.split(),
+                 'D N V N P'.split())),
+            [],
+            list(zip('la gata come salmón .'.split(),
+                 'D N V N P'.split())),
+        ]
+
+    def test_tag(self):
+        for clf in ['sgd', 'perceptron']:
+            tagger = OnlineClassifierTagger(self.tagged_sents, clf=clf,
+                                            n_features=2 ** 10, batch_size=1,
+                                            epochs=10)
+
+            y = tagger.tag('el gato come pescado .'.split())
+            self.assertEqual(y, 'D N V N P'.split())
+            self.assertFalse(tagger.unknown('gato'))
+            self.assertTrue(tagger.unknown('perro'))
+
+    def test_generator(self):
+        # a new single-pass generator for each epoch
+        def tagged_sents():
+            return (sent for sent in self.tagged_sents)
+
+        tagger1 = OnlineClassifierTagger(tagged_sents, n_features=2 ** 10,
+                                         epochs=3)
+        tagger2 = OnlineClassifierTagger(self.tagged_sents, tags='DNVP',
+                                         n_features=2 ** 10, epochs=3)
+        clf1 = tagger1._pipeline.named_steps['clf']
+        clf2 = tagger2._pipeline.named_steps['clf']
+        self.assertEqual(list(clf1.classes_), list('DNPV'))
+        self.assertTrue((clf1.coef_ == clf2.coef_).all())
+
+        # a single generator would only be read in the first pass
+        with self.assertRaises(ValueError):
+            OnlineClassifierTagger(tagged_sents(), tags='DNVP', epochs=1)
+
+    def test_shuffled_batches(self):
+        rng = random.Random(0)
+        batches = list(shuffled_batches(range(25), 4, 10, rng))
+
+        self.assertEqual(sorted(sum(batches, [])), list(range(25)))
+        self.assertTrue(all(len(b) <= 4 for b in batches))
+        # items are only shuffled within their chunk of the stream
+        self.assertEqual(sorted(sum(batches[:3], [])), list(range(10)))
+        self.assertEqual(list(shuffled_batches([], 4, 10, rng)), [])
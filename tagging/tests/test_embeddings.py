@@ -0,0 +1,68 @@
+# https://docs.python.org/3/library/unittest.html
+from unittest import TestCase
+import os
+import tempfile
+
+import numpy as np
+
+from tagging.embeddings import EmbeddingTable, export_embeddings
+from tagging.embeddings import char_ngrams, fnv1a
+from tagging.tests.fasttext_model import Model
+
+
+class TestEmbeddings(TestCase):
+
+    def test_fnv1a(self):
+        # reference values of the 32-bit FNV-1a hash
+        self.assertEqual(fnv1a(''), 0x811c9dc5)
+        self.assertEqual(fnv1a('a'), 0xe40c292c)
+        self.assertEqual(fnv1a('foobar'), 0xbf9cf968)
+
+    def test_char_ngrams(self):
+        self.assertEqual(char_ngrams('gato', 3, 4),
+                         ['<ga', 'gat', 'ato', 'to>', '<gat', 'gato', 'ato>'])
+        self.assertEqual(char_ngrams('a', 4, 6), [])
+
+    def test_export(self):
+        model = Model()
+        words = ['el', 'gato', 'come', 'el']
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, 'table.npy')
+            export_embeddings(model, words, filename, buckets=50, minn=2,
+                              maxn=3)
+            self.assertEqual(sorted(os.listdir(tmp)),
+                             ['table.json', 'table.npy'])
+            table = EmbeddingTable(filename)
+
+            self.assertEqual(table.get_dimension(), 3)
+            self.assertEqual(table.vocab, {'el': 0, 'gato': 1, 'come': 2})
+            self.assertIsInstance(table.vectors, np.memmap)
+            for w in ['el', 'gato', 'come']:
+                self.assertTrue(np.array_equal(table.get_word_vector(w),
+                                               model.get_word_vector(w)))
+
+            # each bucket is the mean of the vectors of its n-grams
+            ngrams = {g for w in words for g in char_ngrams(w, 2, 3)}
+            sums = np.zeros((50, 3))
+            counts = np.zeros(50)
+            for g in ngrams:
+                b = fnv1a(g) % 50
+                sums[b] += model.get_input_vector(model.get_subword_id(g))
+                counts[b] += 1
+            used = counts > 0
+            self.assertTrue(np.allclose(table.vectors[3:][used],
+                                        sums[used] / counts[used, None]))
+            self.assertFalse(table.vectors[3:][~used].any())
+
+            # other words: mean of their non-empty n-gram buckets
+            rows = [b for b in table.subword_rows('gata') if used[b - 3]]
+            self.assertTrue(rows)
+            self.assertTrue(np.allclose(table.get_word_vector('gata'),
+                                        table.vectors[rows].mean(axis=0)))
+            self.assertEqual(table.get_word_vector('gata').dtype, np.float32)
+
+            # no non-empty buckets
+            export_embeddings(model, [], filename, buckets=50)
+            table = EmbeddingTable(filename)
+            self.assertEqual(table.vectors.shape, (50, 3))
+            self.assertFalse(table.get_word_vector('gata').any())
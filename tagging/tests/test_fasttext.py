@@ -0,0 +1,105 @@
+# https://docs.python.org/3/library/unittest.html
+from unittest import TestCase
+import os
+import pickle
+import tempfile
+
+import numpy as np
+
+from tagging.embeddings import export_embeddings
+from tagging.fasttext import FasttextDictVectorizer
+from tagging.tests.fasttext_model import Model
+
+
+class TestFasttextDictVectorizer(TestCase):
+
+    def setUp(self):
+        self.train = [
+            {'w': 'el', 'nw': 'gato'},
+            {'w': 'gato', 'nw': 'come'},
+            {'w': 'come', 'nw': 'el'},
+        ]
+        self.test = [
+            {'w': 'el', 'nw': 'perro'},
+            {'w': 'perro', 'nw': 'come'},
+            {'w': 'come', 'nw': 'perro'},
+        ]
+
+    def vectorizer(self, cache_size=10):
+        vect = FasttextDictVectorizer('model.bin', ['w', 'nw'], cache_size)
+        vect._model = Model()
+        return vect
+
+    def expected(self, X):
+        m = Model()
+        return np.array([np.concatenate([m.get_word_vector(x[k])
+                                         for k in ['w', 'nw']]) for x in X])
+
+    def test_transform(self):
+        vect = self.vectorizer()
+        X = vect.fit(self.train).transform(self.test)
+
+        self.assertEqual(X.dtype, np.float32)
+        self.assertTrue(np.array_equal(X, self.expected(self.test)))
+        # the training words once in fit, the other words once per batch
+        self.assertEqual(sorted(vect._model.calls),
+                         ['come', 'el', 'gato', 'perro'])
+
+        # unfitted: every word through the cache
+        vect = self.vectorizer()
+        X = vect.transform(self.test)
+        self.assertTrue(np.array_equal(X, self.expected(self.test)))
+        self.assertEqual(vect.transform([]).shape, (0, 6))
+
+    def test_cache(self):
+        vect = self.vectorizer(cache_size=2)
+        vect.fit([])
+        vect.transform([{'w': 'a', 'nw': 'b'}])
+        vect.transform([{'w': 'a', 'nw': 'c'}])
+        self.assertEqual(list(vect._cache), ['a', 'c'])
+        self.assertEqual(vect._model.calls, ['a', 'b', 'c'])
+
+        # 'b' was evicted, and computing it again evicts 'a'
+        vect.transform([{'w': 'c', 'nw': 'b'}])
+        self.assertEqual(vect._model.calls, ['a', 'b', 'c', 'b'])
+        self.assertEqual(list(vect._cache), ['c', 'b'])
+
+    def test_pickle(self):
+        vect = self.vectorizer()
+        vect.fit(self.train).transform(self.test)
+
+        state = vect.__getstate__()
+        self.assertIsNone(state['_model'])
+        self.assertEqual(len(state['_cache']), 0)
+        # the live object keeps its model and cache
+        self.assertIsNotNone(vect._model)
+        self.assertEqual(len(vect._cache), 1)
+
+        vect2 = pickle.loads(pickle.dumps(vect))
+        vect2._model = Model()
+        self.assertTrue(np.array_equal(vect2.transform(self.test),
+                                       vect.transform(self.test)))
+        # only the word outside the training vocabulary is computed again
+        self.assertEqual(vect2._model.calls, ['perro'])
+
+    def test_exported(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, 'table.npy')
+            export_embeddings(Model(), ['el', 'gato', 'come'], filename,
+                              buckets=64)
+            vect = FasttextDictVectorizer(filename, ['w', 'nw'])
+
+            # no training vocabulary of its own, and no model to pickle
+            X = vect.fit(self.train).transform(self.test)
+            self.assertEqual(vect._vocab, {})
+            self.assertIsNone(vect._vectors)
+            table = vect._model
+            expected = [np.concatenate([table.get_word_vector(x[k])
+                                        for k in ['w', 'nw']])
+                        for x in self.test]
+            self.assertTrue(np.array_equal(X, expected))
+            self.assertTrue(np.array_equal(X[0, :3],
+                                           Model().get_word_vector('el')))
+
+            vect2 = pickle.loads(pickle.dumps(vect))
+            self.assertTrue(np.array_equal(vect2.transform(self.test), X))
@@ -0,0 +1,118 @@
+# https://docs.python.org/3/library/unittest.html
+from unittest import TestCase
+from itertools import product
+import pickle
+
+import numpy as np
+from scipy import sparse
+from scipy.special import logsumexp
+
+from tagging.memm import MEMM, history_features
+
+
+class TestMEMM(TestCase):
+
+    def setUp(self):
+        self.tagged_sents = [
+            list(zip('el gato come pescado .'.split(),
+                 'D N V N P'.split())),
+            list(zip('la gata come salmón .'.split(),
+                 'D N V N P'.split())),
+            list(zip('el bajo canta bajo la lluvia .'.split(),
+                 'D N V S D N P'.split())),
+            [],
+        ]
+
+    def test_history_features(self):
+        self.assertEqual(history_features(()), [])
+        self.assertEqual(history_features(('<s>', 'D')),
+                         ['pt1=D', 'pt2=<s>,D'])
+
+    def test_tag(self):
+        for n in [1, 2, 3]:
+            for clf in ['lr', 'svm']:
+                model = MEMM(n, self.tagged_sents, clf)
+
+                y = model.tag('el gato come pescado .'.split())
+                self.assertEqual(y, 'D N V N P'.split())
+                self.assertEqual(model.tag([]), [])
+
+    def sent_log_prob(self, model, sent, tags):
+        """Log-probability of a tagging, from the full feature rows."""
+        n = model._n
+        padded = ('<s>',) * (n - 1) + tuple(tags)
+        histories = [padded[i:i + n - 1] for i in range(len(sent))]
+        X = sparse.hstack([model._featurizer.transform([sent]),
+                           model._history_matrix(histories)]).tocsr()
+        scores = model._model.decision_function(X)
+        lp = scores - logsumexp(scores, axis=1, keepdims=True)
+        return sum(lp[i, model._tags.index(t)] for i, t in enumerate(tags))
+
+    def test_exact(self):
+        sent = 'la lluvia canta bajo'.split()
+        for n in [2, 3]:
+            model = MEMM(n, self.tagged_sents, beam=None)
+            y = model.tag(sent)
+
+            # brute force over all the taggings
+            lps = {tags: self.sent_log_prob(model, sent, tags)
+                   for tags in product(model._tags, repeat=len(sent))}
+            best = max(lps, key=lps.get)
+            self.assertAlmostEqual(lps[tuple(y)], lps[best])
+
+            # a wide enough beam is exact
+            model.set_beam(100)
+            self.assertEqual(model.tag(sent), y)
+
+    def test_beam(self):
+        model = MEMM(3, self.tagged_sents, beam=1)
+        sents = ['el bajo come bajo .'.split(), [], 'la gata .'.split()]
+
+        y = model.tag_sents(sents)
+        self.assertEqual([len(tags) for tags in y], [5, 0, 3])
+        self.assertEqual(model.tag_sents(sents, workers=2), y)
+
+        # the history scores are memoized, and not pickled
+        self.assertTrue(model._history_cache)
+        model2 = pickle.loads(pickle.dumps(model))
+        self.assertEqual(model2._history_cache, {})
+        self.assertEqual(model2.tag_sents(sents), y)
+        for h, scores in model._history_cache.items():
+            self.assertTrue(np.allclose(model2.history_scores(h), scores))
+
+    def test_unknown(self):
+        model = MEMM(2, self.tagged_sents)
+
+        self.assertFalse(model.unknown('gato'))
+        self.assertTrue(model.unknown('perro'))
+
+    def test_constrained(self):
+        model = MEMM(2, self.tagged_sents, constrained=True)
+        sent = 'el bajo come bajo perro .'.split()
+
+        allowed = model.allowed_tags(sent)
+        tags = model._tags
+        self.assertEqual([tags[t] for t in np.flatnonzero(allowed[1])],
+                         ['N', 'S'])
+        self.assertEqual([tags[t] for t in np.flatnonzero(allowed[2])],
+                         ['V'])
+        # any tag for unknown words
+        self.assertTrue(allowed[4].all())
+
+        for beam in [None, 1, 8]:
+            model.set_beam(beam)
+            y = model.tag(sent)
+            for k, t in enumerate(y):
+                self.assertTrue(allowed[k, tags.index(t)], (beam, k, t))
+
+        # exact decoding over the allowed tags
+        model.set_beam(None)
+        lps = {y: self.sent_log_prob(model, sent, y)
+               for y in product(*[[tags[t] for t in np.flatnonzero(row)]
+                                  for row in allowed])}
+        best = max(lps, key=lps.get)
+        self.assertAlmostEqual(lps[tuple(model.tag(sent))], lps[best])
+
+        model.set_constrained(False)
+        self.assertEqual(model.tag(sent), MEMM(2, self.tagged_sents,
+                                               beam=None).tag(sent))
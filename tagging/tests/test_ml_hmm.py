@@ -1,6 +1,7 @@
 # https://docs.python.org/3/library/unittest.html
 from unittest import TestCase
 from math import log2
+import pickle
 
 from tagging.hmm import MLHMM
 from tagging.hmm import ViterbiTagger
@@ -127,6 +128,52 @@ class TestMLHMM(TestCase):
         for w in unknown:
             self.assertTrue(hmm.unknown(w))
 
+    def test_bulk_probs(self):
+        for addone in [True, False]:
+            hmm = MLHMM(3, self.tagged_sents, addone=addone)
+            tags = ['D', 'N', 'V', 'P', '</s>', 'X']
+
+            for prev_tags in [('<s>', '<s>'), ('D', 'N'), ('N', 'D')]:
+                probs = hmm.trans_probs(tags, prev_tags)
+                for t, p in zip(tags, probs):
+                    self.assertAlmostEqual(p, hmm.trans_prob(t, prev_tags))
+
+            for w in ['el', 'gato', 'perro']:
+                probs = hmm.out_probs(w, tags)
+                for t, p in zip(tags, probs):
+                    self.assertAlmostEqual(p, hmm.out_prob(w, t))
+
+    def test_candidate_tags(self):
+        hmm = MLHMM(2, self.tagged_sents)
+
+        candidates = {
+            'el': {'D'},
+            'come': {'V'},
+            'gato': {'N'},
+            # unknown, suffixes of rare words
+            'pato': {'N'},
+            'perro': {'N'},
+            'sala': {'D'},
+            'xyz': None,
+        }
+        for w, tags in candidates.items():
+            self.assertEqual(hmm.candidate_tags(w), tags, w)
+
+    def test_compact_storage(self):
+        hmm = MLHMM(2, self.tagged_sents)
+
+        # the vocabulary and the candidate tags in arrays, not in dicts
+        self.assertEqual(hmm._vocab.dtype.kind, 'S')
+        self.assertEqual(hmm._suffixes.dtype.kind, 'S')
+        self.assertEqual(hmm._vocab.tolist(), sorted(hmm._vocab.tolist()))
+        self.assertEqual(len(hmm._vocab), 8)
+
+        hmm2 = pickle.loads(pickle.dumps(hmm))
+        for w in ['el', 'salmón', 'pato', 'xyz']:
+            self.assertEqual(hmm2.candidate_tags(w), hmm.candidate_tags(w))
+            self.assertEqual(hmm2.unknown(w), hmm.unknown(w))
+        self.assertEqual(hmm2.out_prob('salmón', 'N'), 0.25)
+
     def test_viterbi_tagger(self):
         hmm = MLHMM(2, self.tagged_sents, addone=False)
         # XXX: or directly test hmm.tag?
@@ -164,6 +211,36 @@ class TestMLHMM(TestCase):
 
         self.assertEqual(y, 'D N V N P'.split())
 
+    def test_tag_sents(self):
+        hmm = MLHMM(2, self.tagged_sents)
+        sents = [
+            'el gato come pescado .'.split(),
+            'la gata come salmón .'.split(),
+            'el perro come salame .'.split(),
+        ] * 3
+
+        y = [hmm.tag(sent) for sent in sents]
+        self.assertEqual(hmm.tag_sents(sents), y)
+        # order is kept across chunks and workers
+        self.assertEqual(hmm.tag_sents(sents, workers=2, chunksize=2), y)
+        tagger = ViterbiTagger(hmm)
+        self.assertEqual(tagger.tag_sents(sents, workers=2), y)
+
+    def test_memory_report(self):
+        hmm = MLHMM(3, self.tagged_sents)
+        report = {item.component: item for item in hmm.memory_report()}
+
+        # one row per order of the tag n-gram tables
+        self.assertNotIn('tcount', report)
+        # <s> <s>, <s> D, D N, N V, V N, N P
+        self.assertEqual(report['tcount[2]'].entries, 6)
+        # <s> <s> D, <s> D N, D N V, N V N, V N P, N P </s>
+        self.assertEqual(report['tcount[3]'].entries, 6)
+        for k in [2, 3]:
+            keys, counts = hmm._tcount[k]
+            self.assertGreaterEqual(report['tcount[{}]'.format(k)].bytes,
+                                    keys.nbytes + counts.nbytes)
+
     def assertEqualPi(self, pi1, pi2):
         self.assertEqual(set(pi1.keys()), set(pi2.keys()))
 
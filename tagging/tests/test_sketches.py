@@ -0,0 +1,103 @@
+# https://docs.python.org/3/library/unittest.html
+from unittest import TestCase
+from collections import Counter
+import random
+
+from tagging.sketches import CountMinSketch, HyperLogLog, MisraGries
+from tagging.sketches import stable_hashes
+
+
+class TestSketches(TestCase):
+
+    def setUp(self):
+        # Zipfian counts of 5000 words
+        rng = random.Random(0)
+        self.words = ['w{}'.format(i) for i in range(5000)]
+        stream = [self.words[min(int(rng.paretovariate(1.0)), 4999)]
+                  for _ in range(20000)]
+        self.counts = Counter(stream)
+
+    def test_stable_hashes(self):
+        h = stable_hashes(['el', 'gato', 'el'])
+        self.assertEqual(h.dtype.name, 'uint64')
+        self.assertEqual(h[0], h[2])
+        self.assertNotEqual(h[0], h[1])
+        self.assertEqual(len(stable_hashes([])), 0)
+
+    def test_count_min(self):
+        keys = list(self.counts)
+        cms = CountMinSketch(width=512, depth=4)
+        cms.add(stable_hashes(keys), [self.counts[k] for k in keys])
+        self.assertEqual(cms.total, 20000)
+
+        bound = cms.error_bound()
+        errors = [cms.estimate(k) - self.counts[k] for k in keys]
+        self.assertTrue(all(e >= 0 for e in errors))
+        # the bound fails with probability exp(-4) per key at most
+        failures = sum(e > bound for e in errors)
+        self.assertLessEqual(failures,
+                             3 * (1 - cms.confidence()) * len(keys) + 1)
+        self.assertGreaterEqual(cms.estimate('not a word'), 0)
+
+    def test_count_min_merge(self):
+        keys = list(self.counts)
+        half = len(keys) // 2
+        cms1, cms2, whole = [CountMinSketch(256, 3) for _ in range(3)]
+        cms1.add(stable_hashes(keys[:half]),
+                 [self.counts[k] for k in keys[:half]])
+        cms2.add(stable_hashes(keys[half:]),
+                 [self.counts[k] for k in keys[half:]])
+        whole.add(stable_hashes(keys), [self.counts[k] for k in keys])
+
+        cms1.merge(cms2)
+        self.assertTrue((cms1.table == whole.table).all())
+        self.assertEqual(cms1.total, whole.total)
+        with self.assertRaises(ValueError):
+            cms1.merge(CountMinSketch(128, 3))
+
+    def test_hyperloglog(self):
+        for n in [0, 10, 1000, 50000]:
+            hll = HyperLogLog(p=12)
+            keys = ['k{}'.format(i) for i in range(n)]
+            hll.add(stable_hashes(keys))
+            # repeated keys do not count
+            hll.add(stable_hashes(keys[:n // 2]))
+            # within 4 standard errors
+            self.assertLessEqual(abs(hll.estimate() - n),
+                                 4 * hll.relative_error() * n + 1)
+
+        hll1, hll2 = HyperLogLog(10), HyperLogLog(10)
+        hll1.add(stable_hashes(self.words[:3000]))
+        hll2.add(stable_hashes(self.words[2000:]))
+        whole = HyperLogLog(10)
+        whole.add(stable_hashes(self.words))
+        self.assertEqual(hll1.merge(hll2).estimate(), whole.estimate())
+
+    def test_misra_gries(self):
+        mg = MisraGries(k=20)
+        items = list(self.counts.items())
+        for i in range(0, len(items), 100):
+            mg.update(dict(items[i:i + 100]))
+        self.assertLessEqual(len(mg.counts), 20)
+
+        bound = mg.error_bound()
+        self.assertLessEqual(bound, 20000 / 21)
+        for k, c in self.counts.items():
+            estimate = mg.counts.get(k, 0)
+            self.assertLessEqual(estimate, c)
+            self.assertLessEqual(c - estimate, bound)
+        self.assertEqual([k for k, _ in mg.top(3)],
+                         [k for k, _ in self.counts.most_common(3)])
+
+    def test_misra_gries_merge(self):
+        items = list(self.counts.items())
+        mg1, mg2 = MisraGries(10), MisraGries(10)
+        mg1.update(dict(items[::2]))
+        mg2.update(dict(items[1::2]))
+        mg1.merge(mg2)
+
+        self.assertLessEqual(len(mg1.counts), 10)
+        for k, c in self.counts.items():
+            estimate = mg1.counts.get(k, 0)
+            self.assertLessEqual(estimate, c)
+            self.assertLessEqual(c - estimate, mg1.error_bound())
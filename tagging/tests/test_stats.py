@@ -1,7 +1,14 @@
 # https://docs.python.org/3/library/unittest.html
 from unittest import TestCase
+from functools import partial
+import os
+import tempfile
 
-from tagging.scripts.stats import POSStats
+import nltk
+
+from tagging.ancora import SimpleAncoraCorpusReader
+from tagging.scripts.stats import POSStats, ApproxPOSStats, parallel_stats
+from tagging.tests.test_ancora import doc1, doc2
 
 
 class TestStats(TestCase):
@@ -14,6 +21,18 @@ class TestStats(TestCase):
                  'D N V N P'.split())),
         ]
 
+        self.tmp = tempfile.TemporaryDirectory()
+        # recent NLTK versions only read corpora under nltk.data.path
+        nltk.data.path.append(self.tmp.name)
+        for name, doc in [('a.tbf.xml', doc1), ('b.tbf.xml', doc2)]:
+            with open(os.path.join(self.tmp.name, name), 'w') as f:
+                f.write(doc)
+        self.corpus = SimpleAncoraCorpusReader(self.tmp.name)
+
+    def tearDown(self):
+        nltk.data.path.remove(self.tmp.name)
+        self.tmp.cleanup()
+
     def test_basic_stats(self):
         stats = POSStats(self.tagged_sents)
 
@@ -87,3 +106,100 @@ class TestStats(TestCase):
         self.assertEqual(set(stats.ambiguous_words(3)), set())
         self.assertEqual(set(stats.ambiguous_words(4)), set())
         self.assertEqual(set(stats.ambiguous_words(5)), set())
+
+    def test_ambiguity(self):
+        tagged_sents = self.tagged_sents + [
+            list(zip('bajo bajo come'.split(), 'A S N'.split())),
+            list(zip('bajo la .'.split(), 'N D P'.split())),
+        ]
+        stats = POSStats(tagged_sents)
+
+        self.assertEqual(stats.ambiguous_words(3), ['bajo'])
+        self.assertEqual(set(stats.ambiguous_words(2)), {'come'})
+        self.assertEqual(stats.ambiguous_words(4), [])
+        self.assertEqual(stats.top_ambiguous_words(1, 2), ['.', 'la'])
+        self.assertEqual(stats.top_ambiguous_words(2, 5), ['come'])
+
+        self.assertEqual(stats.top_tags(2), [('N', 6), ('D', 3)])
+        self.assertEqual(stats.top_tag_words('P', 1), [('.', 3)])
+        self.assertEqual(stats.top_tag_words('V', 5), [('come', 2)])
+        self.assertEqual(stats.tag_word_dict('X'), {})
+
+    def test_merge(self):
+        stats = POSStats(self.tagged_sents[:1])
+        self.assertEqual(stats.word_count(), 5)
+
+        # the derived statistics are updated after merging
+        stats.merge(POSStats(self.tagged_sents[1:]))
+        whole = POSStats(self.tagged_sents)
+        self.assertEqual(stats.sent_count(), 2)
+        self.assertEqual(stats.token_count(), 10)
+        self.assertEqual(stats.words(), whole.words())
+        self.assertEqual(stats.word_freq('come'), 2)
+        for t in whole.tags():
+            self.assertEqual(stats.tag_word_dict(t), whole.tag_word_dict(t))
+
+        stats.update(self.tagged_sents)
+        self.assertEqual(stats.word_freq('come'), 4)
+        self.assertEqual(stats.sent_count(), 4)
+
+    def test_parallel_stats(self):
+        stats = parallel_stats(self.corpus, 2)
+        whole = POSStats(self.corpus.tagged_sents())
+
+        self.assertEqual(stats.sent_count(), 3)
+        self.assertEqual(stats.token_count(), whole.token_count())
+        for t in whole.tags():
+            self.assertEqual(stats.tag_word_dict(t), whole.tag_word_dict(t))
+
+    def test_approx_stats(self):
+        tagged_sents = self.tagged_sents * 3
+        exact = POSStats(tagged_sents)
+        stats = ApproxPOSStats(tagged_sents, width=64, depth=3, precision=6,
+                               top=3, batch_size=7)
+
+        self.assertEqual(stats.sent_count(), 6)
+        self.assertEqual(stats.token_count(), 30)
+        self.assertEqual(stats.tags(), exact.tags())
+        self.assertEqual(stats.top_tags(4), exact.top_tags(4))
+        # 8 words, within 4 standard errors
+        self.assertLessEqual(abs(stats.word_count() - 8),
+                             4 * stats.word_count_error() * 8)
+
+        bound, confidence = stats.word_freq_error()
+        self.assertAlmostEqual(bound, 2.718281828 / 64 * 30)
+        self.assertAlmostEqual(confidence, 1 - 2.718281828 ** -3)
+        for w in exact.words():
+            self.assertGreaterEqual(stats.word_freq(w), exact.word_freq(w))
+
+        # 'N' has 4 words but only 3 counters
+        for t in exact.tags():
+            error = stats.top_tag_words_error(t)
+            counts = exact.tag_word_dict(t)
+            for w, c in stats.top_tag_words(t, 5):
+                self.assertLessEqual(c, counts[w])
+                self.assertLessEqual(counts[w] - c, error)
+        self.assertGreater(stats.top_tag_words_error('N'), 0)
+        self.assertEqual(stats.top_tag_words('V', 5), [('come', 6)])
+        self.assertEqual(stats.top_tag_words_error('V'), 0)
+        self.assertEqual(stats.top_tag_words('X', 5), [])
+
+    def test_approx_merge(self):
+        settings = dict(width=64, depth=3, precision=6, top=3)
+        stats = ApproxPOSStats(self.tagged_sents[:1], **settings)
+        stats.merge(ApproxPOSStats(self.tagged_sents[1:], **settings))
+        whole = ApproxPOSStats(self.tagged_sents, **settings)
+
+        self.assertEqual(stats.sent_count(), 2)
+        self.assertEqual(stats.token_count(), 10)
+        self.assertEqual(stats.top_tags(4), whole.top_tags(4))
+        self.assertEqual(stats.word_count(), whole.word_count())
+        for w in ['el', 'come', '.']:
+            self.assertEqual(stats.word_freq(w), whole.word_freq(w))
+        self.assertEqual(stats.top_tag_words('V', 1), [('come', 2)])
+
+        stats = parallel_stats(self.corpus, 2, stats_class=partial(
+            ApproxPOSStats, **settings))
+        self.assertIsInstance(stats, ApproxPOSStats)
+        self.assertEqual(stats.sent_count(), 3)
+        self.assertEqual(stats.token_count(), 11)
@@ -0,0 +1,131 @@
+# https://docs.python.org/3/library/unittest.html
+from unittest import TestCase
+
+from tagging.hmm import HMM, MLHMM, ViterbiTagger, VectorizedViterbiTagger
+
+
+class TestVectorizedViterbiTagger(TestCase):
+
+    def setUp(self):
+        self.tagged_sents = [
+            list(zip('el gato come pescado .'.split(),
+                 'D N V N P'.split())),
+            list(zip('la gata come salmón .'.split(),
+                 'D N V N P'.split())),
+            list(zip('el pescado come .'.split(),
+                 'D N V P'.split())),
+            list(zip('come pescado .'.split(),
+                 'V N P'.split())),
+        ]
+        self.sents = [
+            'el gato come pescado .'.split(),
+            'la gata come salmón .'.split(),
+            'el perro come salame .'.split(),
+            'come .'.split(),
+            'pescado come pescado'.split(),
+        ]
+
+    def test_tag(self):
+        tagset = {'D', 'N', 'V'}
+        trans = {
+            ('<s>', '<s>'): {'D': 1.0},
+            ('<s>', 'D'): {'N': 0.8, 'V': 0.2},
+            ('D', 'N'): {'V': 0.8, 'N': 0.2},
+            ('D', 'V'): {'V': 0.8, 'N': 0.2},
+            ('N', 'N'): {'V': 1.0},
+            ('N', 'V'): {'</s>': 1.0},
+            ('V', 'N'): {'</s>': 1.0},
+            ('V', 'V'): {'</s>': 1.0},
+        }
+        out = {
+            'D': {'the': 1.0},
+            'N': {'dog': 0.4, 'barks': 0.6},
+            'V': {'dog': 0.1, 'barks': 0.9},
+        }
+        hmm = HMM(3, tagset, trans, out)
+        tagger = VectorizedViterbiTagger(hmm)
+
+        self.assertEqual(tagger.tag('the dog barks'.split()), 'D N V'.split())
+        # no tagging with non-zero probability
+        self.assertIsNone(tagger.tag('the cat barks'.split()))
+
+    def test_zero_prob_end(self):
+        tagset = {'D', 'N', 'V'}
+        # '</s>' only after V, which never follows D
+        trans = {
+            ('<s>',): {'D': 1.0},
+            ('D',): {'N': 0.7, 'D': 0.3},
+            ('N',): {'V': 1.0},
+            ('V',): {'</s>': 1.0},
+        }
+        out = {
+            'D': {'the': 0.9, 'dog': 0.1},
+            'N': {'dog': 0.4, 'barks': 0.6},
+            'V': {'dog': 0.1, 'barks': 0.9},
+        }
+        hmm = HMM(2, tagset, trans, out)
+        tagger = ViterbiTagger(hmm)
+        vtagger = VectorizedViterbiTagger(hmm)
+
+        # the best tagging of the words, although none can end the sentence
+        for sent, y in [('the dog', 'D N'), ('the', 'D'), ('', '')]:
+            sent, y = sent.split(), y.split()
+            self.assertEqual(tagger.tag(sent), y)
+            self.assertEqual(vtagger.tag(sent), y)
+
+        # unless there is a tagging with non-zero probability
+        sent = 'the dog barks'.split()
+        self.assertEqual(tagger.tag(sent), 'D N V'.split())
+        self.assertEqual(vtagger.tag(sent), 'D N V'.split())
+
+    def test_same_as_viterbi(self):
+        for n in [1, 2, 3, 4]:
+            for addone in [True, False]:
+                hmm = MLHMM(n, self.tagged_sents, addone=addone)
+                tagger = ViterbiTagger(hmm)
+                vtagger = VectorizedViterbiTagger(hmm)
+                for sent in self.sents:
+                    self.assertEqual(vtagger.tag(sent), tagger.tag(sent),
+                                     msg=(n, addone, sent))
+
+    def test_beam(self):
+        for n in [2, 3]:
+            hmm = MLHMM(n, self.tagged_sents)
+            for beam in [1, 2, 3]:
+                tagger = ViterbiTagger(hmm, beam=beam)
+                vtagger = VectorizedViterbiTagger(hmm, beam=beam)
+                for sent in self.sents:
+                    self.assertEqual(vtagger.tag(sent), tagger.tag(sent),
+                                     msg=(n, beam, sent))
+
+            # a wide enough beam is exact decoding
+            tagger = ViterbiTagger(hmm)
+            vtagger = VectorizedViterbiTagger(hmm, beam=100)
+            for sent in self.sents:
+                self.assertEqual(vtagger.tag(sent), tagger.tag(sent))
+
+    def test_constrained(self):
+        for n in [1, 2, 3]:
+            hmm = MLHMM(n, self.tagged_sents)
+            tagger = ViterbiTagger(hmm)
+            ctagger = ViterbiTagger(hmm, constrained=True)
+            vtagger = VectorizedViterbiTagger(hmm, constrained=True)
+            for sent in self.sents[:2]:
+                # exact for known words
+                self.assertEqual(ctagger.tag(sent), tagger.tag(sent))
+                self.assertEqual(vtagger.tag(sent), tagger.tag(sent))
+            for sent in self.sents:
+                self.assertEqual(vtagger.tag(sent), ctagger.tag(sent))
+
+            # 'gatito' may only be N (suffix 'to' of 'gato')
+            y = vtagger.tag('el gatito come .'.split())
+            self.assertEqual(y, 'D N V P'.split())
+
+    def test_hmm_tag(self):
+        hmm = MLHMM(2, self.tagged_sents)
+        y = hmm.tag('el gato come pescado .'.split())
+        self.assertEqual(y, 'D N V N P'.split())
+
+        hmm.set_beam(1)
+        y = hmm.tag('el gato come pescado .'.split())
+        self.assertEqual(y, 'D N V N P'.split())
@@ -129,6 +129,48 @@ class TestViterbiTagger(TestCase):
 
         self.assertEqual(y, 'D N V'.split())
 
+    def test_tag_beam(self):
+        tagset = {'D', 'N', 'V'}
+        trans = {
+            ('<s>', '<s>'): {'D': 1.0},
+            ('<s>', 'D'): {'N': 0.8, 'V': 0.2},
+            ('D', 'N'): {'V': 0.8, 'N': 0.2},
+            ('D', 'V'): {'V': 0.8, 'N': 0.2},
+            ('N', 'N'): {'V': 1.0},
+            ('N', 'V'): {'</s>': 1.0},
+            ('V', 'N'): {'</s>': 1.0},
+            ('V', 'V'): {'</s>': 1.0},
+        }
+        out = {
+            'D': {'the': 1.0},
+            'N': {'dog': 0.4, 'barks': 0.6},
+            'V': {'dog': 0.1, 'barks': 0.9},
+        }
+        hmm = HMM(3, tagset, trans, out)
+        tagger = ViterbiTagger(hmm, beam=1)
+
+        x = 'the dog barks'.split()
+        y = tagger.tag(x)
+
+        pi = {
+            0: {
+                ('<s>', '<s>'): (log2(1.0), []),
+            },
+            1: {
+                ('<s>', 'D'): (log2(1.0), ['D']),
+            },
+            2: {
+                # ('D', 'V') falls out of the beam
+                ('D', 'N'): (log2(0.8 * 0.4), ['D', 'N']),
+            },
+            3: {
+                ('N', 'V'): (log2(0.8 * 0.4 * 0.8 * 0.9), ['D', 'N', 'V']),
+            }
+        }
+        self.assertEqualPi(tagger._pi, pi)
+
+        self.assertEqual(y, 'D N V'.split())
+
     def assertEqualPi(self, pi1, pi2):
         self.assertEqual(set(pi1.keys()), set(pi2.keys()))
 